@@ -0,0 +1,45 @@
+"""add content hash and file sources to couts_salariaux_files
+
+Revision ID: add_couts_salariaux_file_sources
+Revises: add_couts_salariaux_processed_blob
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_couts_salariaux_file_sources'
+down_revision = 'add_couts_salariaux_processed_blob'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Empreinte du fichier d'origine (déduplication des uploads identiques)
+    op.add_column('couts_salariaux_files', sa.Column('content_hash', sa.String(), nullable=True))
+    op.add_column('couts_salariaux_files', sa.Column('resolver_version', sa.Integer(), nullable=True))
+    op.create_index(op.f('ix_couts_salariaux_files_content_hash'), 'couts_salariaux_files', ['content_hash'], unique=False)
+
+    # Contenus déjà intégrés par fichier (ajouts idempotents)
+    op.create_table('couts_salariaux_file_sources',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('file_id', sa.Integer(), nullable=False),
+        sa.Column('content_hash', sa.String(), nullable=False),
+        sa.Column('filename', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['file_id'], ['couts_salariaux_files.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_couts_salariaux_file_sources_id'), 'couts_salariaux_file_sources', ['id'], unique=False)
+    op.create_index('ix_couts_salariaux_file_sources_file_hash', 'couts_salariaux_file_sources', ['file_id', 'content_hash'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_couts_salariaux_file_sources_file_hash', table_name='couts_salariaux_file_sources')
+    op.drop_index(op.f('ix_couts_salariaux_file_sources_id'), table_name='couts_salariaux_file_sources')
+    op.drop_table('couts_salariaux_file_sources')
+    op.drop_index(op.f('ix_couts_salariaux_files_content_hash'), table_name='couts_salariaux_files')
+    op.drop_column('couts_salariaux_files', 'resolver_version')
+    op.drop_column('couts_salariaux_files', 'content_hash')
@@ -0,0 +1,25 @@
+"""add processed_blob to couts_salariaux_files
+
+Revision ID: add_couts_salariaux_processed_blob
+Revises: add_couts_salariaux_rows
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_couts_salariaux_processed_blob'
+down_revision = 'add_couts_salariaux_rows'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Stockage colonnaire compressé (storage_format = columnar)
+    op.add_column('couts_salariaux_files', sa.Column('processed_blob', sa.LargeBinary(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('couts_salariaux_files', 'processed_blob')
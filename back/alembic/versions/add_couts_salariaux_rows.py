@@ -0,0 +1,45 @@
+"""add couts_salariaux_rows table and storage_format
+
+Revision ID: add_couts_salariaux_rows
+Revises: create_task_checklist_and_assignments
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_couts_salariaux_rows'
+down_revision = 'create_task_checklist_and_assignments'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Format de stockage des fichiers existants : JSON dans processed_data
+    op.add_column('couts_salariaux_files', sa.Column('storage_format', sa.String(), nullable=False, server_default='json'))
+    
+    # Créer la table couts_salariaux_rows (ingestion par blocs)
+    op.create_table(
+        'couts_salariaux_rows',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('file_id', sa.Integer(), nullable=False),
+        sa.Column('seq', sa.Integer(), nullable=False),
+        sa.Column('matricule', sa.String(), nullable=True),
+        sa.Column('mois', sa.String(), nullable=True),
+        sa.Column('data', sa.Text(), nullable=False),
+        sa.ForeignKeyConstraint(['file_id'], ['couts_salariaux_files.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_couts_salariaux_rows_id'), 'couts_salariaux_rows', ['id'], unique=False)
+    op.create_index('ix_couts_salariaux_rows_file_seq', 'couts_salariaux_rows', ['file_id', 'seq'], unique=False)
+    op.create_index('ix_couts_salariaux_rows_file_key', 'couts_salariaux_rows', ['file_id', 'matricule', 'mois'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_couts_salariaux_rows_file_key', table_name='couts_salariaux_rows')
+    op.drop_index('ix_couts_salariaux_rows_file_seq', table_name='couts_salariaux_rows')
+    op.drop_index(op.f('ix_couts_salariaux_rows_id'), table_name='couts_salariaux_rows')
+    op.drop_table('couts_salariaux_rows')
+    op.drop_column('couts_salariaux_files', 'storage_format')
@@ -0,0 +1,24 @@
+"""add rows_revision to couts_salariaux_files
+
+Revision ID: add_couts_salariaux_rows_revision
+Revises: add_machine_labor_allocations
+Create Date: 2026-10-19 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_couts_salariaux_rows_revision'
+down_revision = 'add_machine_labor_allocations'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('couts_salariaux_files', sa.Column('rows_revision', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    op.drop_column('couts_salariaux_files', 'rows_revision')
@@ -0,0 +1,46 @@
+"""add_fec_analysis_tables
+
+Revision ID: add_fec_analysis_tables
+Revises: add_couts_salariaux_files
+Create Date: 2025-09-15 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_fec_analysis_tables'
+down_revision = 'add_couts_salariaux_files'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('fec_analyses',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('filename', sa.String(), nullable=False),
+    sa.Column('upload_date', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('results', sa.Text(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_fec_analyses_id'), 'fec_analyses', ['id'], unique=False)
+    op.create_table('fec_segments',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('analysis_id', sa.Integer(), nullable=False),
+    sa.Column('segment_type', sa.String(), nullable=False),
+    sa.Column('data', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['analysis_id'], ['fec_analyses.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_fec_segments_id'), 'fec_segments', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_fec_segments_id'), table_name='fec_segments')
+    op.drop_table('fec_segments')
+    op.drop_index(op.f('ix_fec_analyses_id'), table_name='fec_analyses')
+    op.drop_table('fec_analyses')
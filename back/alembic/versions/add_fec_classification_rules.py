@@ -0,0 +1,44 @@
+"""add fec_classification_rules and societe on fec_analyses
+
+Revision ID: add_fec_classification_rules
+Revises: add_fec_ledger_lines
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_fec_classification_rules'
+down_revision = 'add_fec_ledger_lines'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('fec_analyses', sa.Column('societe', sa.String(), nullable=True))
+    op.create_index(op.f('ix_fec_analyses_societe'), 'fec_analyses', ['societe'], unique=False)
+
+    # Règles de classification des comptes par société (societe nulle = toutes)
+    op.create_table(
+        'fec_classification_rules',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('societe', sa.String(), nullable=True),
+        sa.Column('prefix', sa.String(), nullable=False),
+        sa.Column('segment', sa.String(), nullable=False),
+        sa.Column('sous_total', sa.String(), server_default='', nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_fec_classification_rules_id'), 'fec_classification_rules', ['id'], unique=False)
+    op.create_index('ix_fec_classification_rules_societe_prefix', 'fec_classification_rules', ['societe', 'prefix'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_fec_classification_rules_societe_prefix', table_name='fec_classification_rules')
+    op.drop_index(op.f('ix_fec_classification_rules_id'), table_name='fec_classification_rules')
+    op.drop_table('fec_classification_rules')
+    op.drop_index(op.f('ix_fec_analyses_societe'), table_name='fec_analyses')
+    op.drop_column('fec_analyses', 'societe')
@@ -0,0 +1,42 @@
+"""add fec_ledger_lines table
+
+Revision ID: add_fec_ledger_lines
+Revises: add_couts_salariaux_file_sources
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_fec_ledger_lines'
+down_revision = 'add_couts_salariaux_file_sources'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Grand livre typé des analyses FEC (requêtes de détail par compte et par mois)
+    op.create_table(
+        'fec_ledger_lines',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('analysis_id', sa.Integer(), nullable=False),
+        sa.Column('journal_code', sa.String(), nullable=True),
+        sa.Column('compte_num', sa.String(), nullable=False),
+        sa.Column('compte_lib', sa.String(), nullable=True),
+        sa.Column('ecriture_date', sa.Date(), nullable=True),
+        sa.Column('mois', sa.String(length=7), nullable=True),
+        sa.Column('debit', sa.Float(), nullable=False),
+        sa.Column('credit', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['analysis_id'], ['fec_analyses.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_fec_ledger_lines_analysis_compte', 'fec_ledger_lines', ['analysis_id', 'compte_num', 'mois'], unique=False)
+    op.create_index('ix_fec_ledger_lines_analysis_mois', 'fec_ledger_lines', ['analysis_id', 'mois', 'compte_num'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_fec_ledger_lines_analysis_mois', table_name='fec_ledger_lines')
+    op.drop_index('ix_fec_ledger_lines_analysis_compte', table_name='fec_ledger_lines')
+    op.drop_table('fec_ledger_lines')
@@ -0,0 +1,57 @@
+"""add fec_monthly_aggregates
+
+Revision ID: add_fec_monthly_aggregates
+Revises: add_fec_classification_rules
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_fec_monthly_aggregates'
+down_revision = 'add_fec_classification_rules'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Agrégats par analyse, mois, segment et sous-total
+    op.create_table(
+        'fec_monthly_aggregates',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('analysis_id', sa.Integer(), nullable=False),
+        sa.Column('mois', sa.String(length=7), nullable=False),
+        sa.Column('segment', sa.String(), nullable=False),
+        sa.Column('sous_total', sa.String(), server_default='', nullable=False),
+        sa.Column('montant', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['analysis_id'], ['fec_analyses.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_fec_monthly_aggregates_analysis_mois', 'fec_monthly_aggregates', ['analysis_id', 'mois', 'segment'], unique=False)
+
+    # Reprise des analyses existantes, une à la fois : agrégats calculés depuis leurs résultats par mois
+    from app.services.fec_aggregates import aggregate_rows
+    aggregates = sa.table(
+        'fec_monthly_aggregates',
+        sa.column('analysis_id', sa.Integer()),
+        sa.column('mois', sa.String()),
+        sa.column('segment', sa.String()),
+        sa.column('sous_total', sa.String()),
+        sa.column('montant', sa.Float())
+    )
+    bind = op.get_bind()
+    analysis_ids = [row[0] for row in bind.execute(sa.text("SELECT id FROM fec_analyses ORDER BY id"))]
+    for analysis_id in analysis_ids:
+        results = bind.execute(sa.text("SELECT results FROM fec_analyses WHERE id = :id"), {"id": analysis_id}).scalar()
+        rows = aggregate_rows(json.loads(results))
+        if rows:
+            op.bulk_insert(aggregates, [dict(row, analysis_id=analysis_id) for row in rows])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_fec_monthly_aggregates_analysis_mois', table_name='fec_monthly_aggregates')
+    op.drop_table('fec_monthly_aggregates')
@@ -0,0 +1,45 @@
+"""add machine_cost_inputs
+
+Revision ID: add_machine_cost_inputs
+Revises: add_machine_runtime_rollups
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_machine_cost_inputs'
+down_revision = 'add_machine_runtime_rollups'
+branch_labels = None
+depends_on = None
+
+INPUTS = (
+    'heures_annuelles', 'amortissement', 'interet', 'kwh', 'air_liquide', 'coef_puissance',
+    'frais_locaux', 'assurances', 'heures_facturees', 'prix_achat', 'maintenance', 'surface',
+    'puissance', 'conso_air_liquide', 'salaire_operateur', 'coef_utilisation',
+)
+
+
+def upgrade() -> None:
+    op.create_table(
+        'machine_cost_inputs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('machine_id', sa.Integer(), nullable=False),
+        *[sa.Column(name, sa.Float(), nullable=True) for name in INPUTS],
+        sa.Column('note', sa.Text(), nullable=True),
+        sa.Column('version', sa.Integer(), nullable=False, server_default='1'),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('updated_by', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['machine_id'], ['machines.id'], ),
+        sa.ForeignKeyConstraint(['updated_by'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('machine_id')
+    )
+    op.create_index(op.f('ix_machine_cost_inputs_id'), 'machine_cost_inputs', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_machine_cost_inputs_id'), table_name='machine_cost_inputs')
+    op.drop_table('machine_cost_inputs')
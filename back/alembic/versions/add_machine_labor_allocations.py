@@ -0,0 +1,72 @@
+"""add machine_service_mappings, machine_labor_allocations and machine_labor_allocation_months
+
+Revision ID: add_machine_labor_allocations
+Revises: add_machine_cost_inputs
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_machine_labor_allocations'
+down_revision = 'add_machine_cost_inputs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'machine_service_mappings',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('service', sa.String(), nullable=False),
+        sa.Column('machine_id', sa.Integer(), nullable=False),
+        sa.Column('poids', sa.Float(), nullable=False, server_default='1'),
+        sa.ForeignKeyConstraint(['machine_id'], ['machines.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_machine_service_mappings_id'), 'machine_service_mappings', ['id'], unique=False)
+    op.create_index('ix_machine_service_mappings_service_machine', 'machine_service_mappings', ['service', 'machine_id'], unique=True)
+
+    op.create_table(
+        'machine_labor_allocations',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('file_id', sa.Integer(), nullable=False),
+        sa.Column('mois', sa.String(length=7), nullable=False),
+        sa.Column('machine_id', sa.Integer(), nullable=False),
+        sa.Column('annee', sa.Integer(), nullable=False),
+        sa.Column('semaine', sa.Integer(), nullable=False),
+        sa.Column('cle', sa.String(), nullable=False),
+        sa.Column('montant', sa.Float(), nullable=False, server_default='0'),
+        sa.ForeignKeyConstraint(['file_id'], ['couts_salariaux_files.id'], ),
+        sa.ForeignKeyConstraint(['machine_id'], ['machines.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_machine_labor_allocations_file_mois', 'machine_labor_allocations', ['file_id', 'mois'], unique=False)
+    op.create_index('ix_machine_labor_allocations_machine_id', 'machine_labor_allocations', ['machine_id'], unique=False)
+
+    op.create_table(
+        'machine_labor_allocation_months',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('file_id', sa.Integer(), nullable=False),
+        sa.Column('mois', sa.String(length=7), nullable=False),
+        sa.Column('signature', sa.String(), nullable=False),
+        sa.Column('total', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('non_affecte', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['file_id'], ['couts_salariaux_files.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_machine_labor_allocation_months_file_mois', 'machine_labor_allocation_months', ['file_id', 'mois'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_machine_labor_allocation_months_file_mois', table_name='machine_labor_allocation_months')
+    op.drop_table('machine_labor_allocation_months')
+    op.drop_index('ix_machine_labor_allocations_machine_id', table_name='machine_labor_allocations')
+    op.drop_index('ix_machine_labor_allocations_file_mois', table_name='machine_labor_allocations')
+    op.drop_table('machine_labor_allocations')
+    op.drop_index('ix_machine_service_mappings_service_machine', table_name='machine_service_mappings')
+    op.drop_index(op.f('ix_machine_service_mappings_id'), table_name='machine_service_mappings')
+    op.drop_table('machine_service_mappings')
@@ -0,0 +1,59 @@
+"""add machine_runtime_files and machine_runtime_days
+
+Revision ID: add_machine_runtime
+Revises: add_fec_monthly_aggregates
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_machine_runtime'
+down_revision = 'add_fec_monthly_aggregates'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'machine_runtime_files',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('machine', sa.String(), nullable=False),
+        sa.Column('machine_id', sa.Integer(), nullable=True),
+        sa.Column('filename', sa.String(), nullable=False),
+        sa.Column('date_debut', sa.Date(), nullable=True),
+        sa.Column('date_fin', sa.Date(), nullable=True),
+        sa.Column('total_jours', sa.Integer(), nullable=True),
+        sa.Column('uploaded_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('uploaded_by', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['machine_id'], ['machines.id'], ondelete='SET NULL'),
+        sa.ForeignKeyConstraint(['uploaded_by'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_machine_runtime_files_id'), 'machine_runtime_files', ['id'], unique=False)
+    op.create_index(op.f('ix_machine_runtime_files_machine'), 'machine_runtime_files', ['machine'], unique=False)
+
+    # Une ligne par jour et par rapport ; lecture par (machine, plage de dates)
+    op.create_table(
+        'machine_runtime_days',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('file_id', sa.Integer(), nullable=False),
+        sa.Column('machine', sa.String(), nullable=False),
+        sa.Column('jour', sa.Date(), nullable=False),
+        sa.Column('duree_secondes', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['file_id'], ['machine_runtime_files.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_machine_runtime_days_machine_jour', 'machine_runtime_days', ['machine', 'jour'], unique=False)
+    op.create_index('ix_machine_runtime_days_file_id', 'machine_runtime_days', ['file_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_machine_runtime_days_file_id', table_name='machine_runtime_days')
+    op.drop_index('ix_machine_runtime_days_machine_jour', table_name='machine_runtime_days')
+    op.drop_table('machine_runtime_days')
+    op.drop_index(op.f('ix_machine_runtime_files_machine'), table_name='machine_runtime_files')
+    op.drop_index(op.f('ix_machine_runtime_files_id'), table_name='machine_runtime_files')
+    op.drop_table('machine_runtime_files')
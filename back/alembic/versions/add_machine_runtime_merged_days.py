@@ -0,0 +1,50 @@
+"""add machine_runtime_merged_days
+
+Revision ID: add_machine_runtime_merged_days
+Revises: add_machine_runtime
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_machine_runtime_merged_days'
+down_revision = 'add_machine_runtime'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Une ligne par (machine, jour), tous rapports fusionnés
+    op.create_table(
+        'machine_runtime_merged_days',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('machine', sa.String(), nullable=False),
+        sa.Column('jour', sa.Date(), nullable=False),
+        sa.Column('duree_secondes', sa.Integer(), nullable=False),
+        sa.Column('file_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['file_id'], ['machine_runtime_files.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_machine_runtime_merged_days_machine_jour', 'machine_runtime_merged_days', ['machine', 'jour'], unique=True)
+    op.create_index('ix_machine_runtime_merged_days_file_id', 'machine_runtime_merged_days', ['file_id'], unique=False)
+
+    # Reprise : un jour présent dans plusieurs rapports est pris dans le plus récent
+    op.execute("""
+        INSERT INTO machine_runtime_merged_days (machine, jour, duree_secondes, file_id)
+        SELECT d.machine, d.jour, d.duree_secondes, d.file_id
+        FROM machine_runtime_days d
+        JOIN (
+            SELECT machine, jour, MAX(file_id) AS file_id
+            FROM machine_runtime_days
+            GROUP BY machine, jour
+        ) latest ON latest.machine = d.machine AND latest.jour = d.jour AND latest.file_id = d.file_id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_machine_runtime_merged_days_file_id', table_name='machine_runtime_merged_days')
+    op.drop_index('ix_machine_runtime_merged_days_machine_jour', table_name='machine_runtime_merged_days')
+    op.drop_table('machine_runtime_merged_days')
@@ -0,0 +1,50 @@
+"""add machine_runtime_rollups
+
+Revision ID: add_machine_runtime_rollups
+Revises: add_machine_runtime_merged_days
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_machine_runtime_rollups'
+down_revision = 'add_machine_runtime_merged_days'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'machine_runtime_rollups',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('machine', sa.String(), nullable=False),
+        sa.Column('niveau', sa.String(), nullable=False),
+        sa.Column('periode', sa.Date(), nullable=False),
+        sa.Column('jours', sa.Integer(), nullable=False),
+        sa.Column('total_secondes', sa.Integer(), nullable=False),
+        sa.Column('max_secondes', sa.Integer(), nullable=False),
+        sa.Column('jours_productifs', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        'ix_machine_runtime_rollups_machine_niveau_periode', 'machine_runtime_rollups',
+        ['machine', 'niveau', 'periode'], unique=True
+    )
+
+    # Reprise des jours déjà fusionnés ; date_trunc('week') commence le lundi, comme les seaux de l'application
+    for niveau, unit in (('semaine', 'week'), ('mois', 'month'), ('annee', 'year')):
+        op.execute(f"""
+            INSERT INTO machine_runtime_rollups (machine, niveau, periode, jours, total_secondes, max_secondes, jours_productifs)
+            SELECT machine, '{niveau}', date_trunc('{unit}', jour)::date, COUNT(*), SUM(duree_secondes), MAX(duree_secondes),
+                   SUM(CASE WHEN duree_secondes > 0 THEN 1 ELSE 0 END)
+            FROM machine_runtime_merged_days
+            GROUP BY machine, date_trunc('{unit}', jour)::date
+        """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_machine_runtime_rollups_machine_niveau_periode', table_name='machine_runtime_rollups')
+    op.drop_table('machine_runtime_rollups')
@@ -0,0 +1,35 @@
+"""normalize (matricule, mois) keys of couts_salariaux_rows
+
+Revision ID: normalize_couts_salariaux_row_keys
+Revises: add_couts_salariaux_rows_revision
+Create Date: 2026-10-20 09:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'normalize_couts_salariaux_row_keys'
+down_revision = 'add_couts_salariaux_rows_revision'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Même normalisation que l'ingestion : espaces retirés, entier écrit en flottant ("123.0") -> "123"
+    op.execute(r"""
+        UPDATE couts_salariaux_rows
+        SET matricule = NULLIF(regexp_replace(btrim(matricule), '^(-?[0-9]+)\.0*$', '\1'), '')
+        WHERE matricule IS NOT NULL
+          AND (matricule <> btrim(matricule) OR matricule ~ '^\s*-?[0-9]+\.0*\s*$' OR btrim(matricule) = '')
+    """)
+    op.execute(r"""
+        UPDATE couts_salariaux_rows
+        SET mois = NULLIF(btrim(mois), '')
+        WHERE mois IS NOT NULL AND (mois <> btrim(mois) OR btrim(mois) = '')
+    """)
+
+
+def downgrade() -> None:
+    # Les clés d'origine ne sont pas conservées
+    pass
@@ -1,8 +1,10 @@
 from fastapi import APIRouter
-from .endpoints import auth, gantt, couts_salariaux
+from .endpoints import auth, gantt, couts_salariaux, fec_analysis, machines
 
 api_router = APIRouter()
 
 api_router.include_router(auth.router, prefix="/auth", tags=["authentication"])
 api_router.include_router(gantt.router, prefix="/gantt", tags=["gantt"])
-api_router.include_router(couts_salariaux.router, prefix="/couts-salariaux", tags=["coûts-salariaux"]) 
\ No newline at end of file
+api_router.include_router(couts_salariaux.router, prefix="/couts-salariaux", tags=["coûts-salariaux"]) 
+api_router.include_router(fec_analysis.router, prefix="/fec-analysis", tags=["fec-analysis"])
+api_router.include_router(machines.router, prefix="/machines", tags=["machines"])
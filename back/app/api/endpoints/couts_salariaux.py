@@ -1,15 +1,21 @@
-import json
 import logging
+from functools import partial
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Response
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-import pandas as pd
-import numpy as np
-from io import BytesIO
 
-from app.database import get_db
+from app.config import settings
+from app.database import get_db, SessionLocal
 from app.auth import get_current_user
 from app import crud, schemas, models
+from app.services import columnar
+from app.services import couts_salariaux as service
+from app.services import couts_salariaux_export as export
+from app.services import couts_salariaux_mensuel as mensuel
+from app.services import couts_salariaux_horaires as horaires
+from app.services import jobs
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -18,244 +24,345 @@ router = APIRouter()
 async def upload_couts_salariaux(
     file: UploadFile = File(...),
     append_to_file_id: Optional[int] = Form(None, description="ID du fichier existant pour ajouter les données"),
+    streaming: bool = Form(False, description="Ingestion CSV par blocs, à mémoire bornée"),
+    storage: str = Form(service.STORAGE_JSON, description="Format de stockage: json ou columnar (compact)"),
+    upsert: bool = Form(False, description="Avec append_to_file_id : fusion par (Matricule, Mois) au lieu d'un simple ajout"),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
     """
     Upload et traitement d'un fichier de coûts salariaux - Basé sur le projet CS qui fonctionnait
     """
-    if not file.filename.endswith((".xlsx", ".xls", ".csv")):
+    if not file.filename.endswith(service.SUPPORTED_EXTENSIONS):
         raise HTTPException(status_code=400, detail="Format de fichier non supporté. Utilisez .xlsx, .xls ou .csv")
     
+    if storage not in service.INLINE_STORAGES:
+        raise HTTPException(status_code=400, detail="Format de stockage non supporté. Utilisez json ou columnar")
+    
+    if streaming and file.filename.endswith('.csv'):
+        return await _upload_csv_stream(file, append_to_file_id, upsert, db, current_user)
+    
     try:
         content = await file.read()
-        logger.info(f"Upload - Début traitement fichier: {file.filename}, taille: {len(content)} bytes")
-        
-        # Lecture du fichier avec la logique du projet CS
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(BytesIO(content))
-            logger.info("Fichier CSV lu avec succès")
-        else:
-            # Essayer différentes approches pour lire le fichier Excel (logique du projet CS)
-            df = None
-            
-            # Méthode 1: Essayer avec 2 lignes d'en-tête
-            try:
-                raw_df = pd.read_excel(BytesIO(content), header=[0, 1])
-                logger.info("Lecture avec 2 lignes d'en-tête réussie")
-                
-                # Fusionner les deux lignes d'en-tête
-                new_columns = []
-                for col in raw_df.columns:
-                    if str(col[1]).lower() == 'nan' or str(col[1]).strip() == '' or str(col[1]).startswith('Unnamed'):
-                        new_columns.append(str(col[0]).strip())
-                    else:
-                        new_columns.append(f"{str(col[0]).strip()} {str(col[1]).strip()}")
-                
-                raw_df.columns = new_columns
-                df = raw_df
-                logger.info("Colonnes après fusion:", list(df.columns))
-                
-            except Exception as e1:
-                logger.info(f"Échec lecture avec 2 lignes: {e1}")
-                
-                # Méthode 2: Essayer avec 1 ligne d'en-tête
-                try:
-                    df = pd.read_excel(BytesIO(content), header=0)
-                    logger.info("Lecture avec 1 ligne d'en-tête réussie")
-                except Exception as e2:
-                    logger.info(f"Échec lecture avec 1 ligne: {e2}")
-                    
-                    # Méthode 3: Lire sans en-tête et utiliser la première ligne
-                    try:
-                        df = pd.read_excel(BytesIO(content), header=None)
-                        logger.info("Lecture sans en-tête réussie")
-                        # Utiliser la première ligne comme en-tête
-                        df.columns = df.iloc[0]
-                        df = df.iloc[1:].reset_index(drop=True)
-                        logger.info("Colonnes après ajustement:", list(df.columns))
-                    except Exception as e3:
-                        logger.error(f"Échec lecture sans en-tête: {e3}")
-                        raise HTTPException(status_code=500, detail="Impossible de lire le fichier Excel")
-        
-        # Définir les colonnes attendues (même que le projet CS)
-        colonnes = [
-            "Matricule", "Salarié", "Service", "P / HP", "Mois", 
-            "Heures théoriques", "Heures normales", "Heures majorées", "Total heures", 
-            "Effectif", "CP Pris", "RTT/Réci Pris", "Heures réelles", "Brut", 
-            "Charges salariales", "Charges patronales", "% charge patronales", 
-            "Suppléments coût global", "Coût global", "Coût hora moyen", "PAS", 
-            "Net à payer", "Forfait jour", "Entrée", "Sortie", "Emploi", "Etablissement"
-        ]
-        
-        # Mapping spécifique pour les colonnes problématiques (du projet CS)
-        mapping_colonnes = {
-            'RTT/Réci Pris': ['RTT/Recup Pris', 'RTT/Réci Pris', 'RTT/Recup', 'RTT/Réci', 'RTT', 'Recup Pris', 'Réci Pris', 'RTT/Récup Pris', 'RTT/Récup', 'RTT/Récup Pris'],
-            'Coût hora moyen': ['Coût hora moyen', 'Cout hora moyen', 'Coût horaire moyen'],
-            '% charge patronales': ['% charge patronales', '% patronales', 'Pourcentage patronales', '% charges patronales'],
-            'CP Pris': ['CP Pris', 'CP', 'Congés Pris'],
-            'Heures théoriques': ['Heures théoriques', 'Théoriques', 'Heures theoriques'],
-            'Heures normales': ['Heures normales', 'Normales'],
-            'Heures majorées': ['Heures majorées', 'Majorées'],
-            'Total heures': ['Total heures', 'Total', 'Heures total'],
-            'Heures réelles': ['Heures réelles', 'Réelles'],
-            'Charges salariales': ['Charges salariales', 'Charges salariales', 'Salariales'],
-            'Charges patronales': ['Charges patronales', 'Patronales'],
-            'Suppléments coût global': ['Suppléments coût global', 'Suppléments', 'Coût global supplément'],
-            'Coût global': ['Coût global', 'Cout global', 'Global'],
-            'Net à payer': ['Net à payer', 'Net a payer', 'Net'],
-            'Forfait jour': ['Forfait jour', 'Forfait'],
-            'P / HP': ['P / HP', 'P/HP', 'P HP', 'P-HP']
-        }
+        content_hash = service.content_fingerprint(content)
+        logger.info(f"Upload - Début traitement fichier: {file.filename}, taille: {len(content)} bytes, empreinte: {content_hash[:12]}")
         
-        logger.info("Colonnes attendues:", colonnes)
-        logger.info("Colonnes disponibles:", list(df.columns))
+        # Contenu déjà traité : résultat existant, sans nouveau parsing
+        duplicate = _find_duplicate(db, content_hash, append_to_file_id)
+        if duplicate:
+            return duplicate
         
-        # Créer un DataFrame avec les colonnes dans l'ordre exact (logique du projet CS)
-        result_df = pd.DataFrame()
-        for colonne in colonnes:
-            if colonne in df.columns:
-                result_df[colonne] = df[colonne]
-                logger.info(f"Colonne trouvée exactement: {colonne}")
-            else:
-                # Chercher dans le mapping spécifique
-                found = False
-                if colonne in mapping_colonnes:
-                    for variation in mapping_colonnes[colonne]:
-                        if variation in df.columns:
-                            result_df[colonne] = df[variation]
-                            found = True
-                            logger.info(f"Mapping spécifique: {variation} -> {colonne}")
-                            break
-                
-                # Si pas trouvé dans le mapping, chercher des colonnes similaires
-                if not found:
-                    for col in df.columns:
-                        # Normaliser les chaînes pour la comparaison
-                        col_normalized = col.lower().replace('é', 'e').replace('è', 'e').replace('à', 'a').replace('/', '').replace(' ', '')
-                        colonne_normalized = colonne.lower().replace('é', 'e').replace('è', 'e').replace('à', 'a').replace('/', '').replace(' ', '')
-                        
-                        if colonne_normalized in col_normalized or col_normalized in colonne_normalized:
-                            result_df[colonne] = df[col]
-                            found = True
-                            logger.info(f"Mapping intelligent: {col} -> {colonne}")
-                            break
-                
-                if not found:
-                    result_df[colonne] = None
-                    logger.info(f"Colonne non trouvée: {colonne}")
-        
-        # Nettoyer les données
-        result_df = result_df.replace({pd.NA: None, pd.NaT: None, np.nan: None})
-        
-        # Convertir les timestamps en string pour la sérialisation JSON
-        for col in result_df.columns:
-            if result_df[col].dtype == 'datetime64[ns]':
-                result_df[col] = result_df[col].dt.strftime('%Y-%m-%d')
-        
-        # Convertir aussi les pandas Timestamp en string
-        data = result_df.to_dict(orient='records')
-        for row in data:
-            for key, value in row.items():
-                if hasattr(value, 'strftime'):  # Si c'est un timestamp
-                    row[key] = value.strftime('%Y-%m-%d') if value is not None else None
-        
-        logger.info(f"Données traitées: {len(data)} lignes")
-        if len(data) > 0:
-            logger.info("Première ligne:", data[0])
+        # Parsing hors de la boucle d'évènements
+        data, column_mapping = await run_in_threadpool(
+            service.parse_upload_cached, db, content, file.filename, content_hash
+        )
         
         appended = False
-        if append_to_file_id:
+        upsert_counts = None
+        if append_to_file_id and upsert:
+            # Fusion par (Matricule, Mois) : les mois renvoyés remplacent les lignes existantes
+            db_file, upsert_counts = service.upsert_records(db, append_to_file_id, data, content_hash, file.filename)
+            if not db_file:
+                raise HTTPException(status_code=404, detail="Fichier de destination non trouvé")
+            appended = True
+            logger.info(f"Upload - Données fusionnées dans le fichier ID: {append_to_file_id}")
+        elif append_to_file_id:
             # Ajouter à un fichier existant (logique du projet CS)
-            try:
-                existing_file = crud.get_couts_salariaux_file(db, append_to_file_id)
-                if not existing_file:
-                    raise HTTPException(status_code=404, detail="Fichier de destination non trouvé")
-                
-                # Charger les données existantes
-                existing_data = json.loads(existing_file.processed_data)
-                logger.info(f"Données existantes: {len(existing_data)} lignes")
-                
-                # Normaliser les nouvelles données pour correspondre aux colonnes existantes
-                normalized_new_data = []
-                
-                # Créer un dictionnaire des services et P/HP par salarié à partir des données existantes
-                salarie_info = {}
-                for existing_row in existing_data:
-                    salarie_name = existing_row.get("Salarié")
-                    if salarie_name:
-                        salarie_info[salarie_name] = {
-                            "Service": existing_row.get("Service"),
-                            "P / HP": existing_row.get("P / HP")
-                        }
-                
-                for row in data:
-                    normalized_row = {}
-                    for col in existing_data[0].keys() if existing_data else colonnes:
-                        # Logique intelligente pour Service et P/HP
-                        if col == "Service" and col not in row:
-                            salarie_name = row.get("Salarié")
-                            if salarie_name and salarie_name in salarie_info:
-                                normalized_row[col] = salarie_info[salarie_name]["Service"]
-                            else:
-                                normalized_row[col] = "Non spécifié"
-                        elif col == "P / HP" and col not in row:
-                            salarie_name = row.get("Salarié")
-                            if salarie_name and salarie_name in salarie_info:
-                                normalized_row[col] = salarie_info[salarie_name]["P / HP"]
-                            else:
-                                normalized_row[col] = "Non spécifié"
-                        else:
-                            normalized_row[col] = row.get(col, None)
-                    normalized_new_data.append(normalized_row)
-                
-                # Concaténer les données
-                combined_data = existing_data + normalized_new_data
-                
-                # Mettre à jour le fichier existant
-                file_update = schemas.CoutsSalariauxFileUpdate(
-                    processed_data=json.dumps(combined_data, ensure_ascii=False),
-                    total_records=len(combined_data)
-                )
-                db_file = crud.update_couts_salariaux_file(db, append_to_file_id, file_update)
-                appended = True
-                logger.info(f"Upload - Données ajoutées au fichier existant ID: {append_to_file_id}")
-                
-            except Exception as append_error:
-                logger.error(f"Erreur lors de l'ajout de données: {append_error}")
-                raise HTTPException(status_code=500, detail=f"Erreur lors de l'ajout: {str(append_error)}")
+            db_file = service.append_records(db, append_to_file_id, data, content_hash, file.filename)
+            if not db_file:
+                raise HTTPException(status_code=404, detail="Fichier de destination non trouvé")
+            appended = True
+            logger.info(f"Upload - Données ajoutées au fichier existant ID: {append_to_file_id}")
         else:
             # Créer un nouveau fichier
-            file_data = schemas.CoutsSalariauxFileCreate(
-                filename=file.filename,
-                processed_data=json.dumps(data, ensure_ascii=False),
-                total_records=len(data)
-            )
-            db_file = crud.create_couts_salariaux_file(db, file_data, current_user.id)
+            db_file = service.create_file(db, file.filename, data, current_user.id, storage, content_hash)
             logger.info(f"Upload - Nouveau fichier créé avec ID: {db_file.id}")
         
         return schemas.CoutsSalariauxUploadResponse(
             success=True,
             file_id=db_file.id,
             appended=appended,
-            total_records=db_file.total_records
+            total_records=db_file.total_records,
+            column_mapping=column_mapping,
+            upsert_counts=upsert_counts
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Upload - Erreur lors du traitement: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erreur lors du traitement: {str(e)}")
 
+def _find_duplicate(db: Session, content_hash: str, append_to_file_id: Optional[int]) -> Optional[schemas.CoutsSalariauxUploadResponse]:
+    """Réponse immédiate si ce contenu a déjà été intégré (fichier identique ou ajout déjà fait)"""
+    if append_to_file_id:
+        db_file = crud.get_couts_salariaux_file(db, append_to_file_id)
+        if not db_file:
+            raise HTTPException(status_code=404, detail="Fichier de destination non trouvé")
+        if not crud.get_couts_salariaux_file_source(db, append_to_file_id, content_hash):
+            return None
+        logger.info(f"Upload - Contenu déjà ajouté au fichier ID: {append_to_file_id}")
+    else:
+        db_file = crud.get_couts_salariaux_file_by_hash(db, content_hash, service.RESOLVER_VERSION)
+        if not db_file:
+            return None
+        logger.info(f"Upload - Contenu identique au fichier ID: {db_file.id}")
+    return schemas.CoutsSalariauxUploadResponse(
+        success=True,
+        file_id=db_file.id,
+        appended=False,
+        total_records=db_file.total_records,
+        deduplicated=True
+    )
+
+async def _upload_csv_stream(file: UploadFile, append_to_file_id: Optional[int], upsert: bool, db: Session, current_user: models.User):
+    """Ingestion CSV en flux depuis le fichier temporaire de l'upload"""
+    try:
+        logger.info(f"Upload - Ingestion CSV par blocs: {file.filename}")
+        content_hash = await run_in_threadpool(service.stream_fingerprint, file.file)
+        duplicate = _find_duplicate(db, content_hash, append_to_file_id)
+        if duplicate:
+            return duplicate
+        
+        upsert_counts = service.empty_upsert_counts() if append_to_file_id and upsert else None
+        db_file, column_mapping = await run_in_threadpool(
+            service.ingest_csv_stream, db, file.file, file.filename, current_user.id, append_to_file_id,
+            service.CSV_CHUNK_ROWS, content_hash, upsert_counts
+        )
+        if not db_file:
+            raise HTTPException(status_code=404, detail="Fichier de destination non trouvé")
+        return schemas.CoutsSalariauxUploadResponse(
+            success=True,
+            file_id=db_file.id,
+            appended=bool(append_to_file_id),
+            total_records=db_file.total_records,
+            column_mapping=column_mapping,
+            upsert_counts=upsert_counts
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Upload - Erreur lors de l'ingestion par blocs: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Erreur lors du traitement: {str(e)}")
+
 @router.post("/upload-couts-salariaux", response_model=schemas.CoutsSalariauxUploadResponse)
 async def upload_couts_salariaux_alias(
     file: UploadFile = File(...),
     append_to_file_id: Optional[int] = Form(None, description="ID du fichier existant pour ajouter les données"),
+    streaming: bool = Form(False, description="Ingestion CSV par blocs, à mémoire bornée"),
+    storage: str = Form(service.STORAGE_JSON, description="Format de stockage: json ou columnar (compact)"),
+    upsert: bool = Form(False, description="Avec append_to_file_id : fusion par (Matricule, Mois) au lieu d'un simple ajout"),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
     """
     Alias pour l'upload (compatibilité frontend)
     """
-    return await upload_couts_salariaux(file, append_to_file_id, db, current_user)
+    return await upload_couts_salariaux(file, append_to_file_id, streaming, storage, upsert, db, current_user)
+
+@router.post("/upload-batch", response_model=schemas.CoutsSalariauxBatchUploadResponse)
+async def upload_couts_salariaux_batch(
+    files: List[UploadFile] = File(...),
+    append_to_file_id: Optional[int] = Form(None, description="ID du fichier existant pour ajouter les données"),
+    filename: Optional[str] = Form(None, description="Nom du fichier créé (par défaut, celui du premier fichier)"),
+    storage: str = Form(service.STORAGE_JSON, description="Format de stockage: json ou columnar (compact)"),
+    upsert: bool = Form(False, description="Avec append_to_file_id : fusion par (Matricule, Mois) au lieu d'un simple ajout"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Upload de plusieurs fichiers : parsing en parallèle, écriture dans un seul fichier en une transaction
+    """
+    if len(files) > settings.BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"Trop de fichiers (maximum {settings.BATCH_MAX_FILES})")
+    for upload in files:
+        if not upload.filename.endswith(service.SUPPORTED_EXTENSIONS):
+            raise HTTPException(status_code=400, detail=f"Format de fichier non supporté ({upload.filename}). Utilisez .xlsx, .xls ou .csv")
+    if storage not in service.INLINE_STORAGES:
+        raise HTTPException(status_code=400, detail="Format de stockage non supporté. Utilisez json ou columnar")
+    if append_to_file_id and not crud.get_couts_salariaux_file(db, append_to_file_id):
+        raise HTTPException(status_code=404, detail="Fichier de destination non trouvé")
+    
+    try:
+        results: List[schemas.CoutsSalariauxBatchFileResult] = []
+        items, item_results, seen = [], [], set()
+        for upload in files:
+            content = await upload.read()
+            content_hash = service.content_fingerprint(content)
+            result = schemas.CoutsSalariauxBatchFileResult(filename=upload.filename, success=True)
+            results.append(result)
+            # Contenu en double dans le lot ou déjà ajouté au fichier de destination
+            if content_hash in seen or (
+                append_to_file_id and crud.get_couts_salariaux_file_source(db, append_to_file_id, content_hash)
+            ):
+                result.deduplicated = True
+                result.records = 0
+                continue
+            seen.add(content_hash)
+            items.append((content, upload.filename, content_hash))
+            item_results.append(result)
+        logger.info(f"Upload par lot - {len(files)} fichiers, {len(items)} à traiter")
+        
+        # Parsing parallèle hors de la boucle d'évènements
+        parsed = await run_in_threadpool(service.parse_uploads, items, settings.BATCH_MAX_WORKERS or None)
+        
+        parts = []
+        for (content, upload_filename, content_hash), result, (outcome, error) in zip(items, item_results, parsed):
+            if outcome is None:
+                result.success = False
+                result.error = error
+                logger.error(f"Upload par lot - Erreur sur {upload_filename}: {error}")
+                continue
+            data, column_mapping = outcome
+            result.records = len(data)
+            result.column_mapping = column_mapping
+            parts.append((upload_filename, content_hash, data))
+        
+        if not parts and not append_to_file_id:
+            raise HTTPException(status_code=400, detail="Aucun fichier du lot n'a pu être traité")
+        
+        db_file, upsert_counts = await run_in_threadpool(
+            service.store_batch,
+            db,
+            filename or files[0].filename,
+            parts,
+            current_user.id,
+            append_to_file_id,
+            storage,
+            upsert
+        )
+        if not db_file:
+            raise HTTPException(status_code=404, detail="Fichier de destination non trouvé")
+        logger.info(f"Upload par lot - {len(parts)} fichiers écrits dans le fichier ID: {db_file.id}")
+        
+        return schemas.CoutsSalariauxBatchUploadResponse(
+            success=all(result.success for result in results),
+            file_id=db_file.id,
+            appended=bool(append_to_file_id),
+            total_records=db_file.total_records,
+            upsert_counts=upsert_counts,
+            files=results
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Upload par lot - Erreur lors du traitement: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Erreur lors du traitement: {str(e)}")
+
+def _store_upload_job(
+    job: jobs.Job,
+    parsed,
+    append: bool = False,
+    storage: str = service.STORAGE_JSON,
+    content_hash: Optional[str] = None,
+    upsert: bool = False
+) -> dict:
+    """Écrit le résultat d'un job d'upload dans le CoutsSalariauxFile cible"""
+    data, column_mapping = parsed
+    service.parse_cache.put(content_hash, data, column_mapping)
+    db = SessionLocal()
+    try:
+        if append and crud.get_couts_salariaux_file_source(db, job.file_id, content_hash):
+            # Contenu déjà ajouté à ce fichier : rien à faire
+            db_file = crud.get_couts_salariaux_file(db, job.file_id)
+            return {"appended": False, "deduplicated": True, "total_records": db_file.total_records}
+        upsert_counts = None
+        if append and upsert:
+            db_file, upsert_counts = service.upsert_records(db, job.file_id, data, content_hash, job.filename)
+        elif append:
+            db_file = service.append_records(db, job.file_id, data, content_hash, job.filename)
+        else:
+            db_file = service.replace_records(db, job.file_id, data, storage, content_hash)
+        if not db_file:
+            raise LookupError(f"Fichier {job.file_id} non trouvé")
+        return {
+            "appended": append,
+            "total_records": db_file.total_records,
+            "column_mapping": column_mapping,
+            "upsert_counts": upsert_counts
+        }
+    finally:
+        db.close()
+
+
+def _discard_placeholder_file(job: jobs.Job):
+    """Job en erreur : supprime le fichier vide créé à l'acceptation de l'upload"""
+    db = SessionLocal()
+    try:
+        db_file = crud.get_couts_salariaux_file(db, job.file_id)
+        if db_file and not db_file.total_records:
+            crud.delete_couts_salariaux_file(db, job.file_id)
+            logger.info(f"Job {job.id} - fichier vide ID {job.file_id} supprimé")
+    finally:
+        db.close()
+    job.file_id = None
+
+
+@router.post("/upload-async", response_model=schemas.CoutsSalariauxJob, status_code=202)
+async def upload_couts_salariaux_async(
+    file: UploadFile = File(...),
+    append_to_file_id: Optional[int] = Form(None, description="ID du fichier existant pour ajouter les données"),
+    storage: str = Form(service.STORAGE_JSON, description="Format de stockage: json ou columnar (compact)"),
+    upsert: bool = Form(False, description="Avec append_to_file_id : fusion par (Matricule, Mois) au lieu d'un simple ajout"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Upload accepté immédiatement, traitement en arrière-plan (suivi via /jobs/{job_id})
+    """
+    if not file.filename.endswith(service.SUPPORTED_EXTENSIONS):
+        raise HTTPException(status_code=400, detail="Format de fichier non supporté. Utilisez .xlsx, .xls ou .csv")
+    if storage not in service.INLINE_STORAGES:
+        raise HTTPException(status_code=400, detail="Format de stockage non supporté. Utilisez json ou columnar")
+    
+    queue = jobs.get_job_queue()
+    if queue.pending_count() >= queue.max_pending:
+        raise HTTPException(status_code=429, detail="Trop de traitements en attente, réessayez plus tard")
+    
+    content = await file.read()
+    if append_to_file_id:
+        if not crud.get_couts_salariaux_file(db, append_to_file_id):
+            raise HTTPException(status_code=404, detail="Fichier de destination non trouvé")
+        file_id = append_to_file_id
+    else:
+        # Enregistrement créé tout de suite, complété à la fin du job
+        file_id = service.create_file(db, file.filename, [], current_user.id).id
+    
+    try:
+        job = queue.submit(
+            "couts_salariaux_upload",
+            service.parse_upload,
+            (content, file.filename),
+            partial(
+                _store_upload_job,
+                append=bool(append_to_file_id),
+                storage=storage,
+                content_hash=service.content_fingerprint(content),
+                upsert=upsert
+            ),
+            filename=file.filename,
+            file_id=file_id,
+            on_failure=None if append_to_file_id else _discard_placeholder_file
+        )
+    except jobs.QueueFullError as e:
+        if not append_to_file_id:
+            crud.delete_couts_salariaux_file(db, file_id)
+        raise HTTPException(status_code=429, detail=str(e))
+    return job.as_dict()
+
+@router.get("/jobs/{job_id}", response_model=schemas.CoutsSalariauxJob)
+async def get_couts_salariaux_job(
+    job_id: str,
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    État et avancement d'un traitement en arrière-plan
+    """
+    job = jobs.get_job_queue().get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job non trouvé")
+    return job.as_dict()
 
 @router.get("/files")
 async def list_couts_salariaux_files(
@@ -286,18 +393,33 @@ async def list_couts_salariaux_files(
 @router.get("/files/{file_id}")
 async def get_couts_salariaux_file(
     file_id: int,
+    columns: Optional[List[str]] = Query(None, description="Colonnes à retourner (toutes par défaut)"),
+    encoding: str = Query("json", alias="format", description="json (lignes) ou columnar (format compact)"),
+    mois: Optional[List[str]] = Query(None, description="Mois à retourner (préfixe, ex. 2025-01)"),
+    services: Optional[List[str]] = Query(None, alias="service", description="Services à retourner"),
+    p_hp: Optional[List[str]] = Query(None, description="Valeurs P / HP à retourner"),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
     """
     Récupère les données d'un fichier de coûts salariaux
     """
+    if encoding not in ("json", "columnar"):
+        raise HTTPException(status_code=400, detail="Format non supporté. Utilisez json ou columnar")
     try:
         file = crud.get_couts_salariaux_file(db, file_id)
         if not file:
             raise HTTPException(status_code=404, detail="Fichier non trouvé")
         
-        data = json.loads(file.processed_data)
+        filters = service.record_filters(mois, services, p_hp)
+        if encoding == "columnar":
+            return Response(
+                content=service.encode_for_transfer(db, file, columns, filters),
+                media_type=columnar.MEDIA_TYPE,
+                headers={"X-Total-Records": str(file.total_records)}
+            )
+        
+        data = service.load_records(db, file, columns, filters)
         return {
             "success": True,
             "data": data,
@@ -305,13 +427,85 @@ async def get_couts_salariaux_file(
                 "id": file.id,
                 "filename": file.filename,
                 "uploaded_at": file.uploaded_at.isoformat(),
-                "total_records": file.total_records
+                "total_records": file.total_records,
+                "storage_format": file.storage_format
             }
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Erreur lors de la récupération des données du fichier: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erreur lors de la récupération des données: {str(e)}")
 
+def _stream_export(file_id: int, encoding: str, columns: Optional[List[str]], filters: dict):
+    # Session propre au flux : la réponse est envoyée après la fin de la requête
+    db = SessionLocal()
+    try:
+        file = crud.get_couts_salariaux_file(db, file_id)
+        chunks = export.iter_xlsx if encoding == "xlsx" else export.iter_csv
+        yield from chunks(db, file, columns, filters)
+    finally:
+        db.close()
+
+@router.get("/files/{file_id}/export")
+async def export_couts_salariaux_file(
+    file_id: int,
+    encoding: str = Query("csv", alias="format", description="csv ou xlsx"),
+    columns: Optional[List[str]] = Query(None, description="Colonnes à exporter (toutes par défaut)"),
+    mois: Optional[List[str]] = Query(None, description="Mois à exporter (préfixe, ex. 2025-01)"),
+    services: Optional[List[str]] = Query(None, alias="service", description="Services à exporter"),
+    p_hp: Optional[List[str]] = Query(None, description="Valeurs P / HP à exporter"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Export CSV ou XLSX d'un fichier de coûts salariaux, envoyé au fil de l'eau
+    """
+    if encoding not in ("csv", "xlsx"):
+        raise HTTPException(status_code=400, detail="Format non supporté. Utilisez csv ou xlsx")
+    file = crud.get_couts_salariaux_file(db, file_id)
+    if not file:
+        raise HTTPException(status_code=404, detail="Fichier non trouvé")
+    
+    filename = export.export_filename(file, encoding)
+    logger.info(f"Export {encoding} du fichier ID {file_id}: {filename}")
+    return StreamingResponse(
+        _stream_export(file_id, encoding, columns, service.record_filters(mois, services, p_hp)),
+        media_type=export.XLSX_MEDIA_TYPE if encoding == "xlsx" else export.CSV_MEDIA_TYPE,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.get("/files/{file_id}/couts-horaires", response_model=List[schemas.CoutHoraireSalarie])
+async def get_couts_horaires(
+    file_id: int,
+    year: Optional[int] = Query(None, description="Mois de cette année seulement"),
+    par_emploi: bool = Query(True, description="Détail par emploi (sinon par service)"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Coût horaire chargé (Coût global / Heures réelles) par service et emploi
+    """
+    file = crud.get_couts_salariaux_file(db, file_id)
+    if not file:
+        raise HTTPException(status_code=404, detail="Fichier non trouvé")
+    return await run_in_threadpool(horaires.file_hourly_rates, db, file, year, par_emploi)
+
+
+@router.get("/files/{file_id}/couts-mensuels", response_model=List[schemas.CoutsSalariaux])
+async def get_couts_mensuels(
+    file_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Coûts salariaux par mois (Brut, Charges patronales, Suppléments) répartis P / HP
+    """
+    file = crud.get_couts_salariaux_file(db, file_id)
+    if not file:
+        raise HTTPException(status_code=404, detail="Fichier non trouvé")
+    return await run_in_threadpool(mensuel.get_monthly_costs, db, file)
+
 @router.put("/files/{file_id}", response_model=schemas.CoutsSalariauxFile)
 async def update_couts_salariaux_file(
     file_id: int,
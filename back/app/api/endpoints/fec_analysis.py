@@ -0,0 +1,277 @@
+import json
+import logging
+import os
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import get_db
+from app.auth import get_current_user
+from app import crud, schemas, models
+from app.services import fec as fec_service
+from app.services import fec_classifier
+from app.services import fec_parallel
+from app.services import fec_aggregates
+from app.services import couts_salariaux_mensuel
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+FEC_EXTENSIONS = (".txt", ".csv", ".tsv")
+
+@router.post("/upload", response_model=schemas.FECUploadResponse)
+async def upload_fec(
+    file: UploadFile = File(...),
+    societe: Optional[str] = Form(None, description="Société (règles de classification spécifiques)"),
+    couts_salariaux_file_id: Optional[int] = Form(None, description="Fichier de paie : répartition P / HP des coûts salariaux"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Upload et analyse d'un FEC (séparateur tabulation ou |), résultats par mois
+    """
+    if not file.filename.lower().endswith(FEC_EXTENSIONS):
+        raise HTTPException(status_code=400, detail="Format de fichier non supporté. Utilisez un FEC .txt ou .csv")
+    payroll_file = None
+    if couts_salariaux_file_id is not None:
+        payroll_file = crud.get_couts_salariaux_file(db, couts_salariaux_file_id)
+        if not payroll_file:
+            raise HTTPException(status_code=404, detail="Fichier de coûts salariaux non trouvé")
+    
+    # Fichier copié sur disque par blocs, lu ensuite par plages (mmap) sur un process pool
+    path, size = await run_in_threadpool(fec_parallel.spool_to_disk, file.file)
+    try:
+        logger.info(f"FEC - Début analyse: {file.filename}, taille: {size} bytes")
+        classifier = fec_classifier.get_classifier(db, societe)
+        
+        # Analyse, grand livre typé (inséré plage par plage), segments et agrégats mensuels : une seule transaction
+        analysis = crud.begin_fec_analysis(db, file.filename, current_user.id, societe)
+        try:
+            results, total_lines = await run_in_threadpool(
+                fec_parallel.analyze_fec_file,
+                path,
+                classifier,
+                lambda entries: crud.add_fec_ledger_lines(db, analysis.id, fec_service.ledger_batches(entries)),
+                settings.FEC_CHUNK_MB << 20,
+                settings.FEC_MAX_WORKERS or None
+            )
+            if not results:
+                raise HTTPException(status_code=400, detail="Aucune écriture exploitable dans le fichier")
+            if payroll_file:
+                # Coûts mensuels de la paie (en cache) à la place de la répartition déduite du FEC
+                costs = await run_in_threadpool(couts_salariaux_mensuel.get_monthly_costs, db, payroll_file)
+                replaced = couts_salariaux_mensuel.apply_to_results(results, costs)
+                logger.info(f"FEC - Coûts salariaux du fichier ID {payroll_file.id}: {replaced} mois sur {len(results)}")
+        except Exception:
+            db.rollback()
+            raise
+        
+        analysis = await run_in_threadpool(
+            crud.finish_fec_analysis,
+            db,
+            analysis,
+            results,
+            fec_service.segments_by_type(results),
+            fec_aggregates.aggregate_rows(results)
+        )
+        logger.info(f"FEC - Analyse ID {analysis.id}: {total_lines} lignes, {len(results)} mois")
+        
+        return schemas.FECUploadResponse(
+            status="success",
+            filename=file.filename,
+            analysis_id=analysis.id,
+            total_lines=total_lines,
+            data=results
+        )
+    
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"FEC - Erreur lors de l'analyse: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Erreur lors de l'analyse: {str(e)}")
+    finally:
+        os.remove(path)
+
+@router.get("/analyses", response_model=List[schemas.FECAnalysisSummary])
+async def list_fec_analyses(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Liste des analyses FEC
+    """
+    analyses = crud.get_fec_analyses(db)
+    return [
+        schemas.FECAnalysisSummary(
+            id=analysis.id,
+            filename=analysis.filename,
+            upload_date=analysis.upload_date,
+            societe=analysis.societe,
+            mois=[result["production"]["mois_annee"] for result in json.loads(analysis.results)]
+        )
+        for analysis in analyses
+    ]
+
+@router.get("/analyses/{analysis_id}", response_model=schemas.FECAnalysis)
+async def get_fec_analysis(
+    analysis_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Résultats d'une analyse FEC
+    """
+    analysis = crud.get_fec_analysis(db, analysis_id)
+    if not analysis:
+        raise HTTPException(status_code=404, detail="Analyse non trouvée")
+    return schemas.FECAnalysis(
+        id=analysis.id,
+        filename=analysis.filename,
+        upload_date=analysis.upload_date,
+        user_id=analysis.user_id,
+        results=json.loads(analysis.results),
+        societe=analysis.societe
+    )
+
+@router.get("/analyses/{analysis_id}/lignes", response_model=schemas.FECLedgerPage)
+async def get_fec_ledger_lines(
+    analysis_id: int,
+    compte: Optional[str] = Query(None, description="Préfixe de compte (ex. 62, 6226)"),
+    mois: Optional[str] = Query(None, description="Mois AAAA-MM"),
+    journal: Optional[str] = Query(None, description="Code journal"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=5000),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Lignes du grand livre d'une analyse (ex. toutes les charges 62x de mars)
+    """
+    if not crud.get_fec_analysis(db, analysis_id):
+        raise HTTPException(status_code=404, detail="Analyse non trouvée")
+    return schemas.FECLedgerPage(
+        total=crud.count_fec_ledger_lines(db, analysis_id, compte, mois, journal),
+        lignes=crud.get_fec_ledger_lines(db, analysis_id, compte, mois, journal, skip, limit)
+    )
+
+@router.get("/analyses/{analysis_id}/comptes", response_model=List[schemas.FECAccountTotal])
+async def get_fec_account_totals(
+    analysis_id: int,
+    compte: Optional[str] = Query(None, description="Préfixe de compte (ex. 62, 6226)"),
+    mois: Optional[str] = Query(None, description="Mois AAAA-MM"),
+    journal: Optional[str] = Query(None, description="Code journal"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Totaux débit/crédit par compte et par mois pour un préfixe de compte
+    """
+    if not crud.get_fec_analysis(db, analysis_id):
+        raise HTTPException(status_code=404, detail="Analyse non trouvée")
+    return [
+        schemas.FECAccountTotal(
+            CompteNum=compte_num,
+            CompteLib=compte_lib,
+            mois_annee=mois_annee,
+            debit=round(debit or 0, 2),
+            credit=round(credit or 0, 2),
+            solde=round((debit or 0) - (credit or 0), 2),
+            lignes=lignes
+        )
+        for compte_num, compte_lib, mois_annee, debit, credit, lignes
+        in crud.get_fec_ledger_account_totals(db, analysis_id, compte, mois, journal)
+    ]
+
+@router.get("/comparaisons", response_model=schemas.FECComparison)
+async def compare_fec_periods(
+    mode: str = Query(fec_aggregates.MODE_MOM, description="mom (mois précédent), yoy (même mois N-1), ytd (cumul d'exercice)"),
+    analysis_ids: Optional[List[int]] = Query(None, description="Analyses à comparer"),
+    societe: Optional[str] = Query(None, description="Toutes les analyses de la société"),
+    segment: Optional[str] = Query(None, description="Segment (ex. production, charges_directes)"),
+    mois_debut: Optional[str] = Query(None, description="Premier mois AAAA-MM"),
+    mois_fin: Optional[str] = Query(None, description="Dernier mois AAAA-MM"),
+    debut_exercice: int = Query(1, ge=1, le=12, description="Mois de début d'exercice (mode ytd)"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Comparaison entre périodes sur les agrégats mensuels ; un mois couvert par plusieurs
+    analyses est pris dans la plus récente
+    """
+    if mode not in fec_aggregates.MODES:
+        raise HTTPException(status_code=400, detail=f"Mode invalide: {mode} (mom, yoy ou ytd)")
+    if not analysis_ids and not societe:
+        raise HTTPException(status_code=400, detail="Indiquez des analyses (analysis_ids) ou une société")
+    
+    ids = analysis_ids or crud.get_fec_analysis_ids(db, societe)
+    rows = crud.get_fec_monthly_aggregates(db, ids)
+    return schemas.FECComparison(
+        mode=mode,
+        analyses=sorted({row["analysis_id"] for row in rows}),
+        lignes=fec_aggregates.compare(rows, mode, debut_exercice, segment, mois_debut, mois_fin)
+    )
+
+@router.delete("/analyses/{analysis_id}")
+async def delete_fec_analysis(
+    analysis_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Supprime une analyse FEC
+    """
+    if not crud.delete_fec_analysis(db, analysis_id):
+        raise HTTPException(status_code=404, detail="Analyse non trouvée")
+    return {"message": "Analyse supprimée avec succès"}
+
+@router.get("/classification", response_model=schemas.FECClassification)
+async def get_fec_classification(
+    societe: Optional[str] = Query(None, description="Société (règles communes seulement si absent)"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Règles de classification des comptes : défaut et règles enregistrées
+    """
+    return schemas.FECClassification(
+        societe=societe,
+        regles_par_defaut=[
+            schemas.FECClassificationRuleBase(prefix=prefix, segment=segment, sous_total=sous_total)
+            for prefix, (segment, sous_total) in sorted(fec_service.PREFIX_RULES.items())
+        ],
+        regles_specifiques=crud.get_fec_classification_rules(db, societe)
+    )
+
+@router.put("/classification/regles", response_model=schemas.FECClassificationRule)
+async def save_fec_classification_rule(
+    rule: schemas.FECClassificationRuleCreate,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Crée ou met à jour une règle (clé : société + préfixe), prise en compte aux prochaines analyses
+    """
+    error = fec_classifier.validate_rule(rule.prefix, rule.segment, rule.sous_total)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+    db_rule = crud.upsert_fec_classification_rule(db, rule)
+    fec_classifier.invalidate()
+    return db_rule
+
+@router.delete("/classification/regles/{rule_id}")
+async def delete_fec_classification_rule(
+    rule_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Supprime une règle de classification
+    """
+    if not crud.delete_fec_classification_rule(db, rule_id):
+        raise HTTPException(status_code=404, detail="Règle non trouvée")
+    fec_classifier.invalidate()
+    return {"message": "Règle supprimée avec succès"}
@@ -0,0 +1,443 @@
+import logging
+import os
+from datetime import date
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import get_db
+from app.auth import get_current_user
+from app import crud, schemas, models
+from app.services import machine_runtime as runtime
+from app.services import machine_runtime_stats
+from app.services import machine_runtime_rollups as rollups
+from app.services import cout_de_revient
+from app.services import machine_planning
+from app.services import main_oeuvre
+from app.services import couts_salariaux_horaires
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+def _machine(db: Session, machine: str, year: Optional[int] = None) -> Optional[models.Machine]:
+    """Machine du Gantt correspondant à l'identifiant de la page (la plus récente si plusieurs années)"""
+    matches = [
+        m for m in db.query(models.Machine).all()
+        if runtime.machine_key(m.name) == machine and (year is None or m.year == year)
+    ]
+    return max(matches, key=lambda m: m.year) if matches else None
+
+
+def _machine_id(db: Session, machine: str) -> Optional[int]:
+    db_machine = _machine(db, machine)
+    return db_machine.id if db_machine else None
+
+
+@router.get("/couts-de-revient", response_model=schemas.MachineCostBatch)
+async def get_machine_costs(
+    year: int = Query(..., description="Année des machines du Gantt"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Coût de revient horaire de toutes les machines d'une année (calcul vectorisé, mis en cache
+    jusqu'à la modification d'une entrée)
+    """
+    return schemas.MachineCostBatch(year=year, machines=cout_de_revient.year_costs(db, year))
+
+
+@router.post("/couts-de-revient/scenarios", response_model=schemas.MachineCostScenarioResponse)
+async def simulate_machine_costs(
+    request: schemas.MachineCostScenarioRequest,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Scénarios de coût de revient : chaque axe fait varier une entrée (facteur ou valeurs),
+    toutes les combinaisons sont calculées pour toutes les machines de l'année
+    """
+    if request.sortie not in cout_de_revient.OUTPUTS:
+        raise HTTPException(status_code=400, detail=f"Sortie invalide: {request.sortie}")
+    if not request.axes:
+        raise HTTPException(status_code=400, detail="Indiquez au moins un axe de scénario")
+    axes = []
+    for axis in request.axes:
+        if axis.entree not in cout_de_revient.INPUTS:
+            raise HTTPException(status_code=400, detail=f"Entrée inconnue: {axis.entree}")
+        if axis.mode not in cout_de_revient.MODES:
+            raise HTTPException(status_code=400, detail=f"Mode invalide: {axis.mode} (facteur ou valeur)")
+        if any(axis.entree == name for name, _, _ in axes):
+            raise HTTPException(status_code=400, detail=f"Entrée balayée deux fois: {axis.entree}")
+        values = cout_de_revient.axis_values(axis.valeurs, axis.debut, axis.fin, axis.points)
+        if values is None:
+            raise HTTPException(status_code=400, detail=f"Axe {axis.entree}: indiquez des valeurs ou debut, fin et points")
+        axes.append((axis.entree, axis.mode, values))
+
+    machines, arrays = cout_de_revient.year_inputs(db, request.year, request.machine_ids)
+    if not machines:
+        raise HTTPException(status_code=404, detail="Aucune machine avec des entrées de coût de revient pour cette année")
+    points = cout_de_revient.grid_size(len(machines), axes)
+    if points > settings.COST_SCENARIO_MAX_POINTS:
+        raise HTTPException(status_code=400, detail=f"Trop de points ({points}), maximum {settings.COST_SCENARIO_MAX_POINTS}")
+    if request.inclure_detail and points > settings.COST_SCENARIO_MAX_DETAIL:
+        raise HTTPException(status_code=400, detail=f"Détail limité à {settings.COST_SCENARIO_MAX_DETAIL} points ({points} demandés)")
+
+    tables = await run_in_threadpool(
+        cout_de_revient.scenario_tables, machines, arrays, axes, request.sortie, request.inclure_detail
+    )
+    logger.info(f"Scénarios coût de revient {request.year}: {points} points, {len(machines)} machine(s)")
+    return schemas.MachineCostScenarioResponse(year=request.year, sortie=request.sortie, **tables)
+
+
+@router.get("/utilisation", response_model=schemas.MachineUtilisationResponse)
+async def get_machine_utilisation(
+    year: int = Query(..., description="Année du Gantt"),
+    heures_par_semaine: Optional[float] = Query(None, gt=0, description="Heures prévues par semaine planifiée"),
+    seuil_bas: float = Query(0.5, ge=0, description="Sous-utilisation si réel < seuil_bas x prévu"),
+    seuil_haut: float = Query(1.1, ge=0, description="Sur-utilisation si réel > seuil_haut x prévu"),
+    anomalies_seulement: bool = Query(False, description="Ne renvoyer que les semaines signalées"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Rapprochement par semaine ISO entre les tâches du Gantt (prévu) et les rapports de
+    fonctionnement (réel), avec les sous- et sur-utilisations
+    """
+    if seuil_bas > seuil_haut:
+        raise HTTPException(status_code=400, detail="seuil_bas doit être inférieur à seuil_haut")
+    hours = heures_par_semaine or settings.MACHINE_PLANNED_HOURS_PER_WEEK
+    return schemas.MachineUtilisationResponse(
+        year=year,
+        heures_par_semaine=hours,
+        seuil_bas=seuil_bas,
+        seuil_haut=seuil_haut,
+        machines=machine_planning.year_utilisation(db, year, hours, seuil_bas, seuil_haut, anomalies_seulement)
+    )
+
+
+@router.get("/main-oeuvre/services", response_model=List[schemas.MachineServiceMapping])
+async def get_machine_service_mappings(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Table service de la paie -> machines pondérées (clé de répartition "services")"""
+    return crud.get_machine_service_mappings(db)
+
+
+@router.put("/main-oeuvre/services", response_model=List[schemas.MachineServiceMapping])
+async def replace_machine_service_mappings(
+    mappings: List[schemas.MachineServiceMappingBase],
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Remplace toute la table service -> machines"""
+    seen = set()
+    for mapping in mappings:
+        if mapping.poids < 0:
+            raise HTTPException(status_code=400, detail=f"Poids négatif pour le service {mapping.service}")
+        if (mapping.service, mapping.machine_id) in seen:
+            raise HTTPException(status_code=400, detail=f"Machine {mapping.machine_id} en double pour le service {mapping.service}")
+        seen.add((mapping.service, mapping.machine_id))
+        if not crud.get_machine(db, mapping.machine_id):
+            raise HTTPException(status_code=404, detail=f"Machine {mapping.machine_id} non trouvée")
+    return crud.replace_machine_service_mappings(db, mappings)
+
+
+@router.get("/main-oeuvre", response_model=schemas.MachineLaborResponse)
+async def get_machine_labor(
+    file_id: int = Query(..., description="Fichier de coûts salariaux"),
+    year: Optional[int] = Query(None, description="Mois de paie de cette année seulement"),
+    cles: Optional[List[str]] = Query(None, description="Clés de répartition, par priorité : affectations, services, couverture"),
+    production_seulement: bool = Query(True, description="Ne répartir que les salariés P"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Coût global de la paie réparti par machine et semaine ISO. Avec les paramètres par
+    défaut, la répartition est enregistrée et seuls les mois dont les lignes, le Gantt,
+    les affectations ou la table des services ont changé sont recalculés ; les autres
+    paramètres sont calculés à la demande
+    """
+    keys = cles or list(main_oeuvre.KEYS)
+    unknown = [key for key in keys if key not in main_oeuvre.KEYS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Clé(s) inconnue(s): {', '.join(unknown)} (attendu: {', '.join(main_oeuvre.KEYS)})")
+    if len(set(keys)) != len(keys):
+        raise HTTPException(status_code=400, detail="Clé de répartition en double")
+    db_file = crud.get_couts_salariaux_file(db, file_id)
+    if not db_file:
+        raise HTTPException(status_code=404, detail="Fichier non trouvé")
+    return await run_in_threadpool(main_oeuvre.file_allocations, db, db_file, keys, production_seulement, year)
+
+
+@router.post("/upload/{machine}", response_model=schemas.MachineRuntimeUploadResponse)
+async def upload_machine_report(
+    machine: str,
+    file: UploadFile = File(...),
+    conflits: str = Query(crud.MACHINE_RUNTIME_REPLACE, description="Jour déjà connu avec une autre durée : remplacer ou conserver"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Upload d'un rapport PDF de temps de fonctionnement : durées par jour fusionnées dans celles
+    de la machine (un jour déjà présent n'est compté qu'une fois, les conflits sont signalés)
+    """
+    if not file.filename.lower().endswith(".pdf"):
+        raise HTTPException(status_code=400, detail="Format de fichier non supporté. Utilisez un rapport PDF")
+    if conflits not in (crud.MACHINE_RUNTIME_REPLACE, crud.MACHINE_RUNTIME_KEEP):
+        raise HTTPException(status_code=400, detail=f"Mode de conflit invalide: {conflits} (remplacer ou conserver)")
+
+    # Rapport copié sur disque : les workers d'extraction ouvrent chacun leurs pages
+    path = await run_in_threadpool(runtime.spool_to_disk, file.file)
+    try:
+        logger.info(f"Machine {machine} - Début lecture: {file.filename}, taille: {os.path.getsize(path)} bytes")
+        days = await run_in_threadpool(
+            runtime.extract_days,
+            path,
+            settings.MACHINE_REPORT_MAX_WORKERS or None,
+            settings.MACHINE_REPORT_PAGES_PER_TASK
+        )
+    except Exception as e:
+        logger.error(f"Machine {machine} - Erreur lors de la lecture du PDF: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"Erreur lors de la lecture du PDF: {str(e)}")
+    finally:
+        os.remove(path)
+    if not days:
+        raise HTTPException(status_code=400, detail="Aucune durée de fonctionnement trouvée dans le rapport")
+
+    db_file, merge = crud.create_machine_runtime_file(
+        db, machine, file.filename, days, _machine_id(db, machine), current_user.id, conflits
+    )
+    stats = runtime.period_stats(days)
+    logger.info(
+        f"Machine {machine} - Rapport ID {db_file.id}: {len(days)} jours, "
+        f"{merge['jours_ajoutes']} ajoutés, {len(merge['conflits'])} conflit(s)"
+    )
+
+    return schemas.MachineRuntimeUploadResponse(
+        status="success",
+        machine=machine,
+        file_id=db_file.id,
+        fichier=file.filename,
+        donnees=[
+            schemas.MachineRuntimeDonnee(date=runtime.format_date(jour), duree_totale=runtime.format_duration(secondes))
+            for jour, secondes in sorted(days.items())
+        ],
+        stats_globales=stats,
+        somme_totale=stats["somme_totale_periodes"],
+        fusion=schemas.MachineRuntimeFusion(
+            jours_ajoutes=merge["jours_ajoutes"],
+            jours_remplaces=merge["jours_remplaces"],
+            jours_identiques=merge["jours_identiques"],
+            jours_conserves=merge["jours_conserves"],
+            conflits=[
+                schemas.MachineRuntimeConflit(
+                    date=runtime.format_date(conflict["jour"]),
+                    duree_existante=runtime.format_duration(conflict["duree_existante"]),
+                    duree_nouvelle=runtime.format_duration(conflict["duree_nouvelle"]),
+                    file_id_existant=conflict["file_id_existant"],
+                    retenue=conflict["retenue"]
+                )
+                for conflict in merge["conflits"]
+            ]
+        )
+    )
+
+@router.delete("/delete_file/{machine}/{filename}")
+async def delete_machine_report(
+    machine: str,
+    filename: str,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Supprime un rapport et les jours retenus depuis ce rapport (un jour aussi couvert
+    par un autre rapport reprend la valeur de celui-ci)
+    """
+    if not crud.delete_machine_runtime_file(db, machine, filename):
+        raise HTTPException(status_code=404, detail="Fichier non trouvé")
+    return {"message": "Fichier supprimé avec succès"}
+
+@router.get("/{machine}/fichiers", response_model=List[schemas.MachineRuntimeFile])
+async def list_machine_reports(
+    machine: str,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Rapports enregistrés pour une machine (une période par fichier)
+    """
+    return crud.get_machine_runtime_files(db, machine)
+
+@router.get("/{machine}/jours", response_model=List[schemas.MachineRuntimeJour])
+async def get_machine_runtime_days(
+    machine: str,
+    date_debut: Optional[date] = Query(None, description="Premier jour (AAAA-MM-JJ)"),
+    date_fin: Optional[date] = Query(None, description="Dernier jour (AAAA-MM-JJ)"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Durées de fonctionnement par jour d'une machine sur une plage de dates
+    """
+    return [
+        schemas.MachineRuntimeJour(
+            date=runtime.format_date(day.jour),
+            duree_totale=runtime.format_duration(day.duree_secondes),
+            duree_secondes=day.duree_secondes,
+            file_id=day.file_id
+        )
+        for day in crud.get_machine_runtime_days(db, machine, date_debut, date_fin)
+    ]
+
+@router.post("/{machine}/statistiques", response_model=schemas.MachineRuntimeStatsResponse)
+async def get_machine_runtime_stats(
+    machine: str,
+    request: schemas.MachineRuntimeStatsRequest,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Statistiques de chaque période demandée et de leur ensemble (min / max datés, moyennes
+    productive et par jour ouvré, total, jours ouvrés sans production)
+    """
+    if not request.periodes:
+        raise HTTPException(status_code=400, detail="Indiquez au moins une période")
+    periods = [(p.date_debut, p.date_fin) for p in request.periodes]
+    for start, end in periods:
+        if start and end and start > end:
+            raise HTTPException(status_code=400, detail=f"Période invalide: {start} après {end}")
+
+    series = machine_runtime_stats.get_series(db, machine)
+    per_period, overall = machine_runtime_stats.multi_period_stats(series, periods, request.jours_feries)
+    return schemas.MachineRuntimeStatsResponse(
+        machine=machine,
+        periodes=[
+            schemas.MachineRuntimePeriodeStats(date_debut=start, date_fin=end, **stats)
+            for (start, end), stats in zip(periods, per_period)
+        ],
+        globales=schemas.MachineRuntimePeriodeStats(
+            date_debut=min((start for start, _ in periods), default=None) if all(start for start, _ in periods) else None,
+            date_fin=max((end for _, end in periods), default=None) if all(end for _, end in periods) else None,
+            **overall
+        )
+    )
+
+@router.get("/{machine}/serie", response_model=schemas.MachineRuntimeSerie)
+async def get_machine_runtime_series(
+    machine: str,
+    date_debut: Optional[date] = Query(None, description="Premier jour (AAAA-MM-JJ), par défaut le premier jour connu"),
+    date_fin: Optional[date] = Query(None, description="Dernier jour (AAAA-MM-JJ), par défaut le dernier jour connu"),
+    points: int = Query(400, ge=1, le=10000, description="Nombre de points maximal"),
+    niveau: Optional[str] = Query(None, description="jour, semaine, mois ou annee (par défaut selon la plage et le nombre de points)"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Série de temps de fonctionnement pour les graphiques : jours, ou agrégats semaine / mois / année
+    choisis pour que la plage tienne dans le nombre de points demandé
+    """
+    if niveau and niveau not in rollups.LEVELS:
+        raise HTTPException(status_code=400, detail=f"Niveau invalide: {niveau} (jour, semaine, mois ou annee)")
+    first, last = crud.get_machine_runtime_extent(db, machine)
+    if first is None:
+        return schemas.MachineRuntimeSerie(machine=machine, niveau=niveau or rollups.LEVEL_DAY, points=[])
+    date_debut, date_fin = date_debut or first, date_fin or last
+    if date_debut > date_fin:
+        raise HTTPException(status_code=400, detail="date_debut doit précéder date_fin")
+
+    niveau = niveau or rollups.choose_level(date_debut, date_fin, points)
+    if niveau == rollups.LEVEL_DAY:
+        rows = [
+            {"periode": day.jour, "jours": 1, "total_secondes": day.duree_secondes,
+             "max_secondes": day.duree_secondes, "jours_productifs": int(day.duree_secondes > 0)}
+            for day in crud.get_machine_runtime_days(db, machine, date_debut, date_fin)
+        ]
+    else:
+        rows = crud.get_machine_runtime_rollups(db, machine, niveau, rollups.bucket_start(date_debut, niveau), date_fin)
+        rows = [
+            {"periode": row.periode, "jours": row.jours, "total_secondes": row.total_secondes,
+             "max_secondes": row.max_secondes, "jours_productifs": row.jours_productifs}
+            for row in rows
+        ]
+
+    return schemas.MachineRuntimeSerie(
+        machine=machine,
+        niveau=niveau,
+        date_debut=date_debut,
+        date_fin=date_fin,
+        points=[
+            schemas.MachineRuntimePoint(
+                **row,
+                moyenne_secondes=row["total_secondes"] // row["jours"] if row["jours"] else 0,
+                duree_totale=runtime.format_duration(row["total_secondes"])
+            )
+            for row in rows
+        ]
+    )
+
+def _machine_or_404(db: Session, machine: str, year: Optional[int]) -> models.Machine:
+    db_machine = _machine(db, machine, year)
+    if db_machine is None:
+        raise HTTPException(status_code=404, detail="Machine non trouvée dans le Gantt")
+    return db_machine
+
+@router.get("/{machine}/cout-de-revient", response_model=schemas.MachineCost)
+async def get_machine_cost(
+    machine: str,
+    year: Optional[int] = Query(None, description="Année (par défaut la plus récente)"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Entrées et coûts horaires calculés d'une machine
+    """
+    db_machine = _machine_or_404(db, machine, year)
+    return next(cost for cost in cout_de_revient.year_costs(db, db_machine.year) if cost["machine_id"] == db_machine.id)
+
+@router.put("/{machine}/cout-de-revient", response_model=schemas.MachineCost)
+async def save_machine_cost(
+    machine: str,
+    inputs: schemas.MachineCostInputsUpdate,
+    year: Optional[int] = Query(None, description="Année (par défaut la plus récente)"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Enregistre les entrées du coût de revient d'une machine (champs absents inchangés)
+    """
+    db_machine = _machine_or_404(db, machine, year)
+    crud.save_machine_cost_inputs(db, db_machine.id, inputs, current_user.id)
+    logger.info(f"Machine {machine} - Entrées du coût de revient enregistrées ({db_machine.year})")
+    return next(cost for cost in cout_de_revient.year_costs(db, db_machine.year) if cost["machine_id"] == db_machine.id)
+
+@router.post("/{machine}/cout-de-revient/salaire-operateur", response_model=schemas.MachineCost)
+async def apply_operator_rate(
+    machine: str,
+    file_id: int = Query(..., description="Fichier de coûts salariaux"),
+    service: str = Query(..., description="Service de la paie des opérateurs"),
+    emploi: Optional[str] = Query(None, description="Emploi (par défaut tous les emplois du service)"),
+    annee_paie: Optional[int] = Query(None, description="Année des mois de paie (par défaut l'année de la machine)"),
+    year: Optional[int] = Query(None, description="Année (par défaut la plus récente)"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Renseigne le salaire horaire chargé de l'opérateur depuis la paie (Coût global / Heures réelles)
+    """
+    db_machine = _machine_or_404(db, machine, year)
+    db_file = crud.get_couts_salariaux_file(db, file_id)
+    if not db_file:
+        raise HTTPException(status_code=404, detail="Fichier non trouvé")
+    payroll_year = annee_paie or db_machine.year
+    rate = await run_in_threadpool(couts_salariaux_horaires.operator_rate, db, db_file, service, emploi, payroll_year)
+    if rate is None:
+        raise HTTPException(status_code=404, detail=f"Aucune ligne de paie pour {service}{' / ' + emploi if emploi else ''} en {payroll_year}")
+    if rate["taux_horaire"] is None:
+        raise HTTPException(status_code=400, detail=f"Aucune heure réelle pour {service}{' / ' + emploi if emploi else ''} en {payroll_year}")
+    crud.save_machine_cost_inputs(db, db_machine.id, schemas.MachineCostInputsUpdate(salaire_operateur=rate["taux_horaire"]), current_user.id)
+    logger.info(f"Machine {machine} - Salaire opérateur {rate['taux_horaire']} €/h depuis la paie (fichier ID {file_id})")
+    return next(cost for cost in cout_de_revient.year_costs(db, db_machine.year) if cost["machine_id"] == db_machine.id)
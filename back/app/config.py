@@ -16,6 +16,37 @@ class Settings(BaseSettings):
     API_V1_STR: str = "/api/v1"
     PROJECT_NAME: str = "ARP Backend"
     
+    # Traitements en arrière-plan (process pool local)
+    JOB_MAX_WORKERS: int = 2
+    JOB_MAX_PENDING: int = 20
+    
+    # Cache des résultats de parsing (nombre total de lignes conservées)
+    PARSE_CACHE_MAX_ROWS: int = 200000
+    
+    # Process pool partagé par les requêtes : nombre de process (0 = nombre de cœurs)
+    # et de tâches soumises non terminées (0 = 2 par process)
+    PROCESS_POOL_MAX_WORKERS: int = 0
+    PROCESS_POOL_MAX_IN_FLIGHT: int = 0
+    
+    # Upload par lots : nombre maximal de fichiers et de parsings en parallèle par requête (0 = taille du pool partagé)
+    BATCH_MAX_FILES: int = 24
+    BATCH_MAX_WORKERS: int = 0
+    
+    # FEC : taille des plages lues par worker (Mo) et plages lues en parallèle par requête (0 = taille du pool partagé)
+    FEC_CHUNK_MB: int = 64
+    FEC_MAX_WORKERS: int = 0
+    
+    # Rapports PDF des machines : pages par tâche et plages extraites en parallèle par requête (0 = taille du pool partagé)
+    MACHINE_REPORT_PAGES_PER_TASK: int = 25
+    MACHINE_REPORT_MAX_WORKERS: int = 0
+    
+    # Scénarios de coût de revient : nombre maximal de points (machines × combinaisons), et de points renvoyés en détail
+    COST_SCENARIO_MAX_POINTS: int = 5_000_000
+    COST_SCENARIO_MAX_DETAIL: int = 10_000
+    
+    # Utilisation des machines : heures prévues pour une semaine couverte par une tâche du Gantt (7 h x 5 jours)
+    MACHINE_PLANNED_HOURS_PER_WEEK: float = 35
+    
     # CORS
     BACKEND_CORS_ORIGINS: List[str] = ["http://localhost:3000", "http://localhost:3001"]
     
@@ -1,5 +1,8 @@
+import json
+from sqlalchemy import func, insert, or_, tuple_, update
 from sqlalchemy.orm import Session
 from . import models, schemas
+from .services import machine_runtime_rollups as rollups
 from passlib.context import CryptContext
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -95,6 +98,10 @@ def create_machine(db: Session, machine: schemas.MachineCreate):
 def delete_machine(db: Session, machine_id: int):
     db_machine = get_machine(db, machine_id)
     if db_machine:
+        # Les rapports de fonctionnement restent, détachés du Gantt
+        db.query(models.MachineRuntimeFile).filter(
+            models.MachineRuntimeFile.machine_id == machine_id
+        ).update({models.MachineRuntimeFile.machine_id: None}, synchronize_session=False)
         db.delete(db_machine)
         db.commit()
         return True
@@ -379,6 +386,16 @@ def update_couts_salariaux_file(db: Session, file_id: int, file_update: schemas.
         return None
     
     update_data = file_update.dict(exclude_unset=True)
+    if "processed_data" in update_data and db_file.storage_format != "json":
+        # Le contenu repasse dans processed_data : lignes ou bloc colonnaire obsolètes
+        if db_file.storage_format == "rows":
+            delete_couts_salariaux_rows(db, file_id)
+        db_file.processed_blob = None
+        db_file.storage_format = "json"
+    if "processed_data" in update_data:
+        # Contenu remplacé : il ne correspond plus aux fichiers uploadés
+        db_file.content_hash = None
+        delete_couts_salariaux_file_sources(db, file_id)
     for field, value in update_data.items():
         setattr(db_file, field, value)
     
@@ -390,7 +407,676 @@ def update_couts_salariaux_file(db: Session, file_id: int, file_update: schemas.
 def delete_couts_salariaux_file(db: Session, file_id: int):
     db_file = get_couts_salariaux_file(db, file_id)
     if db_file:
+        delete_couts_salariaux_rows(db, file_id)
+        delete_couts_salariaux_file_sources(db, file_id)
+        delete_labor_allocation_months(db, file_id)
         db.delete(db_file)
         db.commit()
         return True
-    return False 
\ No newline at end of file
+    return False
+
+
+def get_couts_salariaux_rows(db: Session, file_id: int, mois_prefixes: list = None, seqs: tuple = None):
+    """
+    Lignes stockées d'un fichier, dans l'ordre d'origine (éventuellement limitées à des mois,
+    et aux seq de ]après, jusqu'à] si seqs = (après, jusqu'à))
+    """
+    query = db.query(models.CoutsSalariauxRow).filter(
+        models.CoutsSalariauxRow.file_id == file_id
+    )
+    if seqs:
+        query = query.filter(models.CoutsSalariauxRow.seq > seqs[0], models.CoutsSalariauxRow.seq <= seqs[1])
+    if mois_prefixes:
+        query = query.filter(or_(*(models.CoutsSalariauxRow.mois.like(f"{prefix}%") for prefix in mois_prefixes)))
+    return query.order_by(models.CoutsSalariauxRow.seq)
+
+
+def get_couts_salariaux_next_seq(db: Session, file_id: int) -> int:
+    max_seq = db.query(func.max(models.CoutsSalariauxRow.seq)).filter(
+        models.CoutsSalariauxRow.file_id == file_id
+    ).scalar()
+    return 0 if max_seq is None else max_seq + 1
+
+
+def insert_couts_salariaux_rows(db: Session, rows: list):
+    """Insertion en masse (sans commit) de dicts file_id/seq/matricule/mois/data"""
+    if rows:
+        db.execute(insert(models.CoutsSalariauxRow), rows)
+
+
+def get_couts_salariaux_rows_by_keys(db: Session, file_id: int, keys: list, batch_size: int = 500):
+    """Lignes (id, matricule, mois, data) d'un fichier pour les clés (matricule, mois) données, via l'index file_id/matricule/mois"""
+    rows = []
+    for start in range(0, len(keys), batch_size):
+        rows.extend(db.query(
+            models.CoutsSalariauxRow.id,
+            models.CoutsSalariauxRow.matricule,
+            models.CoutsSalariauxRow.mois,
+            models.CoutsSalariauxRow.data
+        ).filter(
+            models.CoutsSalariauxRow.file_id == file_id,
+            tuple_(models.CoutsSalariauxRow.matricule, models.CoutsSalariauxRow.mois).in_(keys[start:start + batch_size])
+        ).order_by(models.CoutsSalariauxRow.seq).all())
+    return rows
+
+
+def update_couts_salariaux_rows(db: Session, rows: list):
+    """Mise à jour en masse (sans commit) de dicts id/data"""
+    if rows:
+        db.execute(update(models.CoutsSalariauxRow), rows)
+
+
+def delete_couts_salariaux_rows_by_id(db: Session, row_ids: list):
+    """Supprime (sans commit) des lignes stockées par identifiant"""
+    if row_ids:
+        db.query(models.CoutsSalariauxRow).filter(
+            models.CoutsSalariauxRow.id.in_(row_ids)
+        ).delete(synchronize_session=False)
+
+
+def delete_couts_salariaux_rows(db: Session, file_id: int):
+    """Supprime (sans commit) les lignes stockées d'un fichier"""
+    db.query(models.CoutsSalariauxRow).filter(
+        models.CoutsSalariauxRow.file_id == file_id
+    ).delete(synchronize_session=False)
+
+
+def get_couts_salariaux_file_by_hash(db: Session, content_hash: str, resolver_version: int):
+    """Fichier créé à partir de ce contenu et resté inchangé depuis"""
+    return db.query(models.CoutsSalariauxFile).filter(
+        models.CoutsSalariauxFile.content_hash == content_hash,
+        models.CoutsSalariauxFile.resolver_version == resolver_version
+    ).order_by(models.CoutsSalariauxFile.id).first()
+
+
+def get_couts_salariaux_file_source(db: Session, file_id: int, content_hash: str):
+    return db.query(models.CoutsSalariauxFileSource).filter(
+        models.CoutsSalariauxFileSource.file_id == file_id,
+        models.CoutsSalariauxFileSource.content_hash == content_hash
+    ).first()
+
+
+def add_couts_salariaux_file_source(db: Session, file_id: int, content_hash: str, filename: str = None):
+    """Enregistre (sans commit) un contenu intégré au fichier"""
+    db.add(models.CoutsSalariauxFileSource(file_id=file_id, content_hash=content_hash, filename=filename))
+
+
+def delete_couts_salariaux_file_sources(db: Session, file_id: int):
+    """Supprime (sans commit) l'historique des contenus intégrés au fichier"""
+    db.query(models.CoutsSalariauxFileSource).filter(
+        models.CoutsSalariauxFileSource.file_id == file_id
+    ).delete(synchronize_session=False)
+
+
+# Analyses FEC CRUD operations
+def get_fec_analysis(db: Session, analysis_id: int):
+    return db.query(models.FECAnalysis).filter(models.FECAnalysis.id == analysis_id).first()
+
+
+def get_fec_analyses(db: Session, skip: int = 0, limit: int = 100):
+    return db.query(models.FECAnalysis).order_by(models.FECAnalysis.upload_date.desc()).offset(skip).limit(limit).all()
+
+
+def begin_fec_analysis(db: Session, filename: str, user_id: int, societe: str = None):
+    """Crée l'analyse sans commit (id disponible), pour y rattacher le grand livre au fil de la lecture"""
+    db_analysis = models.FECAnalysis(filename=filename, user_id=user_id, results="[]", societe=societe)
+    db.add(db_analysis)
+    db.flush()
+    return db_analysis
+
+
+def add_fec_ledger_lines(db: Session, analysis_id: int, ledger_batches):
+    """Insère (sans commit) des lots de lignes du grand livre (dicts sans analysis_id)"""
+    for batch in ledger_batches:
+        for row in batch:
+            row["analysis_id"] = analysis_id
+        db.execute(insert(models.FECLedgerLine), batch)
+
+
+def finish_fec_analysis(db: Session, db_analysis: models.FECAnalysis, results: list, segments: dict, aggregates: list = None):
+    """Résultats, un FECSegment par type de segment et agrégats mensuels, puis commit de toute l'analyse"""
+    try:
+        db_analysis.results = json.dumps(results, ensure_ascii=False)
+        db_analysis.segments = [
+            models.FECSegment(segment_type=segment_type, data=json.dumps(data, ensure_ascii=False))
+            for segment_type, data in segments.items()
+        ]
+        db.flush()
+        if aggregates:
+            _insert_fec_monthly_aggregates(db, db_analysis.id, aggregates)
+    except Exception:
+        db.rollback()
+        raise
+    db.commit()
+    db.refresh(db_analysis)
+    return db_analysis
+
+
+def create_fec_analysis(db: Session, filename: str, results: list, segments: dict, user_id: int, ledger_batches=None, societe: str = None, aggregates: list = None):
+    """
+    Crée l'analyse et un FECSegment par type de segment (données JSON par mois).
+    ledger_batches : lots de lignes du grand livre (dicts sans analysis_id), insérés dans la même transaction.
+    aggregates : agrégats mensuels (dicts sans analysis_id), insérés dans la même transaction.
+    """
+    db_analysis = begin_fec_analysis(db, filename, user_id, societe)
+    try:
+        add_fec_ledger_lines(db, db_analysis.id, ledger_batches or ())
+    except Exception:
+        db.rollback()
+        raise
+    return finish_fec_analysis(db, db_analysis, results, segments, aggregates)
+
+
+def delete_fec_analysis(db: Session, analysis_id: int):
+    db_analysis = get_fec_analysis(db, analysis_id)
+    if db_analysis:
+        db.query(models.FECLedgerLine).filter(
+            models.FECLedgerLine.analysis_id == analysis_id
+        ).delete(synchronize_session=False)
+        db.query(models.FECMonthlyAggregate).filter(
+            models.FECMonthlyAggregate.analysis_id == analysis_id
+        ).delete(synchronize_session=False)
+        db.delete(db_analysis)
+        db.commit()
+        return True
+    return False
+
+
+def _fec_ledger_query(db: Session, query, analysis_id: int, compte_prefix: str = None, mois: str = None, journal: str = None):
+    query = query.filter(models.FECLedgerLine.analysis_id == analysis_id)
+    if compte_prefix:
+        # Intervalle [préfixe, préfixe suivant) : utilise l'index, contrairement à LIKE
+        upper = compte_prefix[:-1] + chr(ord(compte_prefix[-1]) + 1)
+        query = query.filter(
+            models.FECLedgerLine.compte_num >= compte_prefix,
+            models.FECLedgerLine.compte_num < upper
+        )
+    if mois:
+        query = query.filter(models.FECLedgerLine.mois == mois)
+    if journal:
+        query = query.filter(models.FECLedgerLine.journal_code == journal)
+    return query
+
+
+def get_fec_ledger_lines(db: Session, analysis_id: int, compte_prefix: str = None, mois: str = None, journal: str = None, skip: int = 0, limit: int = 100):
+    """Lignes du grand livre d'une analyse, filtrées par préfixe de compte, mois et journal"""
+    query = _fec_ledger_query(db, db.query(models.FECLedgerLine), analysis_id, compte_prefix, mois, journal)
+    return query.order_by(models.FECLedgerLine.compte_num, models.FECLedgerLine.ecriture_date, models.FECLedgerLine.id).offset(skip).limit(limit).all()
+
+
+def count_fec_ledger_lines(db: Session, analysis_id: int, compte_prefix: str = None, mois: str = None, journal: str = None) -> int:
+    query = _fec_ledger_query(db, db.query(func.count(models.FECLedgerLine.id)), analysis_id, compte_prefix, mois, journal)
+    return query.scalar()
+
+
+def get_fec_ledger_account_totals(db: Session, analysis_id: int, compte_prefix: str = None, mois: str = None, journal: str = None):
+    """Totaux débit/crédit par compte (et par mois) pour un préfixe de compte"""
+    query = db.query(
+        models.FECLedgerLine.compte_num,
+        func.max(models.FECLedgerLine.compte_lib),
+        models.FECLedgerLine.mois,
+        func.sum(models.FECLedgerLine.debit),
+        func.sum(models.FECLedgerLine.credit),
+        func.count(models.FECLedgerLine.id)
+    )
+    query = _fec_ledger_query(db, query, analysis_id, compte_prefix, mois, journal)
+    return query.group_by(models.FECLedgerLine.compte_num, models.FECLedgerLine.mois).order_by(
+        models.FECLedgerLine.compte_num, models.FECLedgerLine.mois
+    ).all()
+
+
+def _insert_fec_monthly_aggregates(db: Session, analysis_id: int, rows: list):
+    db.execute(insert(models.FECMonthlyAggregate), [{**row, "analysis_id": analysis_id} for row in rows])
+
+
+def get_fec_analysis_ids(db: Session, societe: str = None):
+    query = db.query(models.FECAnalysis.id)
+    if societe:
+        query = query.filter(models.FECAnalysis.societe == societe)
+    return [analysis_id for (analysis_id,) in query.order_by(models.FECAnalysis.id).all()]
+
+
+def get_fec_monthly_aggregates(db: Session, analysis_ids: list):
+    """Agrégats mensuels des analyses, en dicts (analysis_id, mois, segment, sous_total, montant)"""
+    if not analysis_ids:
+        return []
+    rows = db.query(
+        models.FECMonthlyAggregate.analysis_id,
+        models.FECMonthlyAggregate.mois,
+        models.FECMonthlyAggregate.segment,
+        models.FECMonthlyAggregate.sous_total,
+        models.FECMonthlyAggregate.montant
+    ).filter(models.FECMonthlyAggregate.analysis_id.in_(analysis_ids)).all()
+    return [row._asdict() for row in rows]
+
+
+def get_fec_classification_rules(db: Session, societe: str = None):
+    """Règles communes (societe nulle) puis règles propres à la société"""
+    query = db.query(models.FECClassificationRule)
+    if societe:
+        query = query.filter(or_(
+            models.FECClassificationRule.societe.is_(None),
+            models.FECClassificationRule.societe == societe
+        ))
+    else:
+        query = query.filter(models.FECClassificationRule.societe.is_(None))
+    return query.order_by(models.FECClassificationRule.societe.isnot(None), models.FECClassificationRule.prefix).all()
+
+
+def get_fec_classification_rules_version(db: Session):
+    """Nombre de règles et dernière modification : change à chaque création, mise à jour ou suppression"""
+    return db.query(
+        func.count(models.FECClassificationRule.id),
+        func.max(models.FECClassificationRule.updated_at)
+    ).one()
+
+
+def upsert_fec_classification_rule(db: Session, rule: schemas.FECClassificationRuleCreate):
+    """Crée la règle, ou met à jour celle de même (société, préfixe)"""
+    query = db.query(models.FECClassificationRule).filter(models.FECClassificationRule.prefix == rule.prefix)
+    if rule.societe:
+        query = query.filter(models.FECClassificationRule.societe == rule.societe)
+    else:
+        query = query.filter(models.FECClassificationRule.societe.is_(None))
+    db_rule = query.first()
+    if db_rule:
+        db_rule.segment = rule.segment
+        db_rule.sous_total = rule.sous_total
+        db_rule.updated_at = func.now()
+    else:
+        db_rule = models.FECClassificationRule(**rule.dict())
+        db.add(db_rule)
+    db.commit()
+    db.refresh(db_rule)
+    return db_rule
+
+
+def delete_fec_classification_rule(db: Session, rule_id: int):
+    db_rule = db.query(models.FECClassificationRule).filter(models.FECClassificationRule.id == rule_id).first()
+    if db_rule:
+        db.delete(db_rule)
+        db.commit()
+        return True
+    return False
+
+
+# Temps de fonctionnement des machines
+def get_machine_runtime_files(db: Session, machine: str):
+    return db.query(models.MachineRuntimeFile).filter(
+        models.MachineRuntimeFile.machine == machine
+    ).order_by(models.MachineRuntimeFile.date_debut, models.MachineRuntimeFile.id).all()
+
+
+def get_machine_runtime_file_by_name(db: Session, machine: str, filename: str):
+    return db.query(models.MachineRuntimeFile).filter(
+        models.MachineRuntimeFile.machine == machine,
+        models.MachineRuntimeFile.filename == filename
+    ).first()
+
+
+MACHINE_RUNTIME_REPLACE = "remplacer"
+MACHINE_RUNTIME_KEEP = "conserver"
+_IN_CHUNK = 1000
+
+
+def _machine_runtime_contributions(db: Session, machine: str, jours: list, exclude_file_id: int):
+    """Durées des autres rapports pour ces jours : (jour, secondes, file_id) triés par jour puis rapport"""
+    rows = []
+    for i in range(0, len(jours), _IN_CHUNK):
+        rows += db.query(
+            models.MachineRuntimeDay.jour, models.MachineRuntimeDay.duree_secondes, models.MachineRuntimeDay.file_id
+        ).filter(
+            models.MachineRuntimeDay.machine == machine,
+            models.MachineRuntimeDay.jour.in_(jours[i:i + _IN_CHUNK]),
+            models.MachineRuntimeDay.file_id != exclude_file_id
+        ).all()
+    return sorted(rows, key=lambda row: (row[0], row[2]))
+
+
+def _delete_machine_runtime_file(db: Session, db_file: models.MachineRuntimeFile):
+    """
+    Retire les jours retenus depuis ce rapport ; un jour aussi présent dans un autre rapport
+    reprend la valeur du plus récent d'entre eux
+    """
+    owned = [row[0] for row in db.query(models.MachineRuntimeMergedDay.jour).filter(
+        models.MachineRuntimeMergedDay.file_id == db_file.id
+    ).all()]
+    db.query(models.MachineRuntimeMergedDay).filter(
+        models.MachineRuntimeMergedDay.file_id == db_file.id
+    ).delete(synchronize_session=False)
+    restored = {}
+    for jour, secondes, file_id in _machine_runtime_contributions(db, db_file.machine, owned, db_file.id):
+        restored[jour] = {"machine": db_file.machine, "jour": jour, "duree_secondes": secondes, "file_id": file_id}
+    if restored:
+        db.execute(insert(models.MachineRuntimeMergedDay), list(restored.values()))
+    db.query(models.MachineRuntimeDay).filter(
+        models.MachineRuntimeDay.file_id == db_file.id
+    ).delete(synchronize_session=False)
+    db.delete(db_file)
+    if owned:
+        _refresh_machine_runtime_rollups(db, db_file.machine, min(owned), max(owned))
+
+
+def _refresh_machine_runtime_rollups(db: Session, machine: str, date_min, date_max):
+    """Recalcule les semaines, mois et années contenant des jours de [date_min, date_max]"""
+    bounds = {level: (rollups.bucket_start(date_min, level), rollups.bucket_start(date_max, level)) for level in rollups.ROLLUP_LEVELS}
+    low = min(bounds[rollups.LEVEL_WEEK][0], bounds[rollups.LEVEL_MONTH][0])
+    high = max(rollups.bucket_end(date_max, rollups.LEVEL_WEEK), rollups.bucket_end(date_max, rollups.LEVEL_MONTH))
+    daily = rollups.from_days(db.query(models.MachineRuntimeMergedDay.jour, models.MachineRuntimeMergedDay.duree_secondes).filter(
+        models.MachineRuntimeMergedDay.machine == machine,
+        models.MachineRuntimeMergedDay.jour >= low,
+        models.MachineRuntimeMergedDay.jour <= high
+    ).all())
+
+    def replace(level, buckets):
+        first, last = bounds[level]
+        db.query(models.MachineRuntimeRollup).filter(
+            models.MachineRuntimeRollup.machine == machine,
+            models.MachineRuntimeRollup.niveau == level,
+            models.MachineRuntimeRollup.periode >= first,
+            models.MachineRuntimeRollup.periode <= last
+        ).delete(synchronize_session=False)
+        rows = rollups.to_rows(rollups.select(buckets, first, last))
+        if rows:
+            db.execute(insert(models.MachineRuntimeRollup), [dict(row, machine=machine, niveau=level) for row in rows])
+
+    replace(rollups.LEVEL_WEEK, rollups.rollup(daily, rollups.LEVEL_WEEK))
+    replace(rollups.LEVEL_MONTH, rollups.rollup(daily, rollups.LEVEL_MONTH))
+    # Années depuis les mois (au plus 12 lignes par année touchée)
+    months = get_machine_runtime_rollups(
+        db, machine, rollups.LEVEL_MONTH, bounds[rollups.LEVEL_YEAR][0], rollups.bucket_end(date_max, rollups.LEVEL_YEAR)
+    )
+    replace(rollups.LEVEL_YEAR, rollups.rollup(rollups.from_rollups(months), rollups.LEVEL_YEAR))
+
+
+def _merge_machine_runtime_days(db: Session, db_file: models.MachineRuntimeFile, days: dict, on_conflict: str):
+    """
+    Upsert des jours du rapport sur (machine, jour). Seule la plage de dates du rapport est lue.
+    Retourne le bilan de la fusion et les conflits (jour déjà présent avec une autre durée).
+    """
+    existing = {
+        row.jour: row for row in db.query(models.MachineRuntimeMergedDay).filter(
+            models.MachineRuntimeMergedDay.machine == db_file.machine,
+            models.MachineRuntimeMergedDay.jour >= db_file.date_debut,
+            models.MachineRuntimeMergedDay.jour <= db_file.date_fin
+        ).all()
+    }
+    added, replaced, conflicts = [], [], []
+    identical = 0
+    for jour, secondes in sorted(days.items()):
+        row = existing.get(jour)
+        if row is None:
+            added.append({"machine": db_file.machine, "jour": jour, "duree_secondes": secondes, "file_id": db_file.id})
+        elif row.duree_secondes == secondes:
+            identical += 1
+        else:
+            conflicts.append({
+                "jour": jour,
+                "duree_existante": row.duree_secondes,
+                "duree_nouvelle": secondes,
+                "file_id_existant": row.file_id,
+                "retenue": on_conflict
+            })
+            if on_conflict == MACHINE_RUNTIME_REPLACE:
+                replaced.append({"id": row.id, "duree_secondes": secondes, "file_id": db_file.id})
+    if added:
+        db.execute(insert(models.MachineRuntimeMergedDay), added)
+    if replaced:
+        db.execute(update(models.MachineRuntimeMergedDay), replaced)
+    return {
+        "jours_ajoutes": len(added),
+        "jours_remplaces": len(replaced),
+        "jours_identiques": identical,
+        "jours_conserves": len(conflicts) - len(replaced),
+        "conflits": conflicts
+    }
+
+
+def create_machine_runtime_file(
+    db: Session,
+    machine: str,
+    filename: str,
+    days: dict,
+    machine_id: int = None,
+    user_id: int = None,
+    on_conflict: str = MACHINE_RUNTIME_REPLACE
+):
+    """
+    Enregistre un rapport (dict date -> secondes) et le fusionne dans les jours de la machine ;
+    un rapport de même nom est remplacé. Retourne (rapport, bilan de la fusion).
+    """
+    previous = get_machine_runtime_file_by_name(db, machine, filename)
+    if previous:
+        _delete_machine_runtime_file(db, previous)
+    db_file = models.MachineRuntimeFile(
+        machine=machine,
+        machine_id=machine_id,
+        filename=filename,
+        date_debut=min(days) if days else None,
+        date_fin=max(days) if days else None,
+        total_jours=len(days),
+        uploaded_by=user_id
+    )
+    db.add(db_file)
+    db.flush()
+    merge = {"jours_ajoutes": 0, "jours_remplaces": 0, "jours_identiques": 0, "jours_conserves": 0, "conflits": []}
+    if days:
+        db.execute(insert(models.MachineRuntimeDay), [
+            {"file_id": db_file.id, "machine": machine, "jour": jour, "duree_secondes": secondes}
+            for jour, secondes in sorted(days.items())
+        ])
+        merge = _merge_machine_runtime_days(db, db_file, days, on_conflict)
+        _refresh_machine_runtime_rollups(db, machine, db_file.date_debut, db_file.date_fin)
+    db.commit()
+    db.refresh(db_file)
+    return db_file, merge
+
+
+def delete_machine_runtime_file(db: Session, machine: str, filename: str):
+    db_file = get_machine_runtime_file_by_name(db, machine, filename)
+    if db_file:
+        _delete_machine_runtime_file(db, db_file)
+        db.commit()
+        return True
+    return False
+
+
+def get_machine_runtime_days(db: Session, machine: str, date_debut=None, date_fin=None):
+    """Jours retenus d'une machine sur une plage de dates (index unique machine, jour)"""
+    query = db.query(models.MachineRuntimeMergedDay).filter(models.MachineRuntimeMergedDay.machine == machine)
+    if date_debut:
+        query = query.filter(models.MachineRuntimeMergedDay.jour >= date_debut)
+    if date_fin:
+        query = query.filter(models.MachineRuntimeMergedDay.jour <= date_fin)
+    return query.order_by(models.MachineRuntimeMergedDay.jour).all()
+
+
+def get_machine_runtime_version(db: Session, machine: str):
+    """Version des données d'une machine : ses rapports (identifiants croissants, un remplacement crée un nouvel id)"""
+    return tuple(row[0] for row in db.query(models.MachineRuntimeFile.id).filter(
+        models.MachineRuntimeFile.machine == machine
+    ).order_by(models.MachineRuntimeFile.id).all())
+
+
+def get_machine_runtime_series(db: Session, machine: str):
+    """(jour, secondes) retenus d'une machine, triés par jour"""
+    return db.query(models.MachineRuntimeMergedDay.jour, models.MachineRuntimeMergedDay.duree_secondes).filter(
+        models.MachineRuntimeMergedDay.machine == machine
+    ).order_by(models.MachineRuntimeMergedDay.jour).all()
+
+
+def get_machine_runtime_rollups(db: Session, machine: str, niveau: str, date_debut=None, date_fin=None):
+    """Agrégats d'un niveau dont le seau commence dans [date_debut, date_fin]"""
+    query = db.query(models.MachineRuntimeRollup).filter(
+        models.MachineRuntimeRollup.machine == machine,
+        models.MachineRuntimeRollup.niveau == niveau
+    )
+    if date_debut:
+        query = query.filter(models.MachineRuntimeRollup.periode >= date_debut)
+    if date_fin:
+        query = query.filter(models.MachineRuntimeRollup.periode <= date_fin)
+    return query.order_by(models.MachineRuntimeRollup.periode).all()
+
+
+def get_machine_runtime_extent(db: Session, machine: str):
+    """(premier jour, dernier jour) des jours retenus d'une machine"""
+    return tuple(db.query(
+        func.min(models.MachineRuntimeMergedDay.jour), func.max(models.MachineRuntimeMergedDay.jour)
+    ).filter(models.MachineRuntimeMergedDay.machine == machine).one())
+
+
+# Coût de revient des machines
+def get_machine_cost_inputs(db: Session, machine_id: int):
+    return db.query(models.MachineCostInputs).filter(models.MachineCostInputs.machine_id == machine_id).first()
+
+
+def save_machine_cost_inputs(db: Session, machine_id: int, inputs: schemas.MachineCostInputsUpdate, user_id: int = None):
+    """Crée ou met à jour les entrées d'une machine ; la version change à chaque enregistrement"""
+    db_inputs = get_machine_cost_inputs(db, machine_id)
+    if db_inputs is None:
+        db_inputs = models.MachineCostInputs(machine_id=machine_id, version=0)
+        db.add(db_inputs)
+    for field, value in inputs.model_dump(exclude_unset=True).items():
+        setattr(db_inputs, field, value)
+    db_inputs.version = (db_inputs.version or 0) + 1
+    db_inputs.updated_by = user_id
+    db.commit()
+    db.refresh(db_inputs)
+    return db_inputs
+
+
+def get_machines_with_cost_inputs(db: Session, year: int):
+    """(machine, entrées ou None) des machines d'une année"""
+    return db.query(models.Machine, models.MachineCostInputs).outerjoin(
+        models.MachineCostInputs, models.MachineCostInputs.machine_id == models.Machine.id
+    ).filter(models.Machine.year == year).order_by(models.Machine.name, models.Machine.id).all()
+
+
+# Utilisation prévue / réelle des machines
+def get_machines_by_year(db: Session, year: int):
+    return db.query(models.Machine).filter(models.Machine.year == year).order_by(models.Machine.name, models.Machine.id).all()
+
+
+def get_planned_task_weeks(db: Session, year: int):
+    """(machine_id, semaine début, semaine fin) des tâches du Gantt d'une année"""
+    return db.query(models.Ensemble.machine_id, models.Task.start_week, models.Task.end_week).join(
+        models.Task, models.Task.ensemble_id == models.Ensemble.id
+    ).join(
+        models.Machine, models.Machine.id == models.Ensemble.machine_id
+    ).filter(models.Machine.year == year, models.Task.year == year).all()
+
+
+def get_gantt_version(db: Session, year: int):
+    """Version des tâches et ensembles d'une année : (nombre, id max, dernière modification) de chacun"""
+    tasks = db.query(func.count(models.Task.id), func.max(models.Task.id), func.max(models.Task.updated_at)).filter(
+        models.Task.year == year
+    ).one()
+    ensembles = db.query(func.count(models.Ensemble.id), func.max(models.Ensemble.id), func.max(models.Ensemble.updated_at)).join(
+        models.Machine, models.Machine.id == models.Ensemble.machine_id
+    ).filter(models.Machine.year == year).one()
+    return tuple(tasks) + tuple(ensembles)
+
+
+def get_machine_runtime_weeks(db: Session, machines: list, date_debut, date_fin):
+    """(machine, lundi, secondes) des agrégats hebdomadaires de plusieurs machines"""
+    if not machines:
+        return []
+    return db.query(
+        models.MachineRuntimeRollup.machine, models.MachineRuntimeRollup.periode, models.MachineRuntimeRollup.total_secondes
+    ).filter(
+        models.MachineRuntimeRollup.machine.in_(machines),
+        models.MachineRuntimeRollup.niveau == rollups.LEVEL_WEEK,
+        models.MachineRuntimeRollup.periode >= date_debut,
+        models.MachineRuntimeRollup.periode <= date_fin
+    ).all()
+
+
+# Répartition de la main-d'œuvre sur les machines
+def get_machine_service_mappings(db: Session):
+    return db.query(models.MachineServiceMapping).order_by(
+        models.MachineServiceMapping.service, models.MachineServiceMapping.machine_id
+    ).all()
+
+
+def replace_machine_service_mappings(db: Session, mappings: list):
+    """Remplace toute la table service -> machines"""
+    db.query(models.MachineServiceMapping).delete(synchronize_session=False)
+    db.add_all([models.MachineServiceMapping(**mapping.model_dump()) for mapping in mappings])
+    db.commit()
+    return get_machine_service_mappings(db)
+
+
+def get_labor_tasks(db: Session, years: list):
+    """(id, machine_id, année, semaine début, semaine fin) des tâches du Gantt de plusieurs années"""
+    if not years:
+        return []
+    return db.query(
+        models.Task.id, models.Ensemble.machine_id, models.Task.year, models.Task.start_week, models.Task.end_week
+    ).join(
+        models.Ensemble, models.Ensemble.id == models.Task.ensemble_id
+    ).filter(models.Task.year.in_(years)).order_by(models.Task.id).all()
+
+
+def get_task_assignees(db: Session, task_ids: list):
+    """(tâche, prénom, nom) des utilisateurs affectés à des tâches"""
+    if not task_ids:
+        return []
+    return db.query(
+        models.UserAssignment.task_id, models.User.first_name, models.User.last_name
+    ).join(
+        models.User, models.User.id == models.UserAssignment.user_id
+    ).filter(models.UserAssignment.task_id.in_(task_ids)).distinct().all()
+
+
+def get_labor_allocation_months(db: Session, file_id: int):
+    return db.query(models.MachineLaborAllocationMonth).filter(
+        models.MachineLaborAllocationMonth.file_id == file_id
+    ).order_by(models.MachineLaborAllocationMonth.mois).all()
+
+
+def save_labor_allocation_month(db: Session, file_id: int, mois: str, signature: str, total: float, non_affecte: float, rows: list):
+    """Remplace (sans commit) la répartition d'un mois et son état"""
+    db.query(models.MachineLaborAllocation).filter(
+        models.MachineLaborAllocation.file_id == file_id,
+        models.MachineLaborAllocation.mois == mois
+    ).delete(synchronize_session=False)
+    if rows:
+        db.execute(insert(models.MachineLaborAllocation), [dict(row, file_id=file_id, mois=mois) for row in rows])
+    state = db.query(models.MachineLaborAllocationMonth).filter(
+        models.MachineLaborAllocationMonth.file_id == file_id,
+        models.MachineLaborAllocationMonth.mois == mois
+    ).first()
+    if state is None:
+        state = models.MachineLaborAllocationMonth(file_id=file_id, mois=mois)
+        db.add(state)
+    state.signature = signature
+    state.total = total
+    state.non_affecte = non_affecte
+
+
+def delete_labor_allocation_months(db: Session, file_id: int, months: list = None):
+    """Supprime (sans commit) la répartition de mois d'un fichier (tous si months est None)"""
+    allocations = db.query(models.MachineLaborAllocation).filter(models.MachineLaborAllocation.file_id == file_id)
+    states = db.query(models.MachineLaborAllocationMonth).filter(models.MachineLaborAllocationMonth.file_id == file_id)
+    if months is not None:
+        allocations = allocations.filter(models.MachineLaborAllocation.mois.in_(months))
+        states = states.filter(models.MachineLaborAllocationMonth.mois.in_(months))
+    allocations.delete(synchronize_session=False)
+    states.delete(synchronize_session=False)
+
+
+def get_machine_names(db: Session, machine_ids: list):
+    """(id, nom) de machines"""
+    if not machine_ids:
+        return []
+    return db.query(models.Machine.id, models.Machine.name).filter(models.Machine.id.in_(machine_ids)).all()
+
+
+def get_labor_allocations(db: Session, file_id: int, mois_prefix: str = None):
+    """(répartition, nom de la machine) d'un fichier, éventuellement limitées aux mois commençant par mois_prefix"""
+    query = db.query(models.MachineLaborAllocation, models.Machine.name).join(
+        models.Machine, models.Machine.id == models.MachineLaborAllocation.machine_id
+    ).filter(models.MachineLaborAllocation.file_id == file_id)
+    if mois_prefix:
+        query = query.filter(models.MachineLaborAllocation.mois.like(f"{mois_prefix}%"))
+    return query.all()
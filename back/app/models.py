@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text, Float
+from sqlalchemy import Column, Integer, String, Date, DateTime, Boolean, ForeignKey, Text, Float, Index, LargeBinary
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from .database import Base
@@ -30,6 +30,9 @@ class Machine(Base):
     
     # Relations
     ensembles = relationship("Ensemble", back_populates="machine", cascade="all, delete-orphan")
+    cost_inputs = relationship("MachineCostInputs", back_populates="machine", cascade="all, delete-orphan", uselist=False)
+    service_mappings = relationship("MachineServiceMapping", back_populates="machine", cascade="all, delete-orphan")
+    labor_allocations = relationship("MachineLaborAllocation", cascade="all, delete-orphan")
 
 
 class Ensemble(Base):
@@ -135,13 +138,50 @@ class CoutsSalariauxFile(Base):
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String, nullable=False)
     processed_data = Column(Text, nullable=False)  # JSON string des données traitées
+    processed_blob = Column(LargeBinary, nullable=True)  # format colonnaire compressé (storage_format = columnar)
+    storage_format = Column(String, nullable=False, default="json", server_default="json")  # json (processed_data), columnar (processed_blob) ou rows (couts_salariaux_rows)
     total_records = Column(Integer, default=0)
+    content_hash = Column(String, nullable=True, index=True)  # SHA-256 du fichier d'origine, tant que le contenu n'a pas été modifié
+    resolver_version = Column(Integer, nullable=True)  # version des règles de mapping utilisées
     uploaded_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    rows_revision = Column(Integer, nullable=False, default=0, server_default="0")  # incrémenté quand des lignes déjà stockées changent (pas pour un ajout en fin de fichier)
     uploaded_by = Column(Integer, ForeignKey("users.id"), nullable=True)
     
     # Relations
-    user = relationship("User") 
+    user = relationship("User")
+
+
+# Contenus (par empreinte) déjà intégrés dans un fichier de coûts salariaux
+class CoutsSalariauxFileSource(Base):
+    __tablename__ = "couts_salariaux_file_sources"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    file_id = Column(Integer, ForeignKey("couts_salariaux_files.id"), nullable=False)
+    content_hash = Column(String, nullable=False)
+    filename = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        Index("ix_couts_salariaux_file_sources_file_hash", "file_id", "content_hash", unique=True),
+    )
+
+
+# Lignes d'un fichier de coûts salariaux stocké ligne à ligne (ingestion par blocs)
+class CoutsSalariauxRow(Base):
+    __tablename__ = "couts_salariaux_rows"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    file_id = Column(Integer, ForeignKey("couts_salariaux_files.id"), nullable=False)
+    seq = Column(Integer, nullable=False)  # ordre des lignes dans le fichier
+    matricule = Column(String, nullable=True)
+    mois = Column(String, nullable=True)
+    data = Column(Text, nullable=False)  # JSON string de la ligne
+    
+    __table_args__ = (
+        Index("ix_couts_salariaux_rows_file_seq", "file_id", "seq"),
+        Index("ix_couts_salariaux_rows_file_key", "file_id", "matricule", "mois"),
+    )
 
 
 class FECAnalysis(Base):
@@ -152,6 +192,7 @@ class FECAnalysis(Base):
     upload_date = Column(DateTime(timezone=True), server_default=func.now())
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     results = Column(Text, nullable=False)  # JSON string des résultats d'analyse
+    societe = Column(String, nullable=True, index=True)  # société (règles de classification spécifiques)
     
     # Relations
     user = relationship("User")
@@ -168,4 +209,215 @@ class FECSegment(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relations
-    analysis = relationship("FECAnalysis", back_populates="segments") 
\ No newline at end of file
+    analysis = relationship("FECAnalysis", back_populates="segments")
+
+
+# Règles de classification des comptes FEC propres à une société (remplacent ou complètent les règles par défaut)
+class FECClassificationRule(Base):
+    __tablename__ = "fec_classification_rules"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    societe = Column(String, nullable=True)  # None = toutes les sociétés
+    prefix = Column(String, nullable=False)
+    segment = Column(String, nullable=False)
+    sous_total = Column(String, nullable=False, default="", server_default="")
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    __table_args__ = (
+        Index("ix_fec_classification_rules_societe_prefix", "societe", "prefix", unique=True),
+    )
+
+
+# Lignes du FEC d'une analyse (grand livre typé, pour les requêtes de détail)
+class FECLedgerLine(Base):
+    __tablename__ = "fec_ledger_lines"
+    
+    id = Column(Integer, primary_key=True)
+    analysis_id = Column(Integer, ForeignKey("fec_analyses.id"), nullable=False)
+    journal_code = Column(String, nullable=True)
+    compte_num = Column(String, nullable=False)
+    compte_lib = Column(String, nullable=True)
+    ecriture_date = Column(Date, nullable=True)
+    mois = Column(String(7), nullable=True)  # AAAA-MM
+    debit = Column(Float, nullable=False, default=0)
+    credit = Column(Float, nullable=False, default=0)
+    
+    __table_args__ = (
+        # Préfixe de compte (recherche par intervalle) puis mois, et l'inverse
+        Index("ix_fec_ledger_lines_analysis_compte", "analysis_id", "compte_num", "mois"),
+        Index("ix_fec_ledger_lines_analysis_mois", "analysis_id", "mois", "compte_num"),
+    ) 
+
+# Agrégats mensuels d'une analyse FEC par segment / sous-total (comparaisons entre périodes)
+class FECMonthlyAggregate(Base):
+    __tablename__ = "fec_monthly_aggregates"
+    
+    id = Column(Integer, primary_key=True)
+    analysis_id = Column(Integer, ForeignKey("fec_analyses.id"), nullable=False)
+    mois = Column(String(7), nullable=False)  # AAAA-MM
+    segment = Column(String, nullable=False)
+    sous_total = Column(String, nullable=False, default="", server_default="")
+    montant = Column(Float, nullable=False, default=0)
+    
+    __table_args__ = (
+        Index("ix_fec_monthly_aggregates_analysis_mois", "analysis_id", "mois", "segment"),
+    )
+
+
+# Rapports PDF de temps de fonctionnement d'une machine (une "période" par fichier)
+class MachineRuntimeFile(Base):
+    __tablename__ = "machine_runtime_files"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    machine = Column(String, nullable=False, index=True)  # identifiant de la page machine (ex. laser-bodor)
+    machine_id = Column(Integer, ForeignKey("machines.id", ondelete="SET NULL"), nullable=True)  # machine du Gantt correspondante, si elle existe
+    filename = Column(String, nullable=False)
+    date_debut = Column(Date, nullable=True)
+    date_fin = Column(Date, nullable=True)
+    total_jours = Column(Integer, default=0)
+    uploaded_at = Column(DateTime(timezone=True), server_default=func.now())
+    uploaded_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    
+    # Relations
+    days = relationship("MachineRuntimeDay", back_populates="file", cascade="all, delete-orphan")
+
+
+# Durée de fonctionnement d'une machine par jour, telle que lue dans un rapport
+class MachineRuntimeDay(Base):
+    __tablename__ = "machine_runtime_days"
+    
+    id = Column(Integer, primary_key=True)
+    file_id = Column(Integer, ForeignKey("machine_runtime_files.id"), nullable=False)
+    machine = Column(String, nullable=False)
+    jour = Column(Date, nullable=False)
+    duree_secondes = Column(Integer, nullable=False, default=0)
+    
+    # Relations
+    file = relationship("MachineRuntimeFile", back_populates="days")
+    
+    __table_args__ = (
+        # Lecture d'une plage de dates pour une machine
+        Index("ix_machine_runtime_days_machine_jour", "machine", "jour"),
+        Index("ix_machine_runtime_days_file_id", "file_id"),
+    )
+
+
+# Durée retenue par (machine, jour), tous rapports fusionnés ; file_id = rapport dont vient la valeur
+class MachineRuntimeMergedDay(Base):
+    __tablename__ = "machine_runtime_merged_days"
+    
+    id = Column(Integer, primary_key=True)
+    machine = Column(String, nullable=False)
+    jour = Column(Date, nullable=False)
+    duree_secondes = Column(Integer, nullable=False, default=0)
+    file_id = Column(Integer, ForeignKey("machine_runtime_files.id"), nullable=False)
+    
+    __table_args__ = (
+        Index("ix_machine_runtime_merged_days_machine_jour", "machine", "jour", unique=True),
+        Index("ix_machine_runtime_merged_days_file_id", "file_id"),
+    )
+
+
+# Agrégats semaine / mois / année des jours retenus d'une machine (periode = premier jour du seau)
+class MachineRuntimeRollup(Base):
+    __tablename__ = "machine_runtime_rollups"
+    
+    id = Column(Integer, primary_key=True)
+    machine = Column(String, nullable=False)
+    niveau = Column(String, nullable=False)  # semaine, mois, annee
+    periode = Column(Date, nullable=False)
+    jours = Column(Integer, nullable=False, default=0)
+    total_secondes = Column(Integer, nullable=False, default=0)
+    max_secondes = Column(Integer, nullable=False, default=0)
+    jours_productifs = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        Index("ix_machine_runtime_rollups_machine_niveau_periode", "machine", "niveau", "periode", unique=True),
+    )
+
+
+# Entrées du coût de revient horaire d'une machine (onglet "Coût de revient")
+class MachineCostInputs(Base):
+    __tablename__ = "machine_cost_inputs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    machine_id = Column(Integer, ForeignKey("machines.id"), nullable=False, unique=True)
+    # Infos générales
+    heures_annuelles = Column(Float, nullable=True)
+    amortissement = Column(Float, nullable=True)  # années
+    interet = Column(Float, nullable=True)
+    kwh = Column(Float, nullable=True)
+    air_liquide = Column(Float, nullable=True)  # €/m³
+    coef_puissance = Column(Float, nullable=True)
+    frais_locaux = Column(Float, nullable=True)  # €/m²
+    assurances = Column(Float, nullable=True)
+    heures_facturees = Column(Float, nullable=True)
+    # Infos spécifiques
+    prix_achat = Column(Float, nullable=True)
+    maintenance = Column(Float, nullable=True)
+    surface = Column(Float, nullable=True)  # m²
+    puissance = Column(Float, nullable=True)  # kW
+    conso_air_liquide = Column(Float, nullable=True)  # m³/h
+    salaire_operateur = Column(Float, nullable=True)  # €/h chargé
+    coef_utilisation = Column(Float, nullable=True)
+    note = Column(Text, nullable=True)
+    version = Column(Integer, nullable=False, default=1)  # incrémentée à chaque modification (cache des calculs)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    updated_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    
+    # Relations
+    machine = relationship("Machine", back_populates="cost_inputs")
+
+
+# Répartition des coûts d'un service de la paie sur les machines (clé "services" de la main-d'œuvre)
+class MachineServiceMapping(Base):
+    __tablename__ = "machine_service_mappings"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    service = Column(String, nullable=False)  # valeur de la colonne Service de la paie
+    machine_id = Column(Integer, ForeignKey("machines.id"), nullable=False)
+    poids = Column(Float, nullable=False, default=1.0)
+    
+    # Relations
+    machine = relationship("Machine", back_populates="service_mappings")
+    
+    __table_args__ = (
+        Index("ix_machine_service_mappings_service_machine", "service", "machine_id", unique=True),
+    )
+
+
+# Coût de main-d'œuvre d'un mois de paie affecté à une machine et une semaine ISO, par clé de répartition
+class MachineLaborAllocation(Base):
+    __tablename__ = "machine_labor_allocations"
+    
+    id = Column(Integer, primary_key=True)
+    file_id = Column(Integer, ForeignKey("couts_salariaux_files.id"), nullable=False)
+    mois = Column(String(7), nullable=False)  # AAAA-MM
+    machine_id = Column(Integer, ForeignKey("machines.id"), nullable=False)
+    annee = Column(Integer, nullable=False)  # année ISO de la semaine
+    semaine = Column(Integer, nullable=False)
+    cle = Column(String, nullable=False)  # affectations, services, couverture
+    montant = Column(Float, nullable=False, default=0)
+    
+    __table_args__ = (
+        Index("ix_machine_labor_allocations_file_mois", "file_id", "mois"),
+        Index("ix_machine_labor_allocations_machine_id", "machine_id"),
+    )
+
+
+# État du calcul d'un mois de paie : signature des données utilisées et totaux
+class MachineLaborAllocationMonth(Base):
+    __tablename__ = "machine_labor_allocation_months"
+    
+    id = Column(Integer, primary_key=True)
+    file_id = Column(Integer, ForeignKey("couts_salariaux_files.id"), nullable=False)
+    mois = Column(String(7), nullable=False)
+    signature = Column(String, nullable=False)  # empreinte des lignes du mois, du Gantt, des affectations et des paramètres
+    total = Column(Float, nullable=False, default=0)
+    non_affecte = Column(Float, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    __table_args__ = (
+        Index("ix_machine_labor_allocation_months_file_mois", "file_id", "mois", unique=True),
+    )
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List
-from datetime import datetime
+from typing import Dict, Optional, List
+from datetime import date, datetime
 
 
 # User schemas
@@ -242,6 +242,7 @@ class CoutsSalariauxFileUpdate(BaseModel):
 
 class CoutsSalariauxFile(CoutsSalariauxFileBase):
     id: int
+    storage_format: str = "json"
     uploaded_at: datetime
     updated_at: Optional[datetime] = None
     uploaded_by: Optional[int] = None
@@ -263,7 +264,41 @@ class CoutsSalariauxUploadResponse(BaseModel):
     success: bool
     file_id: Optional[int] = None
     appended: Optional[bool] = None
-    total_records: Optional[int] = None 
+    total_records: Optional[int] = None
+    column_mapping: Optional[dict] = None
+    deduplicated: Optional[bool] = None
+    upsert_counts: Optional[dict] = None
+
+
+class CoutsSalariauxBatchFileResult(BaseModel):
+    filename: str
+    success: bool
+    records: Optional[int] = None
+    deduplicated: Optional[bool] = None
+    column_mapping: Optional[dict] = None
+    error: Optional[str] = None
+
+
+class CoutsSalariauxBatchUploadResponse(BaseModel):
+    success: bool
+    file_id: Optional[int] = None
+    appended: Optional[bool] = None
+    total_records: Optional[int] = None
+    upsert_counts: Optional[dict] = None
+    files: List[CoutsSalariauxBatchFileResult] = []
+
+
+class CoutsSalariauxJob(BaseModel):
+    job_id: str
+    kind: str
+    status: str
+    progress: int
+    filename: Optional[str] = None
+    file_id: Optional[int] = None
+    result: dict = {}
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
 
 
 # FEC Analysis schemas
@@ -294,6 +329,18 @@ class CoutsSalariaux(BaseModel):
     supplements_hp: float | None = None
 
 
+# Coût horaire chargé (Coût global / Heures réelles) par service et emploi
+class CoutHoraireSalarie(BaseModel):
+    service: str
+    emploi: Optional[str] = None  # None : tous emplois du service
+    cout_global: float
+    heures_reelles: float
+    lignes: int
+    mois_debut: Optional[str] = None
+    mois_fin: Optional[str] = None
+    taux_horaire: Optional[float] = None  # None si aucune heure réelle
+
+
 class FECResults(BaseModel):
     production: FECSegment
     achats_consommes: FECSegment
@@ -307,7 +354,8 @@ class FECResults(BaseModel):
 
 class FECAnalysisBase(BaseModel):
     filename: str
-    results: FECResults
+    results: List[FECResults]  # un résultat par mois_annee
+    societe: Optional[str] = None
 
 
 class FECAnalysisCreate(FECAnalysisBase):
@@ -323,7 +371,398 @@ class FECAnalysis(FECAnalysisBase):
         from_attributes = True
 
 
+class FECAnalysisSummary(BaseModel):
+    id: int
+    filename: str
+    upload_date: datetime
+    societe: Optional[str] = None
+    mois: List[str] = []
+
+
+class FECClassificationRuleBase(BaseModel):
+    societe: Optional[str] = None
+    prefix: str
+    segment: str
+    sous_total: str = ""
+
+
+class FECClassificationRuleCreate(FECClassificationRuleBase):
+    pass
+
+
+class FECClassificationRule(FECClassificationRuleBase):
+    id: int
+    updated_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
+
+class FECClassification(BaseModel):
+    societe: Optional[str] = None
+    regles_par_defaut: List[FECClassificationRuleBase]
+    regles_specifiques: List[FECClassificationRule]
+
+
+class FECLedgerLine(BaseModel):
+    id: int
+    journal_code: Optional[str] = None
+    compte_num: str
+    compte_lib: Optional[str] = None
+    ecriture_date: Optional[date] = None
+    mois: Optional[str] = None
+    debit: float
+    credit: float
+    
+    class Config:
+        from_attributes = True
+
+
+class FECLedgerPage(BaseModel):
+    total: int
+    lignes: List[FECLedgerLine]
+
+
+class FECAccountTotal(BaseModel):
+    CompteNum: str
+    CompteLib: Optional[str] = None
+    mois_annee: Optional[str] = None
+    debit: float
+    credit: float
+    solde: float
+    lignes: int
+
+
+class FECComparisonRow(BaseModel):
+    segment: str
+    sous_total: str = ""
+    mois_annee: str
+    montant: float
+    reference_mois: str
+    reference_montant: Optional[float] = None
+    ecart: Optional[float] = None
+    ecart_pct: Optional[float] = None
+
+
+class FECComparison(BaseModel):
+    mode: str
+    analyses: List[int]
+    lignes: List[FECComparisonRow]
+
+
 class FECUploadResponse(BaseModel):
     status: str
     filename: str
-    data: FECResults 
\ No newline at end of file
+    analysis_id: Optional[int] = None
+    total_lines: Optional[int] = None
+    data: List[FECResults] 
+
+class MachineRuntimeDonnee(BaseModel):
+    date: str  # JJ/MM/AAAA
+    duree_totale: str  # HH:MM:SS
+
+
+class MachineRuntimeStats(BaseModel):
+    date_minimale: Optional[str] = None
+    date_maximale: Optional[str] = None
+    valeur_minimale: Optional[str] = None
+    date_valeur_minimale: Optional[str] = None
+    valeur_maximale: Optional[str] = None
+    date_valeur_maximale: Optional[str] = None
+    valeur_moyenne_productive: Optional[str] = None
+    valeur_moyenne_totale: Optional[str] = None
+    jours_sans_production: Optional[int] = None
+    somme_totale_periodes: Optional[str] = None
+
+
+class MachineRuntimeConflit(BaseModel):
+    date: str  # JJ/MM/AAAA
+    duree_existante: str
+    duree_nouvelle: str
+    file_id_existant: int
+    retenue: str  # remplacer (valeur du nouveau rapport) ou conserver
+
+
+class MachineRuntimeFusion(BaseModel):
+    jours_ajoutes: int = 0
+    jours_remplaces: int = 0
+    jours_identiques: int = 0
+    jours_conserves: int = 0
+    conflits: List[MachineRuntimeConflit] = []
+
+
+class MachineRuntimeUploadResponse(BaseModel):
+    status: str
+    machine: str
+    file_id: int
+    fichier: str
+    donnees: List[MachineRuntimeDonnee]
+    stats_globales: MachineRuntimeStats
+    somme_totale: str
+    fusion: Optional[MachineRuntimeFusion] = None
+
+
+class MachineRuntimeFile(BaseModel):
+    id: int
+    machine: str
+    machine_id: Optional[int] = None
+    filename: str
+    date_debut: Optional[date] = None
+    date_fin: Optional[date] = None
+    total_jours: int = 0
+    uploaded_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
+
+class MachineRuntimeJour(BaseModel):
+    date: str  # JJ/MM/AAAA
+    duree_totale: str
+    duree_secondes: int
+    file_id: int  # rapport dont vient la valeur retenue
+
+
+class MachineRuntimePeriode(BaseModel):
+    date_debut: Optional[date] = None
+    date_fin: Optional[date] = None
+
+
+class MachineRuntimeStatsRequest(BaseModel):
+    periodes: List[MachineRuntimePeriode]
+    jours_feries: List[date] = []
+
+
+class MachineRuntimePeriodeStats(MachineRuntimeStats):
+    date_debut: Optional[date] = None
+    date_fin: Optional[date] = None
+    jours: int = 0
+
+
+class MachineRuntimeStatsResponse(BaseModel):
+    machine: str
+    periodes: List[MachineRuntimePeriodeStats]
+    globales: MachineRuntimePeriodeStats
+
+
+class MachineRuntimePoint(BaseModel):
+    periode: date  # premier jour du seau
+    jours: int
+    total_secondes: int
+    moyenne_secondes: int  # par jour connu
+    max_secondes: int
+    jours_productifs: int
+    duree_totale: str
+
+
+class MachineRuntimeSerie(BaseModel):
+    machine: str
+    niveau: str  # jour, semaine, mois, annee
+    date_debut: Optional[date] = None
+    date_fin: Optional[date] = None
+    points: List[MachineRuntimePoint]
+
+
+class MachineCostInputsBase(BaseModel):
+    heures_annuelles: Optional[float] = None
+    amortissement: Optional[float] = None  # années
+    interet: Optional[float] = None
+    kwh: Optional[float] = None
+    air_liquide: Optional[float] = None
+    coef_puissance: Optional[float] = None
+    frais_locaux: Optional[float] = None
+    assurances: Optional[float] = None
+    heures_facturees: Optional[float] = None
+    prix_achat: Optional[float] = None
+    maintenance: Optional[float] = None
+    surface: Optional[float] = None
+    puissance: Optional[float] = None
+    conso_air_liquide: Optional[float] = None
+    salaire_operateur: Optional[float] = None
+    coef_utilisation: Optional[float] = None
+    note: Optional[str] = None
+
+
+class MachineCostInputsUpdate(MachineCostInputsBase):
+    pass
+
+
+class MachineCostInputs(MachineCostInputsBase):
+    id: int
+    machine_id: int
+    version: int
+    updated_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
+
+class MachineCostResults(BaseModel):
+    amortissement_horaire: float
+    assurances_horaire: float
+    frais_financiers_horaires: float
+    frais_entretien_horaires: float
+    frais_locaux_horaires: float
+    frais_air_liquide_horaires: float
+    frais_energie_horaires: float
+    cout_horaire_brut: float
+    salaire_horaire_operateur: float
+    cout_horaire_machine: float
+    temps_journalier_heures: float
+
+
+class MachineCostVariation(BaseModel):
+    heures: int
+    salaire: float
+    brut: float
+    total: float
+
+
+class MachineCost(BaseModel):
+    machine_id: int
+    machine: str
+    year: int
+    entrees: Optional[MachineCostInputs] = None
+    couts: Optional[MachineCostResults] = None  # None tant qu'aucune entrée n'est enregistrée
+    variation: List[MachineCostVariation] = []
+
+
+class MachineCostBatch(BaseModel):
+    year: int
+    machines: List[MachineCost]
+
+
+class MachineCostAxis(BaseModel):
+    entree: str  # nom d'une entrée (ex. kwh, coef_utilisation)
+    mode: str = "facteur"  # facteur (x valeur enregistrée) ou valeur (remplace la valeur enregistrée)
+    valeurs: Optional[List[float]] = None
+    # Ou une plage régulière
+    debut: Optional[float] = None
+    fin: Optional[float] = None
+    points: Optional[int] = None
+
+
+class MachineCostScenarioRequest(BaseModel):
+    year: int
+    machine_ids: Optional[List[int]] = None
+    axes: List[MachineCostAxis]
+    sortie: str = "cout_horaire_machine"
+    inclure_detail: bool = False
+
+
+class MachineCostScenarioAxe(BaseModel):
+    entree: str
+    mode: str
+    valeurs: List[float]
+
+
+class MachineCostScenarioMachine(BaseModel):
+    machine_id: int
+    machine: str
+    base: float
+    moyenne: float
+    min: float
+    max: float
+    scenario_min: Dict[str, float]
+    scenario_max: Dict[str, float]
+
+
+class MachineCostSensibilite(BaseModel):
+    entree: str
+    valeur: float
+    machine_id: int
+    cout: float
+    ecart: float
+    ecart_pct: Optional[float] = None
+
+
+class MachineCostScenarioPoint(BaseModel):
+    machine_id: int
+    valeurs: Dict[str, float]
+    cout: float
+
+
+class MachineCostScenarioResponse(BaseModel):
+    year: int
+    sortie: str
+    points: int
+    axes: List[MachineCostScenarioAxe]
+    machines: List[MachineCostScenarioMachine]
+    sensibilite: List[MachineCostSensibilite]
+    detail: Optional[List[MachineCostScenarioPoint]] = None
+
+
+class MachineUtilisationSemaine(BaseModel):
+    semaine: int  # semaine ISO
+    debut: date  # lundi
+    taches: int
+    heures_prevues: float
+    heures_reelles: float
+    ecart: float
+    taux: Optional[float] = None  # réel / prévu
+    statut: str  # conforme, sous_utilisation, sur_utilisation, hors_planning, inactif
+
+
+class MachineUtilisation(BaseModel):
+    machine_id: int
+    machine: str
+    heures_prevues: float
+    heures_reelles: float
+    semaines_sous_utilisation: int
+    semaines_sur_utilisation: int
+    semaines_hors_planning: int
+    semaines: List[MachineUtilisationSemaine]
+
+
+class MachineUtilisationResponse(BaseModel):
+    year: int
+    heures_par_semaine: float
+    seuil_bas: float
+    seuil_haut: float
+    machines: List[MachineUtilisation]
+
+
+# Répartition de la main-d'œuvre sur les machines
+class MachineServiceMappingBase(BaseModel):
+    service: str
+    machine_id: int
+    poids: float = 1.0
+
+
+class MachineServiceMapping(MachineServiceMappingBase):
+    id: int
+
+    class Config:
+        from_attributes = True
+
+
+class MachineLaborMois(BaseModel):
+    mois: str
+    total: float
+    affecte: float
+    non_affecte: float
+    par_cle: Dict[str, float]
+
+
+class MachineLaborSemaine(BaseModel):
+    annee: int  # année ISO
+    semaine: int
+    montant: float
+    par_cle: Dict[str, float]
+
+
+class MachineLabor(BaseModel):
+    machine_id: int
+    machine: str
+    total: float
+    par_cle: Dict[str, float]
+    semaines: List[MachineLaborSemaine]
+
+
+class MachineLaborResponse(BaseModel):
+    file_id: int
+    cles: List[str]
+    production_seulement: bool
+    mois_recalcules: int
+    mois: List[MachineLaborMois]
+    machines: List[MachineLabor]
@@ -0,0 +1 @@
+# Services métier
@@ -0,0 +1,282 @@
+"""
+Format colonnaire compact pour les jeux de données traités.
+
+Chaque colonne est stockée dans son propre bloc compressé (zlib) :
+- "f8" : tableau float64 (NaN = valeur nulle), avec masque optionnel des valeurs
+  entières quand la colonne mêle entiers et décimaux (1 reste 1, pas 1.0)
+- "i8" : tableau int64, avec masque de nullité optionnel
+- "cat" : codes int32 + dictionnaire des chaînes (code -1 = valeur nulle)
+- "json" : colonne hétérogène, liste JSON
+
+Les noms de colonnes n'apparaissent qu'une fois, dans l'en-tête, et la
+lecture ne décompresse que les colonnes demandées ; iter_records les
+décompresse au fil de la lecture, un lot de lignes à la fois.
+
+Disposition : MAGIC | longueur de l'en-tête (uint32) | en-tête JSON | blocs
+"""
+import json
+import struct
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+MAGIC = b"ARPC1"
+MEDIA_TYPE = "application/vnd.arp.columnar"
+
+_HEADER_LENGTH = struct.Struct("<I")
+_COMPRESSION_LEVEL = 6
+# Au-delà, un entier n'est pas représentable exactement en float64
+_MAX_EXACT_INT = 2 ** 53
+
+
+def _column_type(values: List) -> str:
+    types = set(map(type, values))
+    types.discard(type(None))
+    if not types:
+        return "f8"
+    if types <= {int}:
+        return "i8"
+    if types <= {int, float}:
+        return "f8"
+    if types <= {str}:
+        return "cat"
+    return "json"
+
+
+def _encode_column(values: List) -> Tuple[str, List[bytes]]:
+    kind = _column_type(values)
+    if kind == "f8":
+        ints = np.fromiter((type(v) is int for v in values), dtype=bool, count=len(values))
+        if ints.any() and any(abs(v) > _MAX_EXACT_INT for v in values if type(v) is int):
+            return "json", [json.dumps(values, ensure_ascii=False).encode("utf-8")]
+        array = np.array([np.nan if v is None else v for v in values], dtype="<f8")
+        blocks = [array.tobytes()]
+        if ints.any():
+            blocks.append(np.packbits(ints).tobytes())
+        return kind, blocks
+    if kind == "i8":
+        nulls = np.fromiter((v is None for v in values), dtype=bool, count=len(values))
+        try:
+            array = np.array([0 if v is None else v for v in values], dtype="<i8")
+        except OverflowError:
+            return "json", [json.dumps(values, ensure_ascii=False).encode("utf-8")]
+        blocks = [array.tobytes()]
+        if nulls.any():
+            blocks.append(np.packbits(nulls).tobytes())
+        return kind, blocks
+    if kind == "cat":
+        codes, categories = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=True)
+        payload = json.dumps(list(categories), ensure_ascii=False).encode("utf-8")
+        return kind, [codes.astype("<i4").tobytes(), payload]
+    return kind, [json.dumps(values, ensure_ascii=False).encode("utf-8")]
+
+
+def encode_columns(columns: Dict[str, List], rows: int) -> bytes:
+    """Encode un dictionnaire colonne -> liste de valeurs (toutes de longueur `rows`)"""
+    header = {"rows": rows, "columns": []}
+    body = []
+    offset = 0
+    for name, values in columns.items():
+        kind, blocks = _encode_column(list(values))
+        spans = []
+        for block in blocks:
+            compressed = zlib.compress(block, _COMPRESSION_LEVEL)
+            spans.append([offset, len(compressed)])
+            body.append(compressed)
+            offset += len(compressed)
+        header["columns"].append({"name": name, "type": kind, "blocks": spans})
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    return b"".join([MAGIC, _HEADER_LENGTH.pack(len(header_bytes)), header_bytes] + body)
+
+
+def encode_records(records: List[dict], columns: Optional[Sequence[str]] = None) -> bytes:
+    """Encode une liste de lignes (dicts) ; colonnes = clés de la première ligne par défaut"""
+    if columns is None:
+        columns = list(records[0].keys()) if records else []
+    return encode_columns({col: [row.get(col) for row in records] for col in columns}, len(records))
+
+
+def _read_header(blob: bytes) -> Tuple[dict, int]:
+    if not blob.startswith(MAGIC):
+        raise ValueError("Format colonnaire invalide")
+    start = len(MAGIC) + _HEADER_LENGTH.size
+    (length,) = _HEADER_LENGTH.unpack_from(blob, len(MAGIC))
+    header = json.loads(blob[start:start + length].decode("utf-8"))
+    return header, start + length
+
+
+def read_header(blob: bytes) -> dict:
+    """En-tête seul (nombre de lignes, colonnes et types), sans décompresser les données"""
+    return _read_header(blob)[0]
+
+
+def _selected(header: dict, columns: Optional[Iterable[str]]) -> List[dict]:
+    if columns is None:
+        return header["columns"]
+    by_name = {col["name"]: col for col in header["columns"]}
+    return [by_name[name] for name in columns if name in by_name]
+
+
+def _blocks(blob: bytes, data_start: int, column: dict) -> List[bytes]:
+    return [
+        zlib.decompress(blob[data_start + offset:data_start + offset + size])
+        for offset, size in column["blocks"]
+    ]
+
+
+def _decode_array(blocks: List[bytes], column: dict, rows: int):
+    """Colonne décodée en tableau NumPy typé (+ masque de nullité)"""
+    kind = column["type"]
+    if kind == "f8":
+        values = np.frombuffer(blocks[0], dtype="<f8")
+        return values, np.isnan(values)
+    if kind == "i8":
+        values = np.frombuffer(blocks[0], dtype="<i8")
+        nulls = np.unpackbits(np.frombuffer(blocks[1], dtype=np.uint8), count=rows).astype(bool) if len(blocks) > 1 else np.zeros(rows, dtype=bool)
+        return values, nulls
+    if kind == "cat":
+        codes = np.frombuffer(blocks[0], dtype="<i4")
+        categories = np.array(json.loads(blocks[1].decode("utf-8")) + [None], dtype=object)
+        return categories[codes], codes < 0
+    values = np.empty(rows, dtype=object)
+    values[:] = json.loads(blocks[0].decode("utf-8"))
+    return values, pd.isna(values)
+
+
+def _to_list(values: np.ndarray, nulls: np.ndarray, ints: Optional[np.ndarray]) -> List:
+    decoded = values.astype(object)
+    if ints is not None:
+        # Entiers d'une colonne mixte : rendus en int
+        decoded[ints] = values[ints].astype(np.int64).astype(object)
+    decoded[nulls] = None
+    return decoded.tolist()
+
+
+def _mask(block: bytes, rows: int) -> np.ndarray:
+    return np.unpackbits(np.frombuffer(block, dtype=np.uint8), count=rows).astype(bool)
+
+
+def decode_columns(blob: bytes, columns: Optional[Iterable[str]] = None) -> Dict[str, List]:
+    """Décode les colonnes demandées (toutes par défaut) en listes Python, None pour les nulles"""
+    header, data_start = _read_header(blob)
+    result = {}
+    for column in _selected(header, columns):
+        blocks = _blocks(blob, data_start, column)
+        values, nulls = _decode_array(blocks, column, header["rows"])
+        ints = _mask(blocks[1], header["rows"]) if column["type"] == "f8" and len(blocks) > 1 else None
+        result[column["name"]] = _to_list(values, nulls, ints)
+    return result
+
+
+def decode_records(blob: bytes, columns: Optional[Iterable[str]] = None) -> List[dict]:
+    """Décode en lignes (dicts), limité aux colonnes demandées"""
+    decoded = decode_columns(blob, columns)
+    names = list(decoded.keys())
+    return [dict(zip(names, row)) for row in zip(*decoded.values())]
+
+
+class _StreamedBlock:
+    """Bloc compressé de valeurs à taille fixe, décompressé tranche par tranche"""
+
+    def __init__(self, data: memoryview, dtype: str):
+        self.dtype = np.dtype(dtype)
+        self._decompressor = zlib.decompressobj()
+        self._pending = data
+
+    def read(self, count: int) -> np.ndarray:
+        wanted = count * self.dtype.itemsize
+        chunks, size = [], 0
+        while size < wanted:
+            chunk = self._decompressor.decompress(self._pending, wanted - size)
+            self._pending = self._decompressor.unconsumed_tail
+            if not chunk:
+                break
+            chunks.append(chunk)
+            size += len(chunk)
+        return np.frombuffer(b"".join(chunks), dtype=self.dtype)
+
+
+class _ColumnSlices:
+    """Lignes successives d'une colonne ; seuls les masques, dictionnaires et colonnes "json" sont décodés en entier"""
+
+    def __init__(self, blob: memoryview, data_start: int, column: dict, rows: int):
+        self.kind = column["type"]
+        spans = [blob[data_start + offset:data_start + offset + size] for offset, size in column["blocks"]]
+        self.ints = self.nulls = self.categories = self.values = None
+        if self.kind == "json":
+            self.values, self.nulls = _decode_array([zlib.decompress(spans[0])], column, rows)
+            return
+        self.stream = _StreamedBlock(spans[0], "<i4" if self.kind == "cat" else f"<{self.kind}")
+        if self.kind == "cat":
+            self.categories = np.array(json.loads(zlib.decompress(spans[1]).decode("utf-8")) + [None], dtype=object)
+        elif len(spans) > 1:
+            mask = _mask(zlib.decompress(spans[1]), rows)
+            if self.kind == "f8":
+                self.ints = mask
+            else:
+                self.nulls = mask
+
+    def read(self, start: int, count: int) -> List:
+        stop = start + count
+        if self.kind == "json":
+            return _to_list(self.values[start:stop], self.nulls[start:stop], None)
+        values = self.stream.read(count)
+        if self.kind == "cat":
+            return _to_list(self.categories[values], values < 0, None)
+        if self.kind == "f8":
+            return _to_list(values, np.isnan(values), None if self.ints is None else self.ints[start:stop])
+        nulls = np.zeros(count, dtype=bool) if self.nulls is None else self.nulls[start:stop]
+        return _to_list(values, nulls, None)
+
+
+def iter_records(blob: bytes, columns: Optional[Iterable[str]] = None, batch_rows: int = 5000) -> Iterator[List[dict]]:
+    """
+    Lignes (dicts) par lots de batch_rows : chaque colonne est décompressée au fil de
+    la lecture, un lot à la fois (sauf les colonnes "json", décodées en entier)
+    """
+    header, data_start = _read_header(blob)
+    rows = header["rows"]
+    view = memoryview(blob)
+    columns = [(column["name"], _ColumnSlices(view, data_start, column, rows)) for column in _selected(header, columns)]
+    names = [name for name, _ in columns]
+    for start in range(0, rows, batch_rows):
+        count = min(batch_rows, rows - start)
+        decoded = [column.read(start, count) for _, column in columns]
+        yield [dict(zip(names, row)) for row in zip(*decoded)]
+
+
+def decode_frame(blob: bytes, columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """Décode en DataFrame en gardant les types numériques (float64/Int64)"""
+    header, data_start = _read_header(blob)
+    data = {}
+    for column in _selected(header, columns):
+        values, nulls = _decode_array(_blocks(blob, data_start, column), column, header["rows"])
+        if column["type"] == "f8":
+            data[column["name"]] = values
+        elif column["type"] == "i8":
+            data[column["name"]] = pd.arrays.IntegerArray(values.copy(), nulls.copy())
+        else:
+            values = values.copy()
+            values[nulls] = None
+            data[column["name"]] = values
+    return pd.DataFrame(data, index=pd.RangeIndex(header["rows"]))
+
+
+def project(blob: bytes, columns: Iterable[str]) -> bytes:
+    """Sous-ensemble de colonnes, sans décompression (les blocs sont recopiés tels quels)"""
+    header, data_start = _read_header(blob)
+    selected = _selected(header, columns)
+    new_header = {"rows": header["rows"], "columns": []}
+    body = []
+    offset = 0
+    for column in selected:
+        spans = []
+        for block_offset, size in column["blocks"]:
+            body.append(blob[data_start + block_offset:data_start + block_offset + size])
+            spans.append([offset, size])
+            offset += size
+        new_header["columns"].append({"name": column["name"], "type": column["type"], "blocks": spans})
+    header_bytes = json.dumps(new_header, ensure_ascii=False).encode("utf-8")
+    return b"".join([MAGIC, _HEADER_LENGTH.pack(len(header_bytes)), header_bytes] + body)
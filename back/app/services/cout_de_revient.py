@@ -0,0 +1,285 @@
+"""
+Coût de revient horaire des machines (formules de l'onglet "Coût de revient").
+
+Les 16 entrées d'une machine sont des flottants ; une entrée absente vaut 0 et
+un dénominateur nul est remplacé par 1, comme dans la page. Les calculs sont
+écrits sur des tableaux NumPy : un appel évalue d'un coup toutes les machines
+d'une année, ou toutes les machines × tous les points d'un scénario (broadcasting).
+"""
+import threading
+from typing import Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app import crud, schemas
+
+# Entrées, dans l'ordre du formulaire (infos générales puis spécifiques)
+INPUTS = (
+    "heures_annuelles",
+    "amortissement",
+    "interet",
+    "kwh",
+    "air_liquide",
+    "coef_puissance",
+    "frais_locaux",
+    "assurances",
+    "heures_facturees",
+    "prix_achat",
+    "maintenance",
+    "surface",
+    "puissance",
+    "conso_air_liquide",
+    "salaire_operateur",
+    "coef_utilisation",
+)
+
+# Coûts horaires (€/h), dans l'ordre du tableau de la page
+OUTPUTS = (
+    "amortissement_horaire",
+    "assurances_horaire",
+    "frais_financiers_horaires",
+    "frais_entretien_horaires",
+    "frais_locaux_horaires",
+    "frais_air_liquide_horaires",
+    "frais_energie_horaires",
+    "cout_horaire_brut",
+    "salaire_horaire_operateur",
+    "cout_horaire_machine",
+)
+
+# Journée de référence (heures) pour le temps journalier et le tableau de variation
+BASE_JOURNEE = 7
+HEURES_VARIATION = np.arange(10)
+
+
+def _or_one(value: np.ndarray) -> np.ndarray:
+    """Équivalent de `x || 1` côté page : un dénominateur nul vaut 1"""
+    return np.where(value == 0, 1.0, value)
+
+
+def to_arrays(rows: List[Mapping[str, Optional[float]]]) -> Dict[str, np.ndarray]:
+    """Entrées de plusieurs machines -> un tableau par entrée (None -> 0)"""
+    return {
+        name: np.array([row.get(name) or 0.0 for row in rows], dtype=np.float64)
+        for name in INPUTS
+    }
+
+
+def evaluate(inputs: Mapping[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Coûts horaires ; les entrées peuvent avoir des formes différentes tant qu'elles sont compatibles (broadcasting)"""
+    heures = inputs["heures_annuelles"]
+    amortissement = inputs["amortissement"]
+    prix = inputs["prix_achat"]
+    coef_utilisation = inputs["coef_utilisation"]
+
+    out = {
+        "amortissement_horaire": prix / _or_one(amortissement * heures),
+        "assurances_horaire": prix * inputs["assurances"] / _or_one(heures),
+        "frais_financiers_horaires": inputs["interet"] * (prix / 2) * amortissement / _or_one(heures * amortissement),
+        "frais_entretien_horaires": inputs["maintenance"] / _or_one(heures) * coef_utilisation,
+        "frais_locaux_horaires": inputs["frais_locaux"] * inputs["surface"] / _or_one(heures),
+        "frais_air_liquide_horaires": inputs["conso_air_liquide"] * inputs["air_liquide"],
+        "frais_energie_horaires": inputs["kwh"] * inputs["coef_puissance"] * inputs["puissance"] * coef_utilisation,
+    }
+    out["cout_horaire_brut"] = sum(out[name] for name in OUTPUTS[:7])
+    out["salaire_horaire_operateur"] = inputs["salaire_operateur"] * np.ones_like(out["cout_horaire_brut"])
+    out["cout_horaire_machine"] = out["cout_horaire_brut"] + out["salaire_horaire_operateur"]
+    out["temps_journalier_heures"] = BASE_JOURNEE * coef_utilisation * np.ones_like(out["cout_horaire_brut"])
+    return out
+
+
+def variation(inputs: Mapping[str, np.ndarray], hours: np.ndarray = HEURES_VARIATION) -> Dict[str, np.ndarray]:
+    """
+    Tableau de variation de la page : coûts pour h heures de fonctionnement (dernier axe).
+    À 0 h seul le coût fixe reste ; le coût variable n'applique pas le coefficient d'utilisation.
+    """
+    heures = inputs["heures_annuelles"]
+    amortissement = inputs["amortissement"]
+    prix = inputs["prix_achat"]
+    fixe = (
+        prix / _or_one(amortissement * heures)
+        + prix * inputs["assurances"] / _or_one(heures)
+        + inputs["interet"] * (prix / 2) * amortissement / _or_one(heures * amortissement)
+        + inputs["frais_locaux"] * inputs["surface"] / _or_one(heures)
+    )[..., None]
+    variable = (
+        inputs["maintenance"] / _or_one(heures)
+        + inputs["kwh"] * inputs["coef_puissance"] * inputs["puissance"]
+        + inputs["conso_air_liquide"] * inputs["air_liquide"]
+    )[..., None]
+    brut = np.where(hours == 0, fixe, hours * (fixe + variable))
+    salaire = np.asarray(inputs["salaire_operateur"])[..., None] * hours
+    return {"salaire": salaire, "brut": brut, "total": brut + salaire}
+
+
+# Balayage d'une entrée : facteur appliqué à la valeur enregistrée, ou valeur remplaçant celle-ci
+MODE_FACTEUR = "facteur"
+MODE_VALEUR = "valeur"
+MODES = (MODE_FACTEUR, MODE_VALEUR)
+
+# Axe de scénario : (entrée, mode, valeurs)
+Axis = Tuple[str, str, np.ndarray]
+
+
+def axis_values(values: Optional[List[float]], start: Optional[float], end: Optional[float], points: Optional[int]) -> Optional[np.ndarray]:
+    """Valeurs d'un axe : liste explicite, ou points réguliers de start à end ; None si l'axe est incomplet"""
+    if values:
+        return np.array(values, dtype=np.float64)
+    if start is not None and end is not None and points and points > 0:
+        return np.linspace(start, end, points)
+    return None
+
+
+def grid_size(machines: int, axes: List[Axis]) -> int:
+    size = machines
+    for _, _, values in axes:
+        size *= len(values)
+    return size
+
+
+def _apply(base: np.ndarray, mode: str, values: np.ndarray) -> np.ndarray:
+    return base * values if mode == MODE_FACTEUR else values + np.zeros_like(base)
+
+
+def sweep(arrays: Mapping[str, np.ndarray], axes: List[Axis], output: str = "cout_horaire_machine") -> np.ndarray:
+    """
+    Sortie pour toutes les machines × toutes les combinaisons des axes :
+    tableau (machines, len(axe 1), ..., len(axe k)), calculé par broadcasting
+    """
+    ndim = 1 + len(axes)
+    inputs = {name: values.reshape((-1,) + (1,) * len(axes)) for name, values in arrays.items()}
+    for k, (name, mode, values) in enumerate(axes):
+        shape = [1] * ndim
+        shape[k + 1] = len(values)
+        inputs[name] = _apply(inputs[name], mode, np.asarray(values, dtype=np.float64).reshape(shape))
+    result = evaluate(inputs)[output]
+    return np.broadcast_to(result, (len(next(iter(arrays.values()))),) + tuple(len(values) for _, _, values in axes))
+
+
+def sensitivity(arrays: Mapping[str, np.ndarray], axes: List[Axis], output: str = "cout_horaire_machine") -> List[np.ndarray]:
+    """Une entrée à la fois, les autres restant aux valeurs enregistrées : un tableau (machines, valeurs) par axe"""
+    return [sweep(arrays, [axis], output) for axis in axes]
+
+
+def scenario_tables(machines: list, arrays: Mapping[str, np.ndarray], axes: List[Axis], output: str, detail: bool) -> dict:
+    """
+    Résumé d'un balayage (dicts schemas.MachineCostScenarioResponse) : par machine la valeur de base,
+    la moyenne, le min / max et leurs combinaisons ; tables de sensibilité une entrée à la fois ;
+    chaque point si detail
+    """
+    base = evaluate(arrays)[output]
+    grid = sweep(arrays, axes, output)
+    flat = grid.reshape(len(machines), -1)
+    shape = grid.shape[1:]
+    i_min, i_max = flat.argmin(axis=1), flat.argmax(axis=1)
+
+    def combination(index: int) -> Dict[str, float]:
+        return {name: float(values[i]) for (name, _, values), i in zip(axes, np.unravel_index(index, shape))}
+
+    result = {
+        "points": int(grid.size),
+        "axes": [{"entree": name, "mode": mode, "valeurs": values.tolist()} for name, mode, values in axes],
+        "machines": [
+            {
+                "machine_id": machine.id,
+                "machine": machine.name,
+                "base": float(base[row]),
+                "moyenne": float(flat[row].mean()),
+                "min": float(flat[row, i_min[row]]),
+                "max": float(flat[row, i_max[row]]),
+                "scenario_min": combination(i_min[row]),
+                "scenario_max": combination(i_max[row]),
+            }
+            for row, machine in enumerate(machines)
+        ],
+        "sensibilite": [],
+        "detail": None,
+    }
+    for (name, _, values), table in zip(axes, sensitivity(arrays, axes, output)):
+        gap = table - base[:, None]
+        pct = np.divide(gap * 100, base[:, None], out=np.full(gap.shape, np.nan), where=base[:, None] != 0)
+        for row, machine in enumerate(machines):
+            for j, value in enumerate(values.tolist()):
+                result["sensibilite"].append({
+                    "entree": name,
+                    "valeur": value,
+                    "machine_id": machine.id,
+                    "cout": float(table[row, j]),
+                    "ecart": float(gap[row, j]),
+                    "ecart_pct": None if np.isnan(pct[row, j]) else float(pct[row, j]),
+                })
+    if detail:
+        result["detail"] = [
+            {"machine_id": machines[row].id, "valeurs": combination(index), "cout": float(flat[row, index])}
+            for row in range(len(machines)) for index in range(flat.shape[1])
+        ]
+    return result
+
+
+class _YearCache:
+    """Résultats par année, clé (année, version des entrées) ; une seule version gardée par année"""
+
+    def __init__(self):
+        self._entries: Dict[int, Tuple[Tuple, list]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, year: int, version: Tuple) -> Optional[list]:
+        with self._lock:
+            entry = self._entries.get(year)
+            return entry[1] if entry and entry[0] == version else None
+
+    def put(self, year: int, version: Tuple, results: list):
+        with self._lock:
+            self._entries[year] = (version, results)
+
+
+_cache = _YearCache()
+
+
+def _inputs_arrays(filled: list) -> Dict[str, np.ndarray]:
+    return to_arrays([{name: getattr(inputs, name) for name in INPUTS} for _, inputs in filled])
+
+
+def year_inputs(db: Session, year: int, machine_ids: Optional[List[int]] = None):
+    """Machines d'une année ayant des entrées (filtrées si machine_ids) et leurs entrées en tableaux"""
+    filled = [
+        (machine, inputs) for machine, inputs in crud.get_machines_with_cost_inputs(db, year)
+        if inputs is not None and (not machine_ids or machine.id in machine_ids)
+    ]
+    return [machine for machine, _ in filled], _inputs_arrays(filled)
+
+
+def year_costs(db: Session, year: int) -> List[dict]:
+    """
+    Coûts de toutes les machines d'une année (dicts schemas.MachineCost), en un seul calcul
+    vectorisé ; recalculés seulement si une machine ou une entrée de l'année a changé
+    """
+    pairs = crud.get_machines_with_cost_inputs(db, year)
+    version = tuple((machine.id, machine.name, inputs.version if inputs else 0) for machine, inputs in pairs)
+    results = _cache.get(year, version)
+    if results is not None:
+        return results
+
+    filled = [(machine, inputs) for machine, inputs in pairs if inputs is not None]
+    arrays = _inputs_arrays(filled)
+    costs = evaluate(arrays)
+    table = variation(arrays)
+    row_of = {machine.id: row for row, (machine, _) in enumerate(filled)}
+
+    results = []
+    for machine, inputs in pairs:
+        row = row_of.get(machine.id)
+        results.append({
+            "machine_id": machine.id,
+            "machine": machine.name,
+            "year": machine.year,
+            "entrees": schemas.MachineCostInputs.model_validate(inputs).model_dump() if inputs else None,
+            "couts": {name: float(values[row]) for name, values in costs.items()} if row is not None else None,
+            "variation": [
+                {"heures": int(h), "salaire": float(table["salaire"][row, i]), "brut": float(table["brut"][row, i]), "total": float(table["total"][row, i])}
+                for i, h in enumerate(HEURES_VARIATION)
+            ] if row is not None else [],
+        })
+    _cache.put(year, version, results)
+    return results
@@ -0,0 +1,799 @@
+"""
+Traitement des fichiers de coûts salariaux (lecture, résolution des colonnes, stockage).
+
+Les fonctions de parsing ne dépendent ni de FastAPI ni de la base : elles
+peuvent tourner dans un process séparé (voir app.services.jobs).
+"""
+import hashlib
+import json
+import logging
+import math
+import re
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timezone
+from io import BytesIO
+from typing import BinaryIO, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import pandas as pd
+from pandas.api.types import infer_dtype, is_datetime64_any_dtype, is_numeric_dtype
+from sqlalchemy.orm import Session
+
+from app import crud, models
+from app.config import settings
+from app.services import columnar
+from app.services.process_pool import get_shared_pool
+from app.services.couts_salariaux_columns import (
+    COLONNES, NUMERIC_COLONNES, RESOLVER_VERSION, RULE_EXACT, RULE_MISSING, ColumnResolution, resolve_columns
+)
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = (".xlsx", ".xls", ".csv")
+
+# Formats de stockage d'un CoutsSalariauxFile
+STORAGE_JSON = "json"  # tableau JSON dans processed_data
+STORAGE_ROWS = "rows"  # une ligne par enregistrement dans couts_salariaux_rows
+STORAGE_COLUMNAR = "columnar"  # format colonnaire compressé dans processed_blob
+INLINE_STORAGES = (STORAGE_JSON, STORAGE_COLUMNAR)
+
+# Taille des blocs de l'ingestion CSV en flux
+CSV_CHUNK_ROWS = 5000
+
+_HASH_BLOCK = 1 << 20
+
+# Entier écrit comme un flottant ("123.0") : Matricule lu en float quand la colonne a des cellules vides
+_WHOLE_FLOAT = re.compile(r"^(-?\d+)\.0*$")
+# Entre deux lignes d'un tableau JSON
+_JSON_SEPARATORS = re.compile(r"[\s,]*")
+
+# Nombres au format français : séparateurs de milliers, € et % supprimés, virgule décimale
+_FR_NUMBER = str.maketrans({" ": None, "\t": None, "\u00a0": None, "\u202f": None, "€": None, "%": None, ",": "."})
+
+
+def read_dataframe(content: bytes, filename: str) -> pd.DataFrame:
+    """Lecture du fichier avec la logique du projet CS"""
+    if filename.endswith('.csv'):
+        df = pd.read_csv(BytesIO(content))
+        logger.info("Fichier CSV lu avec succès")
+        return df
+
+    # Essayer différentes approches pour lire le fichier Excel (logique du projet CS)
+    # Méthode 1: Essayer avec 2 lignes d'en-tête
+    try:
+        raw_df = pd.read_excel(BytesIO(content), header=[0, 1])
+        logger.info("Lecture avec 2 lignes d'en-tête réussie")
+
+        # Fusionner les deux lignes d'en-tête
+        new_columns = []
+        for col in raw_df.columns:
+            if str(col[1]).lower() == 'nan' or str(col[1]).strip() == '' or str(col[1]).startswith('Unnamed'):
+                new_columns.append(str(col[0]).strip())
+            else:
+                new_columns.append(f"{str(col[0]).strip()} {str(col[1]).strip()}")
+
+        raw_df.columns = new_columns
+        logger.info(f"Colonnes après fusion: {new_columns}")
+        return raw_df
+    except Exception as e1:
+        logger.info(f"Échec lecture avec 2 lignes: {e1}")
+
+    # Méthode 2: Essayer avec 1 ligne d'en-tête
+    try:
+        df = pd.read_excel(BytesIO(content), header=0)
+        logger.info("Lecture avec 1 ligne d'en-tête réussie")
+        return df
+    except Exception as e2:
+        logger.info(f"Échec lecture avec 1 ligne: {e2}")
+
+    # Méthode 3: Lire sans en-tête et utiliser la première ligne
+    try:
+        df = pd.read_excel(BytesIO(content), header=None)
+        logger.info("Lecture sans en-tête réussie")
+        df.columns = df.iloc[0]
+        df = df.iloc[1:].reset_index(drop=True)
+        logger.info(f"Colonnes après ajustement: {list(df.columns)}")
+        return df
+    except Exception as e3:
+        logger.error(f"Échec lecture sans en-tête: {e3}")
+        raise ValueError("Impossible de lire le fichier Excel")
+
+
+def _log_resolution(resolution: ColumnResolution):
+    for colonne, rule in resolution.rules.items():
+        if rule == RULE_MISSING:
+            logger.info(f"Colonne non trouvée: {colonne}")
+        elif rule != RULE_EXACT:
+            logger.info(f"Mapping {rule}: {resolution.sources[colonne]} -> {colonne}")
+
+
+def _format_dates(series: pd.Series) -> pd.Series:
+    """Dates -> chaînes 'YYYY-MM-DD', colonne entière d'un coup"""
+    if is_datetime64_any_dtype(series):
+        return series.dt.strftime('%Y-%m-%d')
+    if series.dtype != object:
+        return series
+    kind = infer_dtype(series, skipna=True)
+    if kind in ("datetime", "datetime64", "date"):
+        return pd.to_datetime(series, errors='coerce').dt.strftime('%Y-%m-%d')
+    if kind.startswith("mixed"):
+        # Colonne mixte (dates et texte) : seules les cellules date sont converties
+        mask = series.map(_is_date_value, na_action='ignore').fillna(False).astype(bool)
+        if mask.any():
+            series = series.copy()
+            series[mask] = pd.to_datetime(series[mask], errors='coerce').dt.strftime('%Y-%m-%d')
+    return series
+
+
+def _is_date_value(value) -> bool:
+    return isinstance(value, (datetime, date))
+
+
+def _coerce_numeric(series: pd.Series) -> pd.Series:
+    """Nombres au format français ("1 234,56", "45,2 %") -> float"""
+    if is_numeric_dtype(series) or series.isna().all():
+        return series
+    text = series.astype("string").str.translate(_FR_NUMBER).str.strip()
+    numbers = pd.to_numeric(text, errors='coerce')
+    # Cellules vides -> nulles ; texte non numérique -> inchangé
+    unparsed = numbers.isna() & text.fillna("").ne("")
+    if not unparsed.any():
+        return numbers
+    return numbers.astype(object).where(~unparsed, series)
+
+
+def normalize_dataframe(result_df: pd.DataFrame) -> pd.DataFrame:
+    """Nettoyage colonne par colonne : dates, nombres au format français, valeurs nulles"""
+    columns = {}
+    for col in result_df.columns:
+        series = _format_dates(result_df[col])
+        if col in NUMERIC_COLONNES:
+            series = _coerce_numeric(series)
+        columns[col] = series
+    return pd.DataFrame(columns, index=result_df.index)
+
+
+def dataframe_to_records(result_df: pd.DataFrame) -> List[dict]:
+    """Lignes JSON-sérialisables ; NA/NaT/NaN -> None, traité colonne par colonne"""
+    columns = list(result_df.columns)
+    values = [
+        result_df[col].astype(object).where(result_df[col].notna(), None).tolist()
+        for col in columns
+    ]
+    return [dict(zip(columns, row)) for row in zip(*values)]
+
+
+def build_dataframe(df: pd.DataFrame, resolution: Optional[ColumnResolution] = None) -> Tuple[pd.DataFrame, ColumnResolution]:
+    """Résout les colonnes attendues et retourne le DataFrame normalisé"""
+    if resolution is None:
+        # Résolution des colonnes attendues (mémorisée par mise en page de l'export)
+        resolution = resolve_columns(df.columns)
+        _log_resolution(resolution)
+
+    # Créer un DataFrame avec les colonnes dans l'ordre exact
+    return normalize_dataframe(resolution.apply(df)), resolution
+
+
+def build_records(df: pd.DataFrame, resolution: Optional[ColumnResolution] = None) -> Tuple[List[dict], dict]:
+    """Résout les colonnes attendues et retourne (lignes JSON-sérialisables, rapport de mapping)"""
+    result_df, resolution = build_dataframe(df, resolution)
+    data = dataframe_to_records(result_df)
+    logger.info(f"Données traitées: {len(data)} lignes")
+    return data, resolution.report()
+
+
+def parse_upload(content: bytes, filename: str) -> Tuple[List[dict], dict]:
+    """Point d'entrée du parsing complet (utilisable dans un process pool)"""
+    return build_records(read_dataframe(content, filename))
+
+
+def content_fingerprint(content: bytes) -> str:
+    """Empreinte SHA-256 du contenu uploadé"""
+    return hashlib.sha256(content).hexdigest()
+
+
+def stream_fingerprint(stream: BinaryIO) -> str:
+    """Empreinte SHA-256 d'un fichier lu par blocs (le curseur est remis au début)"""
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for block in iter(lambda: stream.read(_HASH_BLOCK), b""):
+        digest.update(block)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+class ParseCache:
+    """Cache LRU des résultats de parsing, clé (empreinte, version du résolveur), borné en nombre de lignes"""
+
+    def __init__(self, max_rows: int):
+        self.max_rows = max_rows
+        self._entries: "OrderedDict[Tuple[str, int], Tuple[List[dict], Optional[dict]]]" = OrderedDict()
+        self._rows = 0
+        self._lock = threading.Lock()
+
+    def get(self, content_hash: str) -> Optional[Tuple[List[dict], Optional[dict]]]:
+        key = (content_hash, RESOLVER_VERSION)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, content_hash: str, data: List[dict], column_mapping: Optional[dict]):
+        if len(data) > self.max_rows:
+            return
+        key = (content_hash, RESOLVER_VERSION)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._rows -= len(previous[0])
+            self._entries[key] = (data, column_mapping)
+            self._rows += len(data)
+            while self._rows > self.max_rows:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._rows -= len(evicted)
+
+
+parse_cache = ParseCache(settings.PARSE_CACHE_MAX_ROWS)
+
+
+def parse_upload_cached(db: Session, content: bytes, filename: str, content_hash: str) -> Tuple[List[dict], Optional[dict]]:
+    """
+    Parsing avec cache : mémoire, puis fichier déjà créé à partir du même contenu,
+    puis parsing complet. Les lignes retournées sont partagées : ne pas les modifier.
+    """
+    cached = parse_cache.get(content_hash)
+    if cached is not None:
+        logger.info(f"Parsing - cache mémoire: {content_hash[:12]}")
+        return cached
+
+    pristine = crud.get_couts_salariaux_file_by_hash(db, content_hash, RESOLVER_VERSION)
+    if pristine:
+        logger.info(f"Parsing - données reprises du fichier ID {pristine.id}")
+        data, column_mapping = load_records(db, pristine), None
+    else:
+        data, column_mapping = parse_upload(content, filename)
+    parse_cache.put(content_hash, data, column_mapping)
+    return data, column_mapping
+
+
+def parse_uploads(items: List[Tuple[bytes, str, str]], max_workers: Optional[int] = None) -> List[Tuple[Optional[Tuple[List[dict], Optional[dict]]], Optional[str]]]:
+    """
+    Parse plusieurs fichiers (contenu, nom, empreinte) en parallèle sur le process pool partagé,
+    max_workers à la fois au plus. Les contenus déjà en cache ne sont pas renvoyés aux workers.
+    Retourne, dans l'ordre, ((lignes, mapping), None) ou (None, message d'erreur).
+    """
+    results: List = [None] * len(items)
+    pending = []
+    for index, (content, filename, content_hash) in enumerate(items):
+        cached = parse_cache.get(content_hash)
+        if cached is not None:
+            results[index] = (cached, None)
+        else:
+            pending.append(index)
+
+    pool = get_shared_pool()
+    workers = min(len(pending), max_workers or pool.max_workers)
+    if workers > 1:
+        outcomes = {}
+        futures = pool.ordered(parse_upload, [items[index][:2] for index in pending], workers)
+        for index, future in zip(pending, futures):
+            try:
+                outcomes[index] = (future.result(), None)
+            except Exception as e:
+                outcomes[index] = (None, str(e))
+    else:
+        outcomes = {}
+        for index in pending:
+            try:
+                outcomes[index] = (parse_upload(items[index][0], items[index][1]), None)
+            except Exception as e:
+                outcomes[index] = (None, str(e))
+
+    for index, (parsed, error) in outcomes.items():
+        if parsed is not None:
+            parse_cache.put(items[index][2], *parsed)
+        results[index] = (parsed, error)
+    return results
+
+
+def normalize_for_append(existing_data: List[dict], data: List[dict]) -> List[dict]:
+    """Aligne les nouvelles lignes sur les colonnes du fichier existant"""
+    # Créer un dictionnaire des services et P/HP par salarié à partir des données existantes
+    salarie_info = {}
+    for existing_row in existing_data:
+        salarie_name = existing_row.get("Salarié")
+        if salarie_name:
+            salarie_info[salarie_name] = {
+                "Service": existing_row.get("Service"),
+                "P / HP": existing_row.get("P / HP")
+            }
+
+    normalized_new_data = []
+    for row in data:
+        normalized_row = {}
+        for col in existing_data[0].keys() if existing_data else COLONNES:
+            # Logique intelligente pour Service et P/HP
+            if col == "Service" and col not in row:
+                salarie_name = row.get("Salarié")
+                if salarie_name and salarie_name in salarie_info:
+                    normalized_row[col] = salarie_info[salarie_name]["Service"]
+                else:
+                    normalized_row[col] = "Non spécifié"
+            elif col == "P / HP" and col not in row:
+                salarie_name = row.get("Salarié")
+                if salarie_name and salarie_name in salarie_info:
+                    normalized_row[col] = salarie_info[salarie_name]["P / HP"]
+                else:
+                    normalized_row[col] = "Non spécifié"
+            else:
+                normalized_row[col] = row.get(col, None)
+        normalized_new_data.append(normalized_row)
+    return normalized_new_data
+
+
+def _key_part(value) -> Optional[str]:
+    """Valeur de clé normalisée : 123, 123.0, '123.0' et ' 123 ' -> '123' ; vide ou NaN -> None"""
+    if value is None:
+        return None
+    if isinstance(value, float):
+        if math.isnan(value):
+            return None
+        if value.is_integer():
+            return str(int(value))
+    text = str(value).strip()
+    match = _WHOLE_FLOAT.match(text)
+    if match:
+        text = match.group(1)
+    return text or None
+
+
+def _row_key(row: dict) -> Tuple[Optional[str], Optional[str]]:
+    """Clé (Matricule, Mois) telle que stockée dans couts_salariaux_rows"""
+    return _key_part(row.get("Matricule")), _key_part(row.get("Mois"))
+
+
+def _row_entries(file_id: int, start_seq: int, data: List[dict]) -> List[dict]:
+    entries = []
+    for offset, row in enumerate(data):
+        matricule, mois = _row_key(row)
+        entries.append({
+            "file_id": file_id,
+            "seq": start_seq + offset,
+            "matricule": matricule,
+            "mois": mois,
+            "data": json.dumps(row, ensure_ascii=False)
+        })
+    return entries
+
+
+def _inline_payload(data: List[dict], storage: str) -> dict:
+    """Champs du CoutsSalariauxFile pour un stockage en un bloc (json ou columnar)"""
+    if storage == STORAGE_COLUMNAR:
+        columns = list(data[0].keys()) if data else COLONNES
+        return {
+            "processed_data": "[]",
+            "processed_blob": columnar.encode_records(data, columns),
+            "storage_format": STORAGE_COLUMNAR,
+            "total_records": len(data)
+        }
+    return {
+        "processed_data": json.dumps(data, ensure_ascii=False),
+        "processed_blob": None,
+        "storage_format": STORAGE_JSON,
+        "total_records": len(data)
+    }
+
+
+def _write_inline(db: Session, db_file: models.CoutsSalariauxFile, data: List[dict], storage: str):
+    """Écrit (sans commit) les données dans le fichier, stocké en un bloc"""
+    if db_file.storage_format == STORAGE_ROWS:
+        crud.delete_couts_salariaux_rows(db, db_file.id)
+        db_file.rows_revision = (db_file.rows_revision or 0) + 1
+    for field, value in _inline_payload(data, storage).items():
+        setattr(db_file, field, value)
+
+
+def _record_source(
+    db: Session,
+    db_file: models.CoutsSalariauxFile,
+    content_hash: Optional[str],
+    filename: Optional[str] = None,
+    origin: bool = False
+):
+    """Trace (sans commit) le contenu intégré au fichier ; seul un fichier d'origine garde son empreinte"""
+    if content_hash:
+        crud.add_couts_salariaux_file_source(db, db_file.id, content_hash, filename)
+    if origin and content_hash:
+        db_file.content_hash = content_hash
+        db_file.resolver_version = RESOLVER_VERSION
+    else:
+        db_file.content_hash = None
+
+
+def project_records(data: List[dict], columns: Optional[Sequence[str]]) -> List[dict]:
+    if not columns:
+        return data
+    return [{col: row.get(col) for col in columns} for row in data]
+
+
+def record_filters(
+    mois: Optional[Sequence[str]] = None,
+    services: Optional[Sequence[str]] = None,
+    p_hp: Optional[Sequence[str]] = None
+) -> Dict[str, List[str]]:
+    """Filtres de lecture par colonne (Mois : préfixe, ex. 2025-01 ; Service et P / HP : valeur exacte)"""
+    filters = {"Mois": mois, "Service": services, "P / HP": p_hp}
+    return {col: [str(v) for v in values] for col, values in filters.items() if values}
+
+
+def _value_matches(col: str, value, accepted: List[str]) -> bool:
+    if value is None:
+        return False
+    value = str(value)
+    if col == "Mois":
+        return value.startswith(tuple(accepted))
+    return value in accepted
+
+
+def filter_records(data: List[dict], filters: Optional[Dict[str, List[str]]]) -> List[dict]:
+    if not filters:
+        return data
+    return [
+        row for row in data
+        if all(_value_matches(col, row.get(col), accepted) for col, accepted in filters.items())
+    ]
+
+
+def _iter_json_rows(text: str, batch_rows: int) -> Iterator[List[dict]]:
+    """Lignes d'un tableau JSON par lots, décodées au fil de la lecture du texte"""
+    decoder = json.JSONDecoder()
+    pos = _JSON_SEPARATORS.match(text, text.index("[") + 1).end()
+    batch = []
+    while text[pos] != "]":
+        row, pos = decoder.raw_decode(text, pos)
+        pos = _JSON_SEPARATORS.match(text, pos).end()
+        batch.append(row)
+        if len(batch) >= batch_rows:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_record_batches(
+    db: Session,
+    db_file: models.CoutsSalariauxFile,
+    columns: Optional[Sequence[str]] = None,
+    filters: Optional[Dict[str, List[str]]] = None,
+    batch_rows: int = CSV_CHUNK_ROWS,
+    seqs: Optional[Tuple[int, int]] = None
+) -> Iterator[List[dict]]:
+    """
+    Lignes d'un fichier par lots de batch_rows au plus, filtrées puis limitées aux colonnes demandées.
+    Seul un lot de lignes est en mémoire : en stockage ligne à ligne (filtre sur le mois fait
+    en SQL), seqs = (après, jusqu'à) limite la lecture aux lignes de seq dans ]après, jusqu'à] ;
+    en stockage JSON ou colonnaire, s'y ajoute le contenu stocké (texte JSON, ou colonnes
+    décompressées en tableaux typés).
+    """
+    filters = filters or {}
+    if db_file.storage_format == STORAGE_ROWS:
+        query = crud.get_couts_salariaux_rows(db, db_file.id, filters.get("Mois"), seqs).with_entities(models.CoutsSalariauxRow.data)
+        batch = []
+        for (payload,) in query.yield_per(batch_rows):
+            batch.append(json.loads(payload))
+            if len(batch) >= batch_rows:
+                yield project_records(filter_records(batch, filters), columns)
+                batch = []
+        if batch:
+            yield project_records(filter_records(batch, filters), columns)
+        return
+
+    if db_file.storage_format == STORAGE_COLUMNAR:
+        # Seules les colonnes demandées (et filtrées) sont décompressées, en tableaux typés
+        wanted = None
+        if columns:
+            wanted = list(columns) + [col for col in filters if col not in columns]
+        batches = columnar.iter_records(db_file.processed_blob, wanted, batch_rows)
+    else:
+        batches = _iter_json_rows(db_file.processed_data, batch_rows)
+    for batch in batches:
+        yield project_records(filter_records(batch, filters), columns)
+
+
+def load_records(
+    db: Session,
+    db_file: models.CoutsSalariauxFile,
+    columns: Optional[Sequence[str]] = None,
+    filters: Optional[Dict[str, List[str]]] = None
+) -> List[dict]:
+    """Données d'un fichier, quel que soit son format de stockage (filtrées et limitées aux colonnes demandées)"""
+    if filters:
+        return [row for batch in iter_record_batches(db, db_file, columns, filters) for row in batch]
+    if db_file.storage_format == STORAGE_COLUMNAR:
+        # Seules les colonnes demandées sont décompressées
+        return columnar.decode_records(db_file.processed_blob, columns)
+    if db_file.storage_format == STORAGE_ROWS:
+        data = [json.loads(row.data) for row in crud.get_couts_salariaux_rows(db, db_file.id).yield_per(CSV_CHUNK_ROWS)]
+    else:
+        data = json.loads(db_file.processed_data)
+    return project_records(data, columns)
+
+
+def encode_for_transfer(
+    db: Session,
+    db_file: models.CoutsSalariauxFile,
+    columns: Optional[Sequence[str]] = None,
+    filters: Optional[Dict[str, List[str]]] = None
+) -> bytes:
+    """Données d'un fichier au format colonnaire compact"""
+    if db_file.storage_format == STORAGE_COLUMNAR and not filters:
+        return columnar.project(db_file.processed_blob, columns) if columns else db_file.processed_blob
+    data = load_records(db, db_file, columns, filters)
+    return columnar.encode_records(data, columns or (list(data[0].keys()) if data else COLONNES))
+
+
+def ensure_row_storage(db: Session, db_file: models.CoutsSalariauxFile):
+    """Convertit (sans commit) un fichier stocké en un bloc vers le stockage ligne à ligne"""
+    if db_file.storage_format == STORAGE_ROWS:
+        return
+    data = load_records(db, db_file)
+    crud.insert_couts_salariaux_rows(db, _row_entries(db_file.id, 0, data))
+    db_file.rows_revision = (db_file.rows_revision or 0) + 1
+    db_file.processed_data = "[]"
+    db_file.processed_blob = None
+    db_file.storage_format = STORAGE_ROWS
+    db_file.total_records = len(data)
+
+
+def _append_rows(db: Session, existing_file: models.CoutsSalariauxFile, data: List[dict]):
+    """Ajoute (sans commit) des lignes en fin de fichier"""
+    if existing_file.storage_format == STORAGE_ROWS:
+        # Stockage ligne à ligne : simple insertion en fin de fichier
+        start_seq = crud.get_couts_salariaux_next_seq(db, existing_file.id)
+        crud.insert_couts_salariaux_rows(db, _row_entries(existing_file.id, start_seq, data))
+        existing_file.total_records = (existing_file.total_records or 0) + len(data)
+    else:
+        # Charger les données existantes
+        existing_data = load_records(db, existing_file)
+        logger.info(f"Données existantes: {len(existing_data)} lignes")
+
+        # Concaténer les données
+        combined_data = existing_data + normalize_for_append(existing_data, data)
+        _write_inline(db, existing_file, combined_data, existing_file.storage_format)
+
+
+def append_records(
+    db: Session,
+    file_id: int,
+    data: List[dict],
+    content_hash: Optional[str] = None,
+    filename: Optional[str] = None
+) -> Optional[models.CoutsSalariauxFile]:
+    """Ajoute des lignes à un fichier existant (None si le fichier n'existe pas)"""
+    existing_file = crud.get_couts_salariaux_file(db, file_id)
+    if not existing_file:
+        return None
+
+    _append_rows(db, existing_file, data)
+    _record_source(db, existing_file, content_hash, filename)
+    db.commit()
+    db.refresh(existing_file)
+    return existing_file
+
+
+def empty_upsert_counts() -> Dict[str, int]:
+    return {"inserted": 0, "updated": 0, "unchanged": 0, "duplicates_removed": 0}
+
+
+def _merge_rows(db: Session, db_file: models.CoutsSalariauxFile, data: List[dict], counts: Dict[str, int]):
+    """
+    Fusionne (sans commit) des lignes dans un fichier stocké ligne à ligne, par clé (Matricule, Mois).
+    Seules les clés reçues sont recherchées en base : le coût dépend du nombre de lignes reçues.
+    """
+    # Dernière occurrence de chaque clé ; les lignes sans clé complète sont ajoutées telles quelles
+    incoming: Dict[Tuple[str, str], dict] = {}
+    new_rows = []
+    for row in data:
+        key = _row_key(row)
+        if key[0] is None or key[1] is None:
+            new_rows.append(row)
+        else:
+            incoming[key] = row
+
+    updates, duplicates, seen = [], [], set()
+    for row_id, matricule, mois, stored in crud.get_couts_salariaux_rows_by_keys(db, db_file.id, list(incoming)):
+        key = (matricule, mois)
+        if key in seen:
+            # Doublon laissé par un ajout simple : seule la première ligne est conservée
+            duplicates.append(row_id)
+            continue
+        seen.add(key)
+        if json.loads(stored) == incoming[key]:
+            counts["unchanged"] += 1
+        else:
+            updates.append({"id": row_id, "data": json.dumps(incoming[key], ensure_ascii=False)})
+    new_rows.extend(row for key, row in incoming.items() if key not in seen)
+
+    crud.update_couts_salariaux_rows(db, updates)
+    crud.delete_couts_salariaux_rows_by_id(db, duplicates)
+    crud.insert_couts_salariaux_rows(db, _row_entries(db_file.id, crud.get_couts_salariaux_next_seq(db, db_file.id), new_rows))
+
+    if updates or new_rows or duplicates:
+        # Lignes modifiées sans changer le fichier lui-même : sa version (cache des coûts mensuels) doit changer
+        db_file.updated_at = datetime.now(timezone.utc)
+    if updates or duplicates:
+        # Lignes déjà stockées modifiées : une lecture incrémentale (seq) ne suffit plus
+        db_file.rows_revision = (db_file.rows_revision or 0) + 1
+
+    counts["inserted"] += len(new_rows)
+    counts["updated"] += len(updates)
+    counts["duplicates_removed"] += len(duplicates)
+    db_file.total_records = (db_file.total_records or 0) + len(new_rows) - len(duplicates)
+
+
+def upsert_records(
+    db: Session,
+    file_id: int,
+    data: List[dict],
+    content_hash: Optional[str] = None,
+    filename: Optional[str] = None
+) -> Tuple[Optional[models.CoutsSalariauxFile], Optional[Dict[str, int]]]:
+    """
+    Fusionne des lignes dans un fichier existant par clé (Matricule, Mois) : ligne modifiée
+    remplacée, ligne identique ignorée, nouvelle clé ajoutée. Retourne (None, None) si le
+    fichier n'existe pas, sinon le fichier et les compteurs inserted/updated/unchanged.
+    """
+    db_file = crud.get_couts_salariaux_file(db, file_id)
+    if not db_file:
+        return None, None
+
+    # Conversion unique vers le stockage ligne à ligne (index sur la clé)
+    ensure_row_storage(db, db_file)
+    counts = empty_upsert_counts()
+    _merge_rows(db, db_file, data, counts)
+    _record_source(db, db_file, content_hash, filename)
+    db.commit()
+    db.refresh(db_file)
+    logger.info(f"Fusion dans le fichier ID {file_id}: {counts}")
+    return db_file, counts
+
+
+def replace_records(
+    db: Session,
+    file_id: int,
+    data: List[dict],
+    storage: str = STORAGE_JSON,
+    content_hash: Optional[str] = None
+) -> Optional[models.CoutsSalariauxFile]:
+    """Remplace le contenu d'un fichier existant (None si le fichier n'existe pas)"""
+    db_file = crud.get_couts_salariaux_file(db, file_id)
+    if not db_file:
+        return None
+    _write_inline(db, db_file, data, storage)
+    crud.delete_couts_salariaux_file_sources(db, file_id)
+    _record_source(db, db_file, content_hash, db_file.filename, origin=True)
+    db.commit()
+    db.refresh(db_file)
+    return db_file
+
+
+def create_file(
+    db: Session,
+    filename: str,
+    data: List[dict],
+    user_id: Optional[int] = None,
+    storage: str = STORAGE_JSON,
+    content_hash: Optional[str] = None
+) -> models.CoutsSalariauxFile:
+    """Crée un nouveau fichier de coûts salariaux"""
+    db_file = models.CoutsSalariauxFile(filename=filename, uploaded_by=user_id, **_inline_payload(data, storage))
+    db.add(db_file)
+    db.flush()
+    _record_source(db, db_file, content_hash, filename, origin=True)
+    db.commit()
+    db.refresh(db_file)
+    return db_file
+
+
+def store_batch(
+    db: Session,
+    filename: str,
+    parts: List[Tuple[str, Optional[str], List[dict]]],
+    user_id: Optional[int] = None,
+    append_to_file_id: Optional[int] = None,
+    storage: str = STORAGE_JSON,
+    upsert: bool = False
+) -> Tuple[Optional[models.CoutsSalariauxFile], Optional[Dict[str, int]]]:
+    """
+    Écrit plusieurs fichiers parsés (nom, empreinte, lignes) dans un seul CoutsSalariauxFile,
+    en une transaction. Retourne (None, None) si le fichier de destination n'existe pas.
+    """
+    data = [row for _, _, rows in parts for row in rows]
+    upsert_counts = None
+    if append_to_file_id:
+        db_file = crud.get_couts_salariaux_file(db, append_to_file_id)
+        if not db_file:
+            return None, None
+        if upsert:
+            ensure_row_storage(db, db_file)
+            upsert_counts = empty_upsert_counts()
+            _merge_rows(db, db_file, data, upsert_counts)
+        else:
+            _append_rows(db, db_file, data)
+    else:
+        db_file = models.CoutsSalariauxFile(filename=filename, uploaded_by=user_id, **_inline_payload(data, storage))
+        db.add(db_file)
+        db.flush()
+
+    # Un lot n'a pas d'empreinte unique : chaque contenu est tracé comme source
+    for part_filename, content_hash, _ in parts:
+        _record_source(db, db_file, content_hash, part_filename)
+    db.commit()
+    db.refresh(db_file)
+    return db_file, upsert_counts
+
+
+def ingest_csv_stream(
+    db: Session,
+    stream: BinaryIO,
+    filename: str,
+    user_id: Optional[int] = None,
+    append_to_file_id: Optional[int] = None,
+    chunk_rows: int = CSV_CHUNK_ROWS,
+    content_hash: Optional[str] = None,
+    upsert_counts: Optional[Dict[str, int]] = None
+) -> Tuple[Optional[models.CoutsSalariauxFile], Optional[dict]]:
+    """
+    Ingestion CSV par blocs : lecture, normalisation et écriture bloc par bloc.
+    La mémoire utilisée dépend de chunk_rows, pas de la taille du fichier.
+    Avec upsert_counts (et un fichier de destination), chaque bloc est fusionné par
+    (Matricule, Mois) et les compteurs sont mis à jour.
+    Retourne (None, None) si le fichier de destination n'existe pas.
+    """
+    if append_to_file_id:
+        db_file = crud.get_couts_salariaux_file(db, append_to_file_id)
+        if not db_file:
+            return None, None
+        ensure_row_storage(db, db_file)
+    else:
+        db_file = models.CoutsSalariauxFile(
+            filename=filename,
+            processed_data="[]",
+            storage_format=STORAGE_ROWS,
+            total_records=0,
+            uploaded_by=user_id
+        )
+        db.add(db_file)
+        db.flush()
+
+    seq = crud.get_couts_salariaux_next_seq(db, db_file.id)
+    resolution = None
+    inserted = 0
+    try:
+        for chunk in pd.read_csv(stream, chunksize=chunk_rows):
+            if resolution is None:
+                # Colonnes résolues une seule fois pour tout le fichier
+                resolution = resolve_columns(chunk.columns)
+                _log_resolution(resolution)
+            records, _ = build_records(chunk, resolution)
+            if upsert_counts is not None and append_to_file_id:
+                _merge_rows(db, db_file, records, upsert_counts)
+            else:
+                crud.insert_couts_salariaux_rows(db, _row_entries(db_file.id, seq, records))
+                seq += len(records)
+                inserted += len(records)
+            del records, chunk
+    except Exception:
+        db.rollback()
+        raise
+
+    db_file.total_records = (db_file.total_records or 0) + inserted
+    _record_source(db, db_file, content_hash, filename, origin=not append_to_file_id)
+    db.commit()
+    db.refresh(db_file)
+    if upsert_counts is not None and append_to_file_id:
+        logger.info(f"Ingestion CSV par blocs: fusion dans le fichier ID {db_file.id}: {upsert_counts}")
+    else:
+        logger.info(f"Ingestion CSV par blocs: {inserted} lignes écrites dans le fichier ID {db_file.id}")
+    return db_file, resolution.report() if resolution else None
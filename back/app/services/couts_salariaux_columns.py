@@ -0,0 +1,179 @@
+"""
+Résolution des colonnes des exports de coûts salariaux.
+
+Les en-têtes source sont normalisés une seule fois, les variations connues
+passent par un index d'alias précalculé, et le mapping final est mémorisé
+par signature de la ligne d'en-tête (les exports mensuels ont presque
+toujours la même mise en page).
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+# À incrémenter dès que les règles de mapping changent (invalide les caches)
+RESOLVER_VERSION = 1
+
+# Colonnes attendues, dans l'ordre (même que le projet CS)
+COLONNES = [
+    "Matricule", "Salarié", "Service", "P / HP", "Mois",
+    "Heures théoriques", "Heures normales", "Heures majorées", "Total heures",
+    "Effectif", "CP Pris", "RTT/Réci Pris", "Heures réelles", "Brut",
+    "Charges salariales", "Charges patronales", "% charge patronales",
+    "Suppléments coût global", "Coût global", "Coût hora moyen", "PAS",
+    "Net à payer", "Forfait jour", "Entrée", "Sortie", "Emploi", "Etablissement"
+]
+
+# Mapping spécifique pour les colonnes problématiques (du projet CS)
+MAPPING_COLONNES = {
+    'RTT/Réci Pris': ['RTT/Recup Pris', 'RTT/Réci Pris', 'RTT/Recup', 'RTT/Réci', 'RTT', 'Recup Pris', 'Réci Pris', 'RTT/Récup Pris', 'RTT/Récup', 'RTT/Récup Pris'],
+    'Coût hora moyen': ['Coût hora moyen', 'Cout hora moyen', 'Coût horaire moyen'],
+    '% charge patronales': ['% charge patronales', '% patronales', 'Pourcentage patronales', '% charges patronales'],
+    'CP Pris': ['CP Pris', 'CP', 'Congés Pris'],
+    'Heures théoriques': ['Heures théoriques', 'Théoriques', 'Heures theoriques'],
+    'Heures normales': ['Heures normales', 'Normales'],
+    'Heures majorées': ['Heures majorées', 'Majorées'],
+    'Total heures': ['Total heures', 'Total', 'Heures total'],
+    'Heures réelles': ['Heures réelles', 'Réelles'],
+    'Charges salariales': ['Charges salariales', 'Charges salariales', 'Salariales'],
+    'Charges patronales': ['Charges patronales', 'Patronales'],
+    'Suppléments coût global': ['Suppléments coût global', 'Suppléments', 'Coût global supplément'],
+    'Coût global': ['Coût global', 'Cout global', 'Global'],
+    'Net à payer': ['Net à payer', 'Net a payer', 'Net'],
+    'Forfait jour': ['Forfait jour', 'Forfait'],
+    'P / HP': ['P / HP', 'P/HP', 'P HP', 'P-HP']
+}
+
+# Colonnes numériques (nombres au format français acceptés : "1 234,56")
+NUMERIC_COLONNES = [
+    "Heures théoriques", "Heures normales", "Heures majorées", "Total heures",
+    "Effectif", "CP Pris", "RTT/Réci Pris", "Heures réelles", "Brut",
+    "Charges salariales", "Charges patronales", "% charge patronales",
+    "Suppléments coût global", "Coût global", "Coût hora moyen", "PAS",
+    "Net à payer", "Forfait jour"
+]
+
+# Règles de mapping, dans l'ordre de priorité
+RULE_EXACT = "exact"
+RULE_ALIAS = "alias"
+RULE_FUZZY = "fuzzy"
+RULE_MISSING = "missing"
+
+_NORMALIZATION = str.maketrans({'é': 'e', 'è': 'e', 'à': 'a', '/': None, ' ': None})
+
+_CACHE_SIZE = 128
+
+
+def normalize_header(name) -> str:
+    """Normalise un nom de colonne pour la comparaison approximative"""
+    return str(name).lower().translate(_NORMALIZATION)
+
+
+def _build_alias_index() -> Dict[str, List[Tuple[str, int]]]:
+    # alias -> [(colonne cible, rang de l'alias dans MAPPING_COLONNES)]
+    index: Dict[str, List[Tuple[str, int]]] = {}
+    for colonne, variations in MAPPING_COLONNES.items():
+        for rank, variation in enumerate(variations):
+            targets = index.setdefault(variation, [])
+            if all(target != colonne for target, _ in targets):
+                targets.append((colonne, rank))
+    return index
+
+
+_ALIAS_INDEX = _build_alias_index()
+_COLONNES_NORMALIZED = {colonne: normalize_header(colonne) for colonne in COLONNES}
+
+
+@dataclass
+class ColumnResolution:
+    """Mapping colonne cible -> position de la colonne source, avec la règle appliquée"""
+    signature: str
+    positions: Dict[str, Optional[int]] = field(default_factory=dict)
+    sources: Dict[str, Optional[str]] = field(default_factory=dict)
+    rules: Dict[str, str] = field(default_factory=dict)
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Construit le DataFrame avec les colonnes attendues dans l'ordre exact"""
+        data = {}
+        for colonne in COLONNES:
+            position = self.positions.get(colonne)
+            data[colonne] = df.iloc[:, position] if position is not None else None
+        return pd.DataFrame(data, index=df.index, columns=COLONNES)
+
+    def report(self) -> Dict[str, dict]:
+        """Détail du mapping pour la réponse API"""
+        return {
+            colonne: {"source": self.sources.get(colonne), "rule": self.rules[colonne]}
+            for colonne in COLONNES
+        }
+
+
+def layout_signature(headers: Sequence) -> str:
+    """Empreinte de la ligne d'en-tête (clé du cache de résolution)"""
+    payload = json.dumps([str(h) for h in headers], ensure_ascii=False)
+    return hashlib.sha1(f"{RESOLVER_VERSION}:{payload}".encode("utf-8")).hexdigest()
+
+
+def _resolve(headers: Sequence, signature: str) -> ColumnResolution:
+    resolution = ColumnResolution(signature=signature)
+
+    # Première occurrence de chaque en-tête et meilleur alias par colonne cible
+    first_position: Dict[str, int] = {}
+    best_alias: Dict[str, Tuple[int, int]] = {}
+    normalized: List[Tuple[int, str]] = []
+    for position, header in enumerate(headers):
+        key = header if isinstance(header, str) else str(header)
+        if key in first_position:
+            continue
+        first_position[key] = position
+        for colonne, rank in _ALIAS_INDEX.get(key, ()):
+            if colonne not in best_alias or rank < best_alias[colonne][0]:
+                best_alias[colonne] = (rank, position)
+        header_normalized = normalize_header(header)
+        if header_normalized:
+            normalized.append((position, header_normalized))
+
+    for colonne in COLONNES:
+        if colonne in first_position:
+            position, rule = first_position[colonne], RULE_EXACT
+        elif colonne in best_alias:
+            position, rule = best_alias[colonne][1], RULE_ALIAS
+        else:
+            position, rule = None, RULE_MISSING
+            colonne_normalized = _COLONNES_NORMALIZED[colonne]
+            for candidate, header_normalized in normalized:
+                if colonne_normalized in header_normalized or header_normalized in colonne_normalized:
+                    position, rule = candidate, RULE_FUZZY
+                    break
+
+        resolution.positions[colonne] = position
+        resolution.sources[colonne] = str(headers[position]) if position is not None else None
+        resolution.rules[colonne] = rule
+
+    return resolution
+
+
+_cache: "OrderedDict[str, ColumnResolution]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def resolve_columns(headers: Sequence) -> ColumnResolution:
+    """Résout les colonnes attendues à partir des en-têtes source (résultat mémorisé par mise en page)"""
+    headers = list(headers)
+    signature = layout_signature(headers)
+    with _cache_lock:
+        cached = _cache.get(signature)
+        if cached is not None:
+            _cache.move_to_end(signature)
+            return cached
+
+    resolution = _resolve(headers, signature)
+    with _cache_lock:
+        _cache[signature] = resolution
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return resolution
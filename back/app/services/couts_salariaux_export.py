@@ -0,0 +1,106 @@
+"""
+Export CSV / XLSX des données de coûts salariaux stockées.
+
+Les lignes sont lues par lots (voir couts_salariaux.iter_record_batches) et
+écrites au fil de l'eau : en CSV, chaque lot est envoyé dès qu'il est prêt ;
+en XLSX, openpyxl en mode write-only écrit sur disque et le classeur est
+ensuite renvoyé par blocs depuis un fichier temporaire.
+"""
+import csv
+import io
+import os
+import tempfile
+from itertools import chain
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from openpyxl import Workbook
+from sqlalchemy.orm import Session
+
+from app import models
+from app.services.couts_salariaux import iter_record_batches
+from app.services.couts_salariaux_columns import COLONNES
+
+CSV_MEDIA_TYPE = "text/csv; charset=utf-8"
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+_READ_BLOCK = 1 << 16
+
+
+def export_filename(db_file: models.CoutsSalariauxFile, extension: str) -> str:
+    base = os.path.splitext(db_file.filename or f"couts_salariaux_{db_file.id}")[0]
+    return f"{base}.{extension}"
+
+
+def _batches_with_header(
+    db: Session,
+    db_file: models.CoutsSalariauxFile,
+    columns: Optional[Sequence[str]],
+    filters: Optional[Dict[str, List[str]]]
+):
+    """En-tête (colonnes demandées, sinon celles du premier lot) puis lots de lignes"""
+    batches = iter_record_batches(db, db_file, columns, filters)
+    first = []
+    for first in batches:
+        if first:
+            break
+    header = list(columns) if columns else (list(first[0].keys()) if first else COLONNES)
+    return header, chain([first], batches)
+
+
+def iter_csv(
+    db: Session,
+    db_file: models.CoutsSalariauxFile,
+    columns: Optional[Sequence[str]] = None,
+    filters: Optional[Dict[str, List[str]]] = None
+) -> Iterator[bytes]:
+    """CSV (UTF-8 avec BOM pour Excel), un bloc d'octets par lot de lignes"""
+    header, batches = _batches_with_header(db, db_file, columns, filters)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+
+    def flush() -> bytes:
+        chunk = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+        return chunk
+
+    yield "\ufeff".encode("utf-8") + flush()
+    for batch in batches:
+        writer.writerows([row.get(col) for col in header] for row in batch)
+        yield flush()
+
+
+def write_xlsx(
+    db: Session,
+    db_file: models.CoutsSalariauxFile,
+    target,
+    columns: Optional[Sequence[str]] = None,
+    filters: Optional[Dict[str, List[str]]] = None
+):
+    """Écrit le classeur dans target (chemin ou fichier), ligne à ligne en mode write-only"""
+    header, batches = _batches_with_header(db, db_file, columns, filters)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Coûts salariaux")
+    sheet.append(header)
+    for batch in batches:
+        for row in batch:
+            sheet.append([row.get(col) for col in header])
+    workbook.save(target)
+
+
+def iter_xlsx(
+    db: Session,
+    db_file: models.CoutsSalariauxFile,
+    columns: Optional[Sequence[str]] = None,
+    filters: Optional[Dict[str, List[str]]] = None
+) -> Iterator[bytes]:
+    """Classeur XLSX construit dans un fichier temporaire, renvoyé par blocs puis supprimé"""
+    with tempfile.TemporaryFile(suffix=".xlsx") as spool:
+        write_xlsx(db, db_file, spool, columns, filters)
+        spool.seek(0)
+        while True:
+            block = spool.read(_READ_BLOCK)
+            if not block:
+                break
+            yield block
@@ -0,0 +1,165 @@
+"""
+Coût horaire chargé par Service / Emploi (Coût global / Heures réelles) calculé depuis un fichier de paie stocké.
+
+Les sommes Coût global, Heures réelles et nombre de lignes sont tenues par
+service, emploi et mois, en cache par fichier. Un fichier stocké ligne à ligne
+dont les lignes déjà lues n'ont pas changé (même rows_revision) n'est relu
+qu'au-delà de la dernière ligne lue (seq) : un ajout en fin de fichier ne coûte
+que les lignes ajoutées. Les fichiers stockés en un bloc, réécrits à chaque
+modification, sont relus en entier quand leur version change.
+"""
+import logging
+import threading
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Tuple
+
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from app import crud, models
+from app.services.couts_salariaux import STORAGE_ROWS, iter_record_batches
+from app.services.couts_salariaux_mensuel import file_version, mois_annee
+
+logger = logging.getLogger(__name__)
+
+COL_SERVICE = "Service"
+COL_EMPLOI = "Emploi"
+COL_MOIS = "Mois"
+COL_COUT = "Coût global"
+COL_HEURES = "Heures réelles"
+COLUMNS = [COL_SERVICE, COL_EMPLOI, COL_MOIS, COL_COUT, COL_HEURES]
+
+_KEYS = ["service", "emploi", "mois"]
+_SUMS = ["cout_global", "heures_reelles", "lignes"]
+
+_CACHE_MAX_FILES = 64
+
+
+def _empty() -> pd.DataFrame:
+    return pd.DataFrame(columns=_KEYS + _SUMS)
+
+
+def _partial_sums(batch: List[dict]) -> Optional[pd.DataFrame]:
+    """Sommes d'un lot par service, emploi et mois ('' si le mois n'est pas reconnu)"""
+    if not batch:
+        return None
+    df = pd.DataFrame.from_records(batch, columns=COLUMNS)
+    mois = df[COL_MOIS].astype(object)
+    distinct = mois.dropna().unique()
+    df = pd.DataFrame({
+        "service": df[COL_SERVICE].fillna("").astype(str).str.strip(),
+        "emploi": df[COL_EMPLOI].fillna("").astype(str).str.strip(),
+        "mois": mois.map(dict(zip(distinct, map(mois_annee, distinct)))).fillna(""),
+        "cout_global": pd.to_numeric(df[COL_COUT], errors="coerce").fillna(0.0),
+        "heures_reelles": pd.to_numeric(df[COL_HEURES], errors="coerce").fillna(0.0),
+        "lignes": 1,
+    })
+    return df.groupby(_KEYS, as_index=False)[_SUMS].sum()
+
+
+def add_sums(sums: Optional[pd.DataFrame], batches: Iterable[List[dict]]) -> pd.DataFrame:
+    """Ajoute les lignes des lots aux sommes existantes"""
+    parts = [part for part in map(_partial_sums, batches) if part is not None and not part.empty]
+    if sums is not None and not sums.empty:
+        parts.insert(0, sums)
+    if not parts:
+        return _empty()
+    return pd.concat(parts).groupby(_KEYS, as_index=False)[_SUMS].sum()
+
+
+def hourly_rates(sums: pd.DataFrame, year: Optional[int] = None, by_emploi: bool = True) -> List[dict]:
+    """Coût horaire par service (et emploi) sur les mois de l'année si year (dicts schemas.CoutHoraireSalarie)"""
+    if year:
+        sums = sums[sums["mois"].str.startswith(f"{year:04d}-")]
+    keys = ["service", "emploi"] if by_emploi else ["service"]
+    totals = sums.groupby(keys, as_index=False).agg(
+        cout_global=("cout_global", "sum"),
+        heures_reelles=("heures_reelles", "sum"),
+        lignes=("lignes", "sum"),
+        mois_debut=("mois", "min"),
+        mois_fin=("mois", "max"),
+    )
+    return [
+        {
+            "service": row["service"],
+            "emploi": row["emploi"] if by_emploi else None,
+            "cout_global": round(float(row["cout_global"]), 2),
+            "heures_reelles": round(float(row["heures_reelles"]), 2),
+            "lignes": int(row["lignes"]),
+            "mois_debut": row["mois_debut"] or None,
+            "mois_fin": row["mois_fin"] or None,
+            "taux_horaire": round(float(row["cout_global"]) / float(row["heures_reelles"]), 2) if row["heures_reelles"] > 0 else None,
+        }
+        for row in totals.to_dict("records")
+    ]
+
+
+class _SumsCache:
+    """Sommes par fichier : (clé de version, dernière seq lue, sommes), LRU"""
+
+    def __init__(self, max_files: int):
+        self.max_files = max_files
+        self._entries: "OrderedDict[int, Tuple[Tuple, int, pd.DataFrame]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, file_id: int) -> Optional[Tuple[Tuple, int, pd.DataFrame]]:
+        with self._lock:
+            entry = self._entries.get(file_id)
+            if entry is not None:
+                self._entries.move_to_end(file_id)
+            return entry
+
+    def put(self, file_id: int, key: Tuple, last_seq: int, sums: pd.DataFrame):
+        with self._lock:
+            self._entries[file_id] = (key, last_seq, sums)
+            self._entries.move_to_end(file_id)
+            while len(self._entries) > self.max_files:
+                self._entries.popitem(last=False)
+
+
+_cache = _SumsCache(_CACHE_MAX_FILES)
+
+
+def get_sums(db: Session, db_file: models.CoutsSalariauxFile) -> pd.DataFrame:
+    """Sommes par service, emploi et mois d'un fichier ; seules les lignes ajoutées depuis le dernier calcul sont lues"""
+    entry = _cache.get(db_file.id)
+    if db_file.storage_format != STORAGE_ROWS:
+        key = file_version(db_file)
+        if entry is not None and entry[0] == key:
+            return entry[2]
+        sums = add_sums(None, iter_record_batches(db, db_file, COLUMNS))
+        _cache.put(db_file.id, key, -1, sums)
+        logger.info(f"Coûts horaires - fichier ID {db_file.id}: {len(sums)} groupes calculés")
+        return sums
+
+    # Ajout en fin de fichier : uploaded_at, format et révision des lignes inchangés
+    key = (db_file.id, db_file.storage_format, db_file.uploaded_at, db_file.rows_revision)
+    last_seq = crud.get_couts_salariaux_next_seq(db, db_file.id) - 1
+    if entry is not None and entry[0] == key:
+        if entry[1] >= last_seq:
+            return entry[2]
+        sums = add_sums(entry[2], iter_record_batches(db, db_file, COLUMNS, seqs=(entry[1], last_seq)))
+        logger.info(f"Coûts horaires - fichier ID {db_file.id}: lignes {entry[1] + 1} à {last_seq} ajoutées")
+    else:
+        sums = add_sums(None, iter_record_batches(db, db_file, COLUMNS, seqs=(-1, last_seq)))
+        logger.info(f"Coûts horaires - fichier ID {db_file.id}: {last_seq + 1} lignes lues")
+    _cache.put(db_file.id, key, last_seq, sums)
+    return sums
+
+
+def file_hourly_rates(db: Session, db_file: models.CoutsSalariauxFile, year: Optional[int] = None, by_emploi: bool = True) -> List[dict]:
+    return hourly_rates(get_sums(db, db_file), year, by_emploi)
+
+
+def operator_rate(
+    db: Session,
+    db_file: models.CoutsSalariauxFile,
+    service: str,
+    emploi: Optional[str] = None,
+    year: Optional[int] = None
+) -> Optional[dict]:
+    """Coût horaire d'un service (tous emplois confondus si emploi est None) ; None si le groupe est absent"""
+    for rate in file_hourly_rates(db, db_file, year, by_emploi=emploi is not None):
+        if rate["service"] == service.strip() and (emploi is None or rate["emploi"] == emploi.strip()):
+            return rate
+    return None
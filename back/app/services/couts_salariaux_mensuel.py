@@ -0,0 +1,171 @@
+"""
+Coûts salariaux par mois (format schemas.CoutsSalariaux) calculés depuis un fichier de paie stocké.
+
+Seules les colonnes Mois, P / HP, Brut, Charges patronales et Suppléments coût global
+sont lues, par lots ; chaque lot est agrégé (groupby mois × P/HP) puis les sommes
+partielles sont additionnées. Le résultat est mis en cache par version du fichier.
+"""
+import logging
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from app import models
+from app.services.couts_salariaux import iter_record_batches
+
+logger = logging.getLogger(__name__)
+
+COL_MOIS = "Mois"
+COL_P_HP = "P / HP"
+COL_BRUT = "Brut"
+COL_CHARGES = "Charges patronales"
+COL_SUPPLEMENTS = "Suppléments coût global"
+COLUMNS = [COL_MOIS, COL_P_HP, COL_BRUT, COL_CHARGES, COL_SUPPLEMENTS]
+_AMOUNTS = [COL_BRUT, COL_CHARGES, COL_SUPPLEMENTS]
+
+_MOIS_FR = {
+    "janvier": 1, "fevrier": 2, "février": 2, "mars": 3, "avril": 4, "mai": 5, "juin": 6,
+    "juillet": 7, "aout": 8, "août": 8, "septembre": 9, "octobre": 10, "novembre": 11,
+    "decembre": 12, "décembre": 12
+}
+_ISO = re.compile(r"^(\d{4})-(\d{1,2})")
+_MONTH_YEAR = re.compile(r"^(?:\d{1,2}[/.-])?(\d{1,2})[/.-](\d{4})$")
+_NAME_YEAR = re.compile(r"^([a-zéû]+)\.?\s+(\d{4})$")
+
+_CACHE_MAX_FILES = 64
+
+
+def mois_annee(value) -> Optional[str]:
+    """Valeur de la colonne Mois ('2025-01', '2025-01-31', '01/2025', '31/01/2025', 'janvier 2025') -> 'AAAA-MM'"""
+    if value is None:
+        return None
+    text = str(value).strip().lower()
+    match = _ISO.match(text)
+    if match:
+        year, month = int(match.group(1)), int(match.group(2))
+    else:
+        match = _MONTH_YEAR.match(text)
+        if match:
+            year, month = int(match.group(2)), int(match.group(1))
+        else:
+            match = _NAME_YEAR.match(text)
+            if not match or match.group(1) not in _MOIS_FR:
+                return None
+            year, month = int(match.group(2)), _MOIS_FR[match.group(1)]
+    return f"{year:04d}-{month:02d}" if 1 <= month <= 12 else None
+
+
+def _round(value) -> float:
+    return round(float(value), 2)
+
+
+def is_production(value) -> bool:
+    return str(value).strip().upper().replace(" ", "") == "P"
+
+
+def _partial_sums(batch: List[dict]) -> Optional[pd.DataFrame]:
+    """Sommes Brut / Charges / Suppléments d'un lot, par mois et P (True) / HP (False)"""
+    if not batch:
+        return None
+    df = pd.DataFrame.from_records(batch, columns=COLUMNS)
+    # Transformations faites sur les valeurs distinctes (quelques dizaines par lot)
+    mois = df[COL_MOIS].astype(object)
+    distinct = mois.dropna().unique()
+    df["mois_annee"] = mois.map(dict(zip(distinct, map(mois_annee, distinct))))
+    p_hp = df[COL_P_HP].astype(object)
+    distinct = p_hp.dropna().unique()
+    df["production"] = p_hp.map(dict(zip(distinct, map(is_production, distinct)))).fillna(False).astype(bool)
+    for col in _AMOUNTS:
+        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0.0)
+    return df.dropna(subset=["mois_annee"]).groupby(["mois_annee", "production"])[_AMOUNTS].sum()
+
+
+def monthly_costs(batches: Iterable[List[dict]]) -> List[dict]:
+    """Coûts salariaux par mois (dicts schemas.CoutsSalariaux), triés par mois"""
+    partials = [part for part in map(_partial_sums, batches) if part is not None and not part.empty]
+    if not partials:
+        return []
+    totals = pd.concat(partials).groupby(level=[0, 1]).sum()
+    totals = totals.unstack("production", fill_value=0.0)
+
+    def column(col: str, production: bool) -> pd.Series:
+        return totals[(col, production)] if (col, production) in totals.columns else pd.Series(0.0, index=totals.index)
+
+    brut_p, brut_hp = column(COL_BRUT, True), column(COL_BRUT, False)
+    charges_p, charges_hp = column(COL_CHARGES, True), column(COL_CHARGES, False)
+    supp_p, supp_hp = column(COL_SUPPLEMENTS, True), column(COL_SUPPLEMENTS, False)
+    return [
+        {
+            "mois_annee": mois,
+            "personnel_production": _round(brut_p[mois]),
+            "charges_patronales_p": _round(charges_p[mois]),
+            "personnel_adm": _round(brut_hp[mois]),
+            "charges_patronales_hp": _round(charges_hp[mois]),
+            "total_production": _round(brut_p[mois] + charges_p[mois]),
+            "total_adm": _round(brut_hp[mois] + charges_hp[mois]),
+            "supplements_p": _round(supp_p[mois]),
+            "supplements_hp": _round(supp_hp[mois]),
+        }
+        for mois in sorted(totals.index)
+    ]
+
+
+class _MonthlyCostsCache:
+    """Cache LRU des coûts mensuels, clé (fichier, version du contenu)"""
+
+    def __init__(self, max_files: int):
+        self.max_files = max_files
+        self._entries: "OrderedDict[Tuple, List[dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple) -> Optional[List[dict]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Tuple, costs: List[dict]):
+        with self._lock:
+            self._entries[key] = costs
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_files:
+                self._entries.popitem(last=False)
+
+
+_cache = _MonthlyCostsCache(_CACHE_MAX_FILES)
+
+
+def file_version(db_file: models.CoutsSalariauxFile) -> Tuple:
+    # updated_at change à chaque écriture ; le reste couvre les fichiers jamais modifiés
+    return (db_file.id, db_file.storage_format, db_file.total_records, db_file.uploaded_at, db_file.updated_at)
+
+
+def get_monthly_costs(db: Session, db_file: models.CoutsSalariauxFile) -> List[dict]:
+    """Coûts mensuels d'un fichier de paie, recalculés seulement si le fichier a changé"""
+    key = file_version(db_file)
+    costs = _cache.get(key)
+    if costs is None:
+        costs = monthly_costs(iter_record_batches(db, db_file, COLUMNS))
+        _cache.put(key, costs)
+        logger.info(f"Coûts mensuels calculés pour le fichier ID {db_file.id}: {len(costs)} mois")
+    return costs
+
+
+def apply_to_results(results: List[dict], costs: List[dict]) -> int:
+    """
+    Remplace les coûts salariaux des résultats FEC par ceux de la paie pour les mois couverts
+    (les autres mois gardent la répartition issue du FEC). Retourne le nombre de mois remplacés.
+    """
+    by_month: Dict[str, dict] = {cost["mois_annee"]: cost for cost in costs}
+    replaced = 0
+    for result in results:
+        cost = by_month.get(result["couts_salariaux"]["mois_annee"])
+        if cost:
+            result["couts_salariaux"] = dict(cost)
+            replaced += 1
+    return replaced
@@ -0,0 +1,448 @@
+"""
+Analyse des FEC (Fichier des Écritures Comptables, art. A47 A-1 du LPF).
+
+Le fichier standard compte 18 colonnes séparées par des tabulations ou des
+barres verticales. Le parsing ne garde que les colonnes utiles, les montants
+sont convertis en une passe vectorisée, et la classification porte sur les
+comptes distincts (quelques milliers) plutôt que sur chaque ligne : le
+segment de chaque ligne est obtenu par indexation NumPy des codes de compte.
+Les agrégats par (mois, segment) et par (mois, compte) sont calculés avec
+np.bincount sur des index combinés.
+"""
+import csv
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Colonnes réglementaires, dans l'ordre
+FEC_COLUMNS = [
+    "JournalCode", "JournalLib", "EcritureNum", "EcritureDate", "CompteNum", "CompteLib",
+    "CompAuxNum", "CompAuxLib", "PieceRef", "PieceDate", "EcritureLib", "Debit", "Credit",
+    "EcritureLet", "DateLet", "ValidDate", "Montantdevise", "Idevise"
+]
+
+# Colonnes lues ; certains logiciels remplacent Debit/Credit par Montant + Sens (D/C)
+_USED_COLUMNS = ["JournalCode", "EcritureDate", "CompteNum", "CompteLib", "Debit", "Credit", "Montant", "Sens"]
+_TEXT_COLUMNS = ["JournalCode", "EcritureDate", "CompteNum", "CompteLib", "Sens"]
+_AMOUNT_COLUMNS = ["Debit", "Credit", "Montant"]
+
+# Segments de FECResults
+SEG_PRODUCTION = "production"
+SEG_ACHATS = "achats_consommes"
+SEG_CHARGES_DIRECTES = "charges_directes"
+SEG_CHARGES_INDIRECTES = "charges_indirectes"
+SEG_IMPOTS = "impots_et_taxes"
+SEG_PERSONNEL = "personnel_adm_hors_pro"
+SEG_TRESORERIE = "tresorerie"
+SEG_AUTRE = "autre"
+
+SEGMENTS = [
+    SEG_PRODUCTION, SEG_ACHATS, SEG_CHARGES_DIRECTES, SEG_CHARGES_INDIRECTES,
+    SEG_IMPOTS, SEG_PERSONNEL, SEG_TRESORERIE, SEG_AUTRE
+]
+
+# Sous-totaux (détail d'un segment)
+SUB_MATIERES_PREMIERES = "matieres_premieres"
+SUB_SOUS_TRAITANCE = "sous_traitance"
+SUB_REMUNERATIONS = "remunerations"
+SUB_CHARGES_SOCIALES = "charges_sociales"
+SUB_AUCUN = ""
+
+# Sous-totaux possibles par segment
+SEGMENT_SUBS = {
+    SEG_ACHATS: [SUB_MATIERES_PREMIERES, SUB_SOUS_TRAITANCE],
+    SEG_PERSONNEL: [SUB_REMUNERATIONS, SUB_CHARGES_SOCIALES],
+}
+
+# Règles par défaut, par préfixe de compte (le préfixe le plus long l'emporte) : segment, sous-total
+PREFIX_RULES: Dict[str, Tuple[str, str]] = {
+    "70": (SEG_PRODUCTION, SUB_AUCUN),
+    "71": (SEG_PRODUCTION, SUB_AUCUN),  # production stockée
+    "72": (SEG_PRODUCTION, SUB_AUCUN),  # production immobilisée
+    "60": (SEG_ACHATS, SUB_AUCUN),
+    "601": (SEG_ACHATS, SUB_MATIERES_PREMIERES),
+    "6031": (SEG_ACHATS, SUB_MATIERES_PREMIERES),  # variation des stocks de matières premières
+    "604": (SEG_ACHATS, SUB_SOUS_TRAITANCE),
+    "61": (SEG_CHARGES_DIRECTES, SUB_AUCUN),
+    "62": (SEG_CHARGES_INDIRECTES, SUB_AUCUN),
+    "63": (SEG_IMPOTS, SUB_AUCUN),
+    "64": (SEG_PERSONNEL, SUB_AUCUN),
+    "641": (SEG_PERSONNEL, SUB_REMUNERATIONS),
+    "642": (SEG_PERSONNEL, SUB_REMUNERATIONS),
+    "643": (SEG_PERSONNEL, SUB_REMUNERATIONS),
+    "644": (SEG_PERSONNEL, SUB_REMUNERATIONS),
+    "645": (SEG_PERSONNEL, SUB_CHARGES_SOCIALES),
+    "646": (SEG_PERSONNEL, SUB_CHARGES_SOCIALES),
+    "647": (SEG_PERSONNEL, SUB_CHARGES_SOCIALES),
+    "648": (SEG_PERSONNEL, SUB_CHARGES_SOCIALES),
+    "51": (SEG_TRESORERIE, SUB_AUCUN),
+    "53": (SEG_TRESORERIE, SUB_AUCUN),
+}
+
+# Segments dont le montant est un produit (crédit - débit) ; les autres : débit - crédit
+CREDIT_SEGMENTS = {SEG_PRODUCTION}
+
+# Segments détaillés compte par compte (listes de FECCharge)
+CHARGE_SEGMENTS = [SEG_CHARGES_DIRECTES, SEG_CHARGES_INDIRECTES, SEG_IMPOTS, SEG_PERSONNEL]
+
+TITRES = {
+    SEG_PRODUCTION: "Production",
+    SEG_ACHATS: "Achats consommés",
+    SEG_TRESORERIE: "Trésorerie",
+}
+
+_AMOUNT = str.maketrans({" ": None, "\u00a0": None, ",": "."})
+
+
+def _header_line(content: bytes) -> Tuple[str, str]:
+    """Première ligne décodée et encodage du fichier (UTF-8, sinon Windows-1252)"""
+    end = content.find(b"\n")
+    raw = content[:end if end >= 0 else len(content)].rstrip(b"\r")
+    try:
+        return raw.decode("utf-8-sig"), "utf-8-sig"
+    except UnicodeDecodeError:
+        return raw.decode("cp1252"), "cp1252"
+
+
+def detect_delimiter(header_line: str) -> str:
+    """Séparateur du FEC : tabulation ou barre verticale (autorisés par la norme)"""
+    return "|" if header_line.count("|") > header_line.count("\t") else "\t"
+
+
+def _amounts(series: pd.Series) -> np.ndarray:
+    """Montants en float64 (0 pour les cellules vides), quel que soit le format d'origine"""
+    if series.dtype != object:
+        return series.fillna(0).to_numpy(dtype="float64")
+    cleaned = series.fillna("").str.translate(_AMOUNT)
+    return pd.to_numeric(cleaned.where(cleaned != "", "0"), errors="coerce").fillna(0).to_numpy(dtype="float64")
+
+
+def parse_header(content: bytes) -> Tuple[List[str], str, str, int]:
+    """Colonnes, séparateur, encodage et position du début des données (après la ligne d'en-tête)"""
+    header_line, encoding = _header_line(content)
+    delimiter = detect_delimiter(header_line)
+    header = [h.strip() for h in header_line.split(delimiter)]
+    missing = {"EcritureDate", "CompteNum"} - set(header)
+    if missing:
+        raise ValueError(f"Colonnes FEC manquantes: {', '.join(sorted(missing))}")
+    end = content.find(b"\n")
+    return header, delimiter, encoding, end + 1 if end >= 0 else len(content)
+
+
+def read_lines(data: bytes, header: List[str], delimiter: str, encoding: str) -> pd.DataFrame:
+    """Lit des lignes de données (sans en-tête) d'un FEC ; même sortie que read_fec"""
+
+    def read(encoding: str) -> pd.DataFrame:
+        # Montants lus directement en float (virgule décimale) ; sinon repli sur _amounts
+        return pd.read_csv(
+            BytesIO(data),
+            sep=delimiter,
+            header=None,
+            names=header,
+            usecols=lambda col: col in _USED_COLUMNS,
+            dtype={col: str for col in _TEXT_COLUMNS},
+            decimal=",",
+            keep_default_na=False,
+            na_values={col: [""] for col in _AMOUNT_COLUMNS},
+            quoting=csv.QUOTE_NONE,
+            encoding=encoding,
+            engine="c",
+        )
+
+    try:
+        df = read(encoding)
+    except UnicodeDecodeError:
+        # En-tête ASCII mais libellés en Windows-1252
+        df = read("cp1252")
+    return prepare_entries(df)
+
+
+def read_fec(content: bytes) -> pd.DataFrame:
+    """
+    Lit un FEC et retourne les colonnes JournalCode, CompteNum, CompteLib, date, mois (AAAA-MM),
+    debit, credit et solde (débit - crédit), montants en float64.
+    """
+    header, delimiter, encoding, start = parse_header(content)
+    return read_lines(memoryview(content)[start:], header, delimiter, encoding)
+
+
+def _map_distinct(series: pd.Series, transform) -> np.ndarray:
+    """Applique transform aux valeurs distinctes seulement (dates, comptes, journaux), puis propage"""
+    codes, uniques = pd.factorize(series)
+    mapped = np.append(np.asarray(transform(pd.Series(uniques, dtype=object)), dtype=object), None)
+    return mapped[codes]
+
+
+def _parse_dates(dates: pd.Series) -> pd.Series:
+    """Dates d'écriture (AAAAMMJJ normalisé, ou JJ/MM/AAAA) ; illisibles -> NaT (lignes ignorées)"""
+    dates = dates.str.strip()
+    date_format = "%d/%m/%Y" if dates.str.contains("/", regex=False).any() else "%Y%m%d"
+    return pd.to_datetime(dates, format=date_format, errors="coerce")
+
+
+def _strip(values: pd.Series) -> pd.Series:
+    return values.str.strip()
+
+
+def prepare_entries(df: pd.DataFrame) -> pd.DataFrame:
+    """Colonnes brutes -> date, mois (AAAA-MM), débit, crédit et solde calculés"""
+    if "Debit" in df.columns and "Credit" in df.columns:
+        debit, credit = _amounts(df["Debit"]), _amounts(df["Credit"])
+    elif "Montant" in df.columns and "Sens" in df.columns:
+        montant = _amounts(df["Montant"])
+        is_credit = _map_distinct(df["Sens"], lambda sens: sens.str.strip().str.upper().str.startswith("C")).astype(bool)
+        debit, credit = np.where(is_credit, 0.0, montant), np.where(is_credit, montant, 0.0)
+    else:
+        raise ValueError("Colonnes de montants manquantes (Debit/Credit ou Montant/Sens)")
+
+    # Dates converties une fois par valeur distincte
+    date_codes, date_uniques = pd.factorize(df["EcritureDate"])
+    parsed = _parse_dates(pd.Series(date_uniques, dtype=object))
+    dates = np.append(parsed.to_numpy(), np.datetime64("NaT"))[date_codes]
+    mois = np.append(parsed.dt.strftime("%Y-%m").where(parsed.notna(), None).to_numpy(dtype=object), None)[date_codes]
+
+    return pd.DataFrame({
+        "JournalCode": _map_distinct(df["JournalCode"], _strip) if "JournalCode" in df.columns else "",
+        "CompteNum": _map_distinct(df["CompteNum"], _strip),
+        "CompteLib": _map_distinct(df["CompteLib"], _strip) if "CompteLib" in df.columns else "",
+        "date": dates,
+        "mois": mois,
+        "debit": debit,
+        "credit": credit,
+        "solde": debit - credit,
+    })
+
+
+class PrefixClassifier:
+    """
+    Classification des numéros de compte par préfixe, compilée une fois : une table par
+    longueur de préfixe, parcourue de la plus longue à la plus courte. Chaque passe
+    classe d'un coup (Series.map) tous les comptes encore sans règle.
+    """
+
+    def __init__(self, rules: Dict[str, Tuple[str, str]]):
+        self.rules = dict(rules)
+        self.labels: List[Tuple[str, str]] = sorted(set(self.rules.values()) | {(SEG_AUTRE, SUB_AUCUN)})
+        label_index = {label: i for i, label in enumerate(self.labels)}
+        self.default = label_index[(SEG_AUTRE, SUB_AUCUN)]
+        tables: Dict[int, Dict[str, int]] = {}
+        for prefix, rule in self.rules.items():
+            tables.setdefault(len(prefix), {})[prefix] = label_index[rule]
+        self._tables = sorted(tables.items(), reverse=True)
+        # Segment (index dans SEGMENTS) et sous-total de chaque règle
+        self.label_segments = np.array([SEGMENTS.index(segment) for segment, _ in self.labels], dtype=np.int64)
+        self.label_subs = np.array([sub for _, sub in self.labels], dtype=object)
+
+    def classify(self, accounts) -> np.ndarray:
+        """Index de règle (dans labels) de chaque compte ; les comptes distincts ne sont traités qu'une fois"""
+        codes, uniques = pd.factorize(pd.Series(accounts, dtype=object))
+        values = pd.Series(uniques, dtype=object).astype(str)
+        result = np.full(len(values), self.default, dtype=np.int64)
+        pending = np.ones(len(values), dtype=bool)
+        for length, table in self._tables:
+            if not pending.any():
+                break
+            positions = np.flatnonzero(pending)
+            matched = values.iloc[positions].str.slice(0, length).map(table)
+            hit = matched.notna().to_numpy()
+            result[positions[hit]] = matched.to_numpy()[hit].astype(np.int64)
+            pending[positions[hit]] = False
+        return np.append(result, self.default)[codes]
+
+    def segments(self, accounts) -> Tuple[np.ndarray, np.ndarray]:
+        """(index de segment dans SEGMENTS, sous-total) de chaque compte"""
+        labels = self.classify(accounts)
+        return self.label_segments[labels], self.label_subs[labels]
+
+
+DEFAULT_CLASSIFIER = PrefixClassifier(PREFIX_RULES)
+
+
+def classify_account(compte: str, classifier: Optional[PrefixClassifier] = None) -> Tuple[str, str]:
+    """Segment et sous-total d'un numéro de compte (préfixe le plus long)"""
+    classifier = classifier or DEFAULT_CLASSIFIER
+    return classifier.labels[classifier.classify([compte])[0]]
+
+
+def _round(value: float) -> float:
+    return round(float(value), 2)
+
+
+def account_totals(entries: pd.DataFrame) -> pd.DataFrame:
+    """
+    Soldes par (mois, compte), avec le libellé du compte (première occurrence) : agrégat
+    partiel d'un ensemble de lignes, fusionnable avec merge_totals.
+    """
+    entries = entries[entries["mois"].notna()]
+    month_codes, months = pd.factorize(entries["mois"])
+    account_codes, accounts = pd.factorize(entries["CompteNum"])
+    n_months = len(months)
+    # Index compte puis mois : les comptes restent dans l'ordre de première apparition
+    combined = account_codes * n_months + month_codes
+    size = n_months * len(accounts)
+    counts = np.bincount(combined, minlength=size)
+    soldes = np.bincount(combined, weights=entries["solde"].to_numpy(dtype="float64"), minlength=size)
+    present = np.flatnonzero(counts)
+
+    first_line = pd.Series(account_codes).drop_duplicates().index.to_numpy()
+    labels = entries["CompteLib"].to_numpy(dtype=object)[first_line]
+    account = present // n_months
+    return pd.DataFrame({
+        "mois": np.asarray(months, dtype=object)[present % n_months],
+        "CompteNum": np.asarray(accounts, dtype=object)[account],
+        "CompteLib": labels[account],
+        "solde": soldes[present],
+    })
+
+
+def merge_totals(parts: List[pd.DataFrame]) -> pd.DataFrame:
+    """Fusion d'agrégats partiels (dans l'ordre du fichier : le premier libellé rencontré est gardé)"""
+    if len(parts) == 1:
+        return parts[0]
+    totals = pd.concat(parts, ignore_index=True)
+    labels = totals.drop_duplicates("CompteNum").set_index("CompteNum")["CompteLib"]
+    merged = totals.groupby(["mois", "CompteNum"], sort=False)["solde"].sum().reset_index()
+    merged["CompteLib"] = merged["CompteNum"].map(labels)
+    return merged
+
+
+def analyze_entries(entries: pd.DataFrame, classifier: Optional[PrefixClassifier] = None) -> List[dict]:
+    """Résultats (format FECResults) par mois, dans l'ordre chronologique"""
+    return analyze_totals(account_totals(entries), classifier)
+
+
+def analyze_totals(totals: pd.DataFrame, classifier: Optional[PrefixClassifier] = None) -> List[dict]:
+    """Résultats (format FECResults) par mois à partir des soldes par (mois, compte)"""
+    classifier = classifier or DEFAULT_CLASSIFIER
+    month_codes, months = pd.factorize(totals["mois"], sort=True)
+    account_codes, accounts = pd.factorize(totals["CompteNum"])
+    solde = totals["solde"].to_numpy(dtype="float64")
+    n_months, n_accounts = len(months), len(accounts)
+
+    # Classification des comptes distincts, puis propagation aux lignes par indexation
+    account_segment, account_sub = classifier.segments(np.asarray(accounts, dtype=object))
+    segment_index = {segment: i for i, segment in enumerate(SEGMENTS)}
+    account_sign = np.where(np.isin(account_segment, [segment_index[s] for s in CREDIT_SEGMENTS]), -1.0, 1.0)
+
+    # Libellé de chaque compte : première occurrence
+    first_line = pd.Series(account_codes).drop_duplicates().index.to_numpy()
+    labels = totals["CompteLib"].to_numpy(dtype=object)[first_line]
+
+    # Matrice (mois, compte) ; tout le reste en découle
+    by_account = np.bincount(
+        month_codes * n_accounts + account_codes, weights=solde, minlength=n_months * n_accounts
+    ).reshape(n_months, n_accounts) * account_sign
+
+    def segment_total(segment: str, sub: Optional[str] = None) -> np.ndarray:
+        mask = account_segment == segment_index[segment]
+        if sub is not None:
+            mask &= account_sub == sub
+        return by_account[:, mask].sum(axis=1)
+
+    production = segment_total(SEG_PRODUCTION)
+    achats = segment_total(SEG_ACHATS)
+    matieres = segment_total(SEG_ACHATS, SUB_MATIERES_PREMIERES)
+    sous_traitance = segment_total(SEG_ACHATS, SUB_SOUS_TRAITANCE)
+    remunerations = segment_total(SEG_PERSONNEL, SUB_REMUNERATIONS)
+    charges_sociales = segment_total(SEG_PERSONNEL, SUB_CHARGES_SOCIALES)
+    # Trésorerie : solde cumulé en fin de mois (à-nouveaux compris)
+    tresorerie = np.cumsum(segment_total(SEG_TRESORERIE))
+
+    charge_accounts = {
+        segment: np.flatnonzero(account_segment == segment_index[segment]) for segment in CHARGE_SEGMENTS
+    }
+
+    results = []
+    for m, mois_annee in enumerate(months):
+        charges = {}
+        for segment, columns in charge_accounts.items():
+            amounts = by_account[m, columns]
+            charges[segment] = [
+                {
+                    "CompteLib": labels[a] or "",
+                    "CompteNum": accounts[a],
+                    "montant": _round(amount),
+                    "mois_annee": mois_annee,
+                }
+                for a, amount in zip(columns, amounts) if abs(amount) >= 0.005
+            ]
+        results.append({
+            "production": {
+                "titre": TITRES[SEG_PRODUCTION], "mois_annee": mois_annee, "total": _round(production[m])
+            },
+            "achats_consommes": {
+                "titre": TITRES[SEG_ACHATS],
+                "mois_annee": mois_annee,
+                "total": _round(achats[m]),
+                "matieres_premieres": _round(matieres[m]),
+                "sous_traitance": _round(sous_traitance[m]),
+            },
+            "charges_directes": charges[SEG_CHARGES_DIRECTES],
+            "charges_indirectes": charges[SEG_CHARGES_INDIRECTES],
+            "impots_et_taxes": charges[SEG_IMPOTS],
+            "personnel_adm_hors_pro": charges[SEG_PERSONNEL],
+            # Sans fichier de paie, la répartition P / HP est inconnue : tout est compté hors production
+            "couts_salariaux": {
+                "mois_annee": mois_annee,
+                "personnel_production": 0.0,
+                "charges_patronales_p": 0.0,
+                "personnel_adm": _round(remunerations[m]),
+                "charges_patronales_hp": _round(charges_sociales[m]),
+                "total_production": 0.0,
+                "total_adm": _round(remunerations[m] + charges_sociales[m]),
+            },
+            "tresorerie": {
+                "titre": TITRES[SEG_TRESORERIE], "mois_annee": mois_annee, "total": _round(tresorerie[m])
+            },
+        })
+    return results
+
+
+RESULT_SEGMENTS = [
+    "production", "achats_consommes", "charges_directes", "charges_indirectes",
+    "impots_et_taxes", "personnel_adm_hors_pro", "couts_salariaux", "tresorerie"
+]
+
+
+def segments_by_type(results: List[dict]) -> Dict[str, list]:
+    """Résultats regroupés par type de segment (une liste par mois), pour les FECSegment"""
+    return {segment: [result[segment] for result in results] for segment in RESULT_SEGMENTS}
+
+
+LEDGER_BATCH_ROWS = 10000
+
+
+def ledger_batches(entries: pd.DataFrame, batch_rows: int = LEDGER_BATCH_ROWS):
+    """Lignes du grand livre (dicts prêts pour FECLedgerLine) par lots de batch_rows"""
+    for start in range(0, len(entries), batch_rows):
+        part = entries.iloc[start:start + batch_rows]
+        dates = part["date"]
+        columns = [
+            part["JournalCode"].tolist(),
+            part["CompteNum"].tolist(),
+            part["CompteLib"].tolist(),
+            dates.dt.date.astype(object).where(dates.notna(), None).tolist(),
+            part["mois"].tolist(),
+            part["debit"].tolist(),
+            part["credit"].tolist(),
+        ]
+        yield [
+            {
+                "journal_code": journal,
+                "compte_num": compte,
+                "compte_lib": libelle,
+                "ecriture_date": ecriture_date,
+                "mois": mois,
+                "debit": debit,
+                "credit": credit,
+            }
+            for journal, compte, libelle, ecriture_date, mois, debit, credit in zip(*columns)
+        ]
+
+
+def analyze_fec(content: bytes, classifier: Optional[PrefixClassifier] = None) -> Tuple[List[dict], int]:
+    """Point d'entrée : contenu du fichier -> (résultats par mois, nombre de lignes) ; utilisable dans un process séparé"""
+    entries = read_fec(content)
+    return analyze_entries(entries, classifier), len(entries)
@@ -0,0 +1,116 @@
+"""
+Agrégats FEC matérialisés (analyse, mois, segment, sous-total) et comparaisons.
+
+Les agrégats sont dérivés des résultats par mois au moment de l'analyse et
+stockés dans fec_monthly_aggregates. Les comparaisons (mois précédent, même
+mois N-1, cumul depuis le début d'exercice) ne lisent que ces agrégats :
+quelques dizaines de lignes par mois, quelle que soit la taille du grand livre.
+"""
+from typing import Iterable, List, Optional
+
+import pandas as pd
+
+from app.services.fec import (
+    SEG_ACHATS, SEG_CHARGES_DIRECTES, SEG_CHARGES_INDIRECTES, SEG_IMPOTS, SEG_PERSONNEL,
+    SEG_PRODUCTION, SEG_TRESORERIE, SUB_AUCUN, SUB_CHARGES_SOCIALES, SUB_MATIERES_PREMIERES,
+    SUB_REMUNERATIONS, SUB_SOUS_TRAITANCE
+)
+
+MODE_MOM = "mom"  # mois précédent
+MODE_YOY = "yoy"  # même mois de l'année précédente
+MODE_YTD = "ytd"  # cumul depuis le début d'exercice, comparé au cumul N-1
+MODES = (MODE_MOM, MODE_YOY, MODE_YTD)
+
+# Segments de stock (solde en fin de mois) : pas de cumul
+STOCK_SEGMENTS = {SEG_TRESORERIE}
+
+_LIST_SEGMENTS = [SEG_CHARGES_DIRECTES, SEG_CHARGES_INDIRECTES, SEG_IMPOTS, SEG_PERSONNEL]
+
+
+def aggregate_rows(results: List[dict]) -> List[dict]:
+    """Lignes (mois, segment, sous_total, montant) à partir des résultats par mois"""
+    rows = []
+    for result in results:
+        mois = result["production"]["mois_annee"]
+
+        def add(segment: str, montant: Optional[float], sous_total: str = SUB_AUCUN):
+            rows.append({
+                "mois": mois,
+                "segment": segment,
+                "sous_total": sous_total,
+                "montant": round(float(montant or 0), 2),
+            })
+
+        add(SEG_PRODUCTION, result["production"]["total"])
+        achats = result["achats_consommes"]
+        add(SEG_ACHATS, achats["total"])
+        add(SEG_ACHATS, achats.get("matieres_premieres"), SUB_MATIERES_PREMIERES)
+        add(SEG_ACHATS, achats.get("sous_traitance"), SUB_SOUS_TRAITANCE)
+        for segment in _LIST_SEGMENTS:
+            add(segment, sum(charge["montant"] for charge in result[segment]))
+        couts = result["couts_salariaux"]
+        add(SEG_PERSONNEL, couts["personnel_production"] + couts["personnel_adm"], SUB_REMUNERATIONS)
+        add(SEG_PERSONNEL, couts["charges_patronales_p"] + couts["charges_patronales_hp"], SUB_CHARGES_SOCIALES)
+        if result.get("tresorerie"):
+            add(SEG_TRESORERIE, result["tresorerie"]["total"])
+    return rows
+
+
+def _shift_month(mois: pd.Series, months: int) -> pd.Series:
+    periods = pd.PeriodIndex(mois, freq="M") + months
+    return pd.Series(periods.strftime("%Y-%m"), index=mois.index)
+
+
+def latest_per_month(rows: pd.DataFrame) -> pd.DataFrame:
+    """Un mois présent dans plusieurs analyses : seule la plus récente est retenue"""
+    latest = rows.groupby("mois")["analysis_id"].transform("max")
+    return rows[rows["analysis_id"] == latest]
+
+
+def compare(
+    rows: Iterable[dict],
+    mode: str = MODE_MOM,
+    debut_exercice: int = 1,
+    segment: Optional[str] = None,
+    mois_debut: Optional[str] = None,
+    mois_fin: Optional[str] = None
+) -> List[dict]:
+    """
+    Comparaison des agrégats (dicts analysis_id/mois/segment/sous_total/montant) selon le mode.
+    Les mois de référence hors de la sélection restent utilisés pour le calcul.
+    """
+    df = pd.DataFrame(list(rows), columns=["analysis_id", "mois", "segment", "sous_total", "montant"])
+    if df.empty:
+        return []
+    df = latest_per_month(df)
+    if segment:
+        df = df[df["segment"] == segment]
+    df = df.sort_values(["segment", "sous_total", "mois"]).reset_index(drop=True)
+    keys = ["segment", "sous_total"]
+
+    if mode == MODE_YTD:
+        # Exercice : année du mois de début (ex. exercice juillet-juin)
+        periods = pd.PeriodIndex(df["mois"], freq="M")
+        df["exercice"] = periods.year - (periods.month < debut_exercice)
+        cumul = df.groupby(keys + ["exercice"])["montant"].cumsum()
+        stock = df["segment"].isin(STOCK_SEGMENTS)
+        df["montant"] = cumul.where(~stock, df["montant"])
+        df = df.drop(columns="exercice")
+
+    df["reference_mois"] = _shift_month(df["mois"], -1 if mode == MODE_MOM else -12)
+    reference = df[keys + ["mois", "montant"]].rename(columns={"mois": "reference_mois", "montant": "reference_montant"})
+    df = df.merge(reference, on=keys + ["reference_mois"], how="left")
+
+    df["ecart"] = (df["montant"] - df["reference_montant"]).round(2)
+    df["ecart_pct"] = (df["ecart"] / df["reference_montant"].abs() * 100).round(2)
+    df.loc[df["reference_montant"].abs() < 0.005, "ecart_pct"] = None
+
+    if mois_debut:
+        df = df[df["mois"] >= mois_debut]
+    if mois_fin:
+        df = df[df["mois"] <= mois_fin]
+    df[["montant", "reference_montant"]] = df[["montant", "reference_montant"]].round(2)
+    df = df.rename(columns={"mois": "mois_annee"}).drop(columns="analysis_id")
+    df = df.astype(object).where(df.notna(), None)
+    return df.to_dict(orient="records")
+
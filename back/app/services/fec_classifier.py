@@ -0,0 +1,56 @@
+"""
+Classifieurs FEC par société : règles par défaut (app.services.fec.PREFIX_RULES)
+complétées par les règles enregistrées en base (communes, puis propres à la société).
+
+Les classifieurs compilés sont gardés en mémoire et reconstruits seulement quand
+les règles en base changent (nombre de règles ou date de dernière modification).
+"""
+import threading
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app import crud
+from app.services.fec import PREFIX_RULES, PrefixClassifier, SEGMENTS, SEGMENT_SUBS, SUB_AUCUN
+
+_cache: Dict[Optional[str], Tuple[tuple, PrefixClassifier]] = {}
+_cache_lock = threading.Lock()
+
+
+def validate_rule(prefix: str, segment: str, sous_total: str) -> Optional[str]:
+    """Message d'erreur si la règle est invalide, sinon None"""
+    if not prefix or not prefix.isalnum():
+        return "Le préfixe doit être un numéro de compte (chiffres ou lettres)"
+    if segment not in SEGMENTS:
+        return f"Segment inconnu. Valeurs possibles: {', '.join(SEGMENTS)}"
+    if sous_total != SUB_AUCUN and sous_total not in SEGMENT_SUBS.get(segment, []):
+        allowed = ", ".join(SEGMENT_SUBS.get(segment, [])) or "aucun"
+        return f"Sous-total invalide pour {segment}. Valeurs possibles: {allowed}"
+    return None
+
+
+def effective_rules(db: Session, societe: Optional[str] = None) -> Dict[str, Tuple[str, str]]:
+    """Règles appliquées : défaut, puis règles communes, puis règles de la société (la dernière l'emporte)"""
+    rules = dict(PREFIX_RULES)
+    for rule in crud.get_fec_classification_rules(db, societe):
+        rules[rule.prefix] = (rule.segment, rule.sous_total or SUB_AUCUN)
+    return rules
+
+
+def get_classifier(db: Session, societe: Optional[str] = None) -> PrefixClassifier:
+    """Classifieur compilé de la société, reconstruit seulement si les règles en base ont changé"""
+    version = tuple(crud.get_fec_classification_rules_version(db))
+    with _cache_lock:
+        cached = _cache.get(societe)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+    classifier = PrefixClassifier(effective_rules(db, societe))
+    with _cache_lock:
+        _cache[societe] = (version, classifier)
+    return classifier
+
+
+def invalidate():
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,144 @@
+"""
+Analyse des gros FEC à mémoire bornée.
+
+Le fichier uploadé est copié sur disque par blocs, puis projeté en mémoire
+(mmap) et découpé en plages d'octets alignées sur les fins de ligne. Chaque
+plage est lue par un worker du process pool partagé (app.services.process_pool),
+qui renvoie les soldes par (mois, compte) de ses lignes (fec.account_totals) ;
+ces agrégats partiels sont fusionnés à la fin. Si les lignes sont demandées
+(grand livre), chaque worker les écrit dans un fichier à côté du FEC, relu
+ensuite par lots : seuls les agrégats repassent par le process API. Le nombre
+de plages en cours est limité : la mémoire des workers dépend de la taille des
+plages, celle du process API de la taille des lots, pas de la taille du fichier.
+"""
+import logging
+import mmap
+import os
+import pickle
+import shutil
+import tempfile
+from typing import BinaryIO, Callable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from app.services import fec
+from app.services.process_pool import get_shared_pool
+
+logger = logging.getLogger(__name__)
+
+SPOOL_BLOCK = 1 << 20
+_HEADER_BYTES = 1 << 16
+
+# Colonnes du grand livre écrites par les workers (voir fec.ledger_batches)
+LEDGER_COLUMNS = ["JournalCode", "CompteNum", "CompteLib", "date", "mois", "debit", "credit"]
+
+
+def spool_to_disk(stream: BinaryIO, directory: Optional[str] = None) -> Tuple[str, int]:
+    """Copie le flux dans un fichier temporaire (à supprimer par l'appelant) ; retourne (chemin, taille)"""
+    with tempfile.NamedTemporaryFile(prefix="fec_", suffix=".txt", dir=directory, delete=False) as spool:
+        shutil.copyfileobj(stream, spool, SPOOL_BLOCK)
+        return spool.name, spool.tell()
+
+
+def split_ranges(mm: mmap.mmap, start: int, chunk_bytes: int) -> List[Tuple[int, int]]:
+    """Plages [début, fin) d'environ chunk_bytes, coupées après un saut de ligne"""
+    ranges = []
+    size = len(mm)
+    while start < size:
+        end = mm.find(b"\n", min(start + chunk_bytes, size) - 1)
+        end = size if end < 0 else end + 1
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def _spool_entries(entries: pd.DataFrame, ledger_path: str):
+    """Lignes du grand livre écrites par lots de fec.LEDGER_BATCH_ROWS (un pickle par lot)"""
+    entries = entries[LEDGER_COLUMNS]
+    with open(ledger_path, "wb") as spool:
+        for first in range(0, len(entries), fec.LEDGER_BATCH_ROWS):
+            pickle.dump(entries.iloc[first:first + fec.LEDGER_BATCH_ROWS], spool, pickle.HIGHEST_PROTOCOL)
+
+
+def read_spooled_entries(ledger_path: str) -> Iterator[pd.DataFrame]:
+    """Lots de lignes écrits par _spool_entries, un seul en mémoire à la fois"""
+    with open(ledger_path, "rb") as spool:
+        while True:
+            try:
+                yield pickle.load(spool)
+            except EOFError:
+                return
+
+
+def parse_range(
+    path: str,
+    start: int,
+    end: int,
+    header: List[str],
+    delimiter: str,
+    encoding: str,
+    ledger_path: Optional[str] = None
+) -> Tuple[pd.DataFrame, int]:
+    """
+    Worker : lignes [start, end) du fichier -> (soldes par mois et compte, nombre de lignes).
+    Avec ledger_path, les lignes sont aussi écrites dans ce fichier (lu ensuite par read_spooled_entries).
+    """
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        entries = fec.read_lines(mm[start:end], header, delimiter, encoding)
+    if ledger_path is not None:
+        _spool_entries(entries, ledger_path)
+    return fec.account_totals(entries), len(entries)
+
+
+def analyze_fec_file(
+    path: str,
+    classifier: Optional[fec.PrefixClassifier] = None,
+    on_entries: Optional[Callable[[pd.DataFrame], None]] = None,
+    chunk_bytes: int = 64 << 20,
+    max_workers: Optional[int] = None
+) -> Tuple[List[dict], int]:
+    """
+    Analyse d'un FEC sur disque -> (résultats par mois, nombre de lignes).
+    on_entries reçoit les lignes par lots de fec.LEDGER_BATCH_ROWS, dans l'ordre du fichier
+    (ex. insertion du grand livre) ; les workers les écrivent sur disque à côté de path.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError("Fichier vide")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            header, delimiter, encoding, data_start = fec.parse_header(mm[:_HEADER_BYTES])
+            ranges = split_ranges(mm, data_start, chunk_bytes)
+
+    ledger_paths = [f"{path}.{index}.ledger" if on_entries is not None else None for index in range(len(ranges))]
+    args = [(path, start, end, header, delimiter, encoding, ledger_path) for (start, end), ledger_path in zip(ranges, ledger_paths)]
+    pool = get_shared_pool()
+    workers = min(len(ranges), max_workers or pool.max_workers)
+    logger.info(f"FEC - {len(ranges)} plage(s) de {chunk_bytes >> 20} Mo, {workers} worker(s)")
+
+    merged, n_lines = None, 0
+
+    def collect(outcome, ledger_path: Optional[str]):
+        nonlocal merged, n_lines
+        totals, lines = outcome
+        # Fusion au fil de l'eau : un seul agrégat (mois × comptes) gardé, quel que soit le nombre de plages
+        merged = totals if merged is None else fec.merge_totals([merged, totals])
+        n_lines += lines
+        if ledger_path is not None:
+            for batch in read_spooled_entries(ledger_path):
+                on_entries(batch)
+            os.remove(ledger_path)
+
+    try:
+        if workers > 1:
+            # Au plus 2 plages par worker en cours ; les lignes attendent sur disque, pas en mémoire
+            for future, ledger_path in zip(pool.ordered(parse_range, args, 2 * workers), ledger_paths):
+                collect(future.result(), ledger_path)
+        else:
+            for item in args:
+                collect(parse_range(*item), item[-1])
+    finally:
+        for ledger_path in ledger_paths:
+            if ledger_path is not None and os.path.exists(ledger_path):
+                os.remove(ledger_path)
+
+    return fec.analyze_totals(merged, classifier) if merged is not None else [], n_lines
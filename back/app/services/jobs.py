@@ -0,0 +1,208 @@
+"""
+File de traitements en arrière-plan (process pool local, sans broker externe).
+
+Le parsing tourne dans un ProcessPoolExecutor à nombre de workers borné ;
+l'écriture du résultat en base se fait ensuite dans un thread dédié du
+process API. L'état des jobs est conservé en mémoire.
+"""
+import logging
+import threading
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_STORING = "storing"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+# Avancement (en %) associé à chaque étape
+_PROGRESS = {JOB_QUEUED: 0, JOB_RUNNING: 10, JOB_STORING: 80, JOB_DONE: 100, JOB_FAILED: 100}
+
+_FINISHED_TTL = timedelta(hours=1)
+
+
+class QueueFullError(Exception):
+    """Trop de jobs en attente"""
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    filename: Optional[str] = None
+    file_id: Optional[int] = None
+    status: str = JOB_QUEUED
+    progress: int = 0
+    result: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+    future: Optional[Future] = field(default=None, repr=False)
+
+    def as_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress,
+            "filename": self.filename,
+            "file_id": self.file_id,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobQueue:
+    """
+    Exécute `work(*args)` dans un process pool puis `store(job, résultat)` dans le process API ;
+    `on_failure(job)` est appelé si l'une des deux étapes échoue
+    """
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._store_pool: Optional[ThreadPoolExecutor] = None
+
+    def _pools(self):
+        # Création paresseuse : pas de process lancés à l'import de l'application (appelé sous self._lock)
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        if self._store_pool is None:
+            self._store_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-store")
+        return self._pool, self._store_pool
+
+    def _discard_pool(self, pool: ProcessPoolExecutor):
+        """Pool cassé (worker tué, ex. par manque de mémoire) : un nouveau sera créé au prochain job"""
+        with self._lock:
+            if self._pool is not pool:
+                return
+            self._pool = None
+        logger.warning("Process pool des jobs cassé, recréé au prochain job")
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _set_status(self, job: Job, status: str, error: Optional[str] = None):
+        with self._lock:
+            job.status = status
+            job.progress = _PROGRESS[status]
+            if error is not None:
+                job.error = error
+            if status in (JOB_DONE, JOB_FAILED):
+                job.finished_at = datetime.utcnow()
+                job.future = None
+
+    def _prune(self):
+        limit = datetime.utcnow() - _FINISHED_TTL
+        for job_id in [j.id for j in self._jobs.values() if j.finished_at and j.finished_at < limit]:
+            del self._jobs[job_id]
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return sum(1 for j in self._jobs.values() if j.finished_at is None)
+
+    def submit(
+        self,
+        kind: str,
+        work: Callable,
+        args: tuple,
+        store: Callable[[Job, Any], Optional[dict]],
+        filename: Optional[str] = None,
+        file_id: Optional[int] = None,
+        on_failure: Optional[Callable[[Job], None]] = None,
+    ) -> Job:
+        """Enfile un job ; lève QueueFullError si la limite de jobs en attente est atteinte"""
+        with self._lock:
+            self._prune()
+            if sum(1 for j in self._jobs.values() if j.finished_at is None) >= self.max_pending:
+                raise QueueFullError(f"{self.max_pending} traitements déjà en attente")
+            job = Job(id=uuid.uuid4().hex, kind=kind, filename=filename, file_id=file_id)
+            self._jobs[job.id] = job
+            pool, store_pool = self._pools()
+
+        def on_parsed(future: Future):
+            # Appelé dans un thread de gestion du pool : on délègue l'écriture en base
+            store_pool.submit(self._finish, job, pool, future, store, on_failure)
+
+        try:
+            job.future = pool.submit(work, *args)
+        except Exception as e:
+            # Le job ne doit pas rester compté comme en attente
+            if isinstance(e, BrokenProcessPool):
+                self._discard_pool(pool)
+            self._fail(job, e, on_failure)
+            return job
+        job.future.add_done_callback(on_parsed)
+        logger.info(f"Job {job.id} ({kind}) mis en file: {filename}")
+        return job
+
+    def _fail(self, job: Job, error: Exception, on_failure: Optional[Callable[[Job], None]]):
+        logger.error(f"Job {job.id} en erreur: {error}")
+        if on_failure is not None:
+            try:
+                on_failure(job)
+            except Exception as cleanup_error:
+                logger.error(f"Job {job.id} - nettoyage après erreur impossible: {cleanup_error}")
+        self._set_status(job, JOB_FAILED, error=str(error) or type(error).__name__)
+
+    def _finish(
+        self,
+        job: Job,
+        pool: ProcessPoolExecutor,
+        future: Future,
+        store: Callable[[Job, Any], Optional[dict]],
+        on_failure: Optional[Callable[[Job], None]] = None
+    ):
+        try:
+            parsed = future.result()
+            self._set_status(job, JOB_STORING)
+            result = store(job, parsed)
+            with self._lock:
+                job.result = result or {}
+            self._set_status(job, JOB_DONE)
+            logger.info(f"Job {job.id} terminé")
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                self._discard_pool(pool)
+            self._fail(job, e, on_failure)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job and job.status == JOB_QUEUED and job.future is not None and job.future.running():
+                job.status = JOB_RUNNING
+                job.progress = _PROGRESS[JOB_RUNNING]
+            return job
+
+    def shutdown(self):
+        with self._lock:
+            pool, store_pool = self._pool, self._store_pool
+            self._pool = None
+            self._store_pool = None
+        if pool is not None:
+            pool.shutdown(wait=True)
+        if store_pool is not None:
+            store_pool.shutdown(wait=True)
+
+
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            from app.config import settings
+            _queue = JobQueue(settings.JOB_MAX_WORKERS, settings.JOB_MAX_PENDING)
+        return _queue
@@ -0,0 +1,188 @@
+"""
+Utilisation prévue / réelle des machines par semaine ISO.
+
+Prévu : les tâches du Gantt (start_week..end_week, Ensemble -> Machine) donnent,
+par machine et par semaine, le nombre de tâches en cours (différences +1 / -1
+puis somme cumulée sur une matrice machines × semaines). Une semaine couverte
+vaut un nombre d'heures prévues fixe.
+Réel : heures par semaine lues dans les agrégats hebdomadaires des temps de
+fonctionnement (seaux du lundi, donc semaines ISO).
+Le résultat est mis en cache par année, version du Gantt et des rapports, et paramètres.
+"""
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app import crud
+from app.services import machine_runtime as runtime
+
+STATUT_CONFORME = "conforme"
+STATUT_SOUS = "sous_utilisation"
+STATUT_SUR = "sur_utilisation"
+STATUT_HORS_PLANNING = "hors_planning"
+STATUT_INACTIF = "inactif"
+ANOMALIES = (STATUT_SOUS, STATUT_SUR, STATUT_HORS_PLANNING)
+
+_CACHE_MAX_ENTRIES = 16
+
+
+def iso_weeks(year: int) -> Tuple[int, date]:
+    """(nombre de semaines ISO de l'année, lundi de la semaine 1)"""
+    return date(year, 12, 28).isocalendar()[1], date.fromisocalendar(year, 1, 1)
+
+
+def coverage(n_machines: int, n_weeks: int, tasks: Iterable[Tuple[int, int, int]]) -> np.ndarray:
+    """Tâches (indice machine, semaine début, semaine fin) -> nombre de tâches par machine et semaine (n_machines, n_weeks)"""
+    tasks = np.array(list(tasks), dtype=np.int64).reshape(-1, 3)
+    delta = np.zeros((n_machines, n_weeks + 2), dtype=np.int64)
+    if len(tasks):
+        rows = tasks[:, 0]
+        start = np.clip(np.minimum(tasks[:, 1], tasks[:, 2]), 1, n_weeks + 1)
+        end = np.clip(np.maximum(tasks[:, 1], tasks[:, 2]), 0, n_weeks)
+        valid = start <= end
+        np.add.at(delta, (rows[valid], start[valid]), 1)
+        np.add.at(delta, (rows[valid], end[valid] + 1), -1)
+    return np.cumsum(delta, axis=1)[:, 1:n_weeks + 1]
+
+
+def actual_hours(n_machines: int, n_weeks: int, week1: date, rows: Iterable[Tuple[int, date, int]]) -> np.ndarray:
+    """Agrégats hebdomadaires (indice machine, lundi, secondes) -> heures par machine et semaine"""
+    rows = list(rows)
+    hours = np.zeros((n_machines, n_weeks), dtype=np.float64)
+    if rows:
+        machine = np.array([row[0] for row in rows], dtype=np.int64)
+        week = (np.array([row[1] for row in rows], dtype="datetime64[D]") - np.datetime64(week1, "D")).astype(np.int64) // 7
+        seconds = np.array([row[2] for row in rows], dtype=np.float64)
+        keep = (week >= 0) & (week < n_weeks)
+        np.add.at(hours, (machine[keep], week[keep]), seconds[keep] / 3600)
+    return hours
+
+
+def classify(tasks: np.ndarray, planned: np.ndarray, actual: np.ndarray, low: float, high: float) -> np.ndarray:
+    """Statut de chaque cellule machine × semaine"""
+    return np.select(
+        [
+            (tasks == 0) & (actual > 0),
+            tasks == 0,
+            actual < low * planned,
+            actual > high * planned,
+        ],
+        [STATUT_HORS_PLANNING, STATUT_INACTIF, STATUT_SOUS, STATUT_SUR],
+        default=STATUT_CONFORME
+    )
+
+
+def reconcile(
+    year: int,
+    machines: List[dict],
+    tasks: Iterable[Tuple[int, int, int]],
+    weekly: Iterable[Tuple[int, date, int]],
+    hours_per_week: float,
+    low: float,
+    high: float,
+    anomalies_only: bool = False
+) -> List[dict]:
+    """
+    machines : dicts {machine_id, machine} ; tasks / weekly référencent les machines par indice.
+    Retourne par machine les semaines (dicts schemas.MachineUtilisationSemaine) et les totaux.
+    """
+    n_weeks, week1 = iso_weeks(year)
+    count = coverage(len(machines), n_weeks, tasks)
+    planned = np.where(count > 0, float(hours_per_week), 0.0)
+    actual = actual_hours(len(machines), n_weeks, week1, weekly)
+    status = classify(count, planned, actual, low, high)
+    gap = actual - planned
+    rate = np.divide(actual, planned, out=np.full(actual.shape, np.nan), where=planned > 0)
+
+    results = []
+    for row, machine in enumerate(machines):
+        weeks = [
+            {
+                "semaine": week + 1,
+                "debut": week1 + timedelta(weeks=week),
+                "taches": int(count[row, week]),
+                "heures_prevues": float(planned[row, week]),
+                "heures_reelles": round(float(actual[row, week]), 2),
+                "ecart": round(float(gap[row, week]), 2),
+                "taux": None if np.isnan(rate[row, week]) else round(float(rate[row, week]), 4),
+                "statut": str(status[row, week]),
+            }
+            for week in range(n_weeks)
+            if not anomalies_only or status[row, week] in ANOMALIES
+        ]
+        results.append(dict(
+            machine,
+            heures_prevues=float(planned[row].sum()),
+            heures_reelles=round(float(actual[row].sum()), 2),
+            semaines_sous_utilisation=int(np.count_nonzero(status[row] == STATUT_SOUS)),
+            semaines_sur_utilisation=int(np.count_nonzero(status[row] == STATUT_SUR)),
+            semaines_hors_planning=int(np.count_nonzero(status[row] == STATUT_HORS_PLANNING)),
+            semaines=weeks
+        ))
+    return results
+
+
+class _ReconciliationCache:
+    """Cache LRU des rapprochements, clé (année, versions, paramètres)"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, List[dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple) -> Optional[List[dict]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Tuple, results: List[dict]):
+        with self._lock:
+            self._entries[key] = results
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_cache = _ReconciliationCache(_CACHE_MAX_ENTRIES)
+
+
+def year_utilisation(db: Session, year: int, hours_per_week: float, low: float, high: float, anomalies_only: bool = False) -> List[dict]:
+    """Rapprochement prévu / réel des machines d'une année, recalculé seulement si le Gantt ou un rapport a changé"""
+    machines = crud.get_machines_by_year(db, year)
+    slugs = [runtime.machine_key(machine.name) for machine in machines]
+    key = (
+        year,
+        tuple((machine.id, machine.name) for machine in machines),
+        crud.get_gantt_version(db, year),
+        tuple(crud.get_machine_runtime_version(db, slug) for slug in slugs),
+        hours_per_week, low, high, anomalies_only
+    )
+    results = _cache.get(key)
+    if results is not None:
+        return results
+
+    n_weeks, week1 = iso_weeks(year)
+    last_day = week1 + timedelta(weeks=n_weeks) - timedelta(days=1)
+    index_of_id = {machine.id: row for row, machine in enumerate(machines)}
+    rows_of_slug = {}
+    for row, slug in enumerate(slugs):
+        rows_of_slug.setdefault(slug, []).append(row)
+    tasks = [(index_of_id[machine_id], start, end) for machine_id, start, end in crud.get_planned_task_weeks(db, year)]
+    weekly = [
+        (row, periode, seconds)
+        for slug, periode, seconds in crud.get_machine_runtime_weeks(db, list(set(slugs)), week1, last_day)
+        for row in rows_of_slug[slug]
+    ]
+    results = reconcile(
+        year,
+        [{"machine_id": machine.id, "machine": machine.name} for machine in machines],
+        tasks, weekly, hours_per_week, low, high, anomalies_only
+    )
+    _cache.put(key, results)
+    return results
@@ -0,0 +1,226 @@
+"""
+Temps de fonctionnement des machines : lecture des rapports PDF et statistiques d'une période.
+
+Un rapport liste, pour chaque jour de production, une "Start Date" (JJ/MM/AAAA)
+suivie d'une "Durée totale" (HH:MM:SS). Les durées d'un même jour sont additionnées.
+
+Le texte est extrait page par page avec pdfium (dépendance de pdfplumber,
+bien plus rapide que l'analyse de mise en page de pdfplumber) et réduit
+aussitôt à une suite de jetons (date ou durée) ; seules ces suites sont
+conservées, puis appariées dans l'ordre du document. Au-delà de
+PAGES_PER_TASK pages, les plages de pages sont réparties sur le process pool
+partagé (app.services.process_pool).
+"""
+import re
+import shutil
+import tempfile
+import threading
+import unicodedata
+from datetime import date, datetime
+from typing import BinaryIO, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+import pypdfium2 as pdfium
+
+from app.services.process_pool import get_shared_pool
+
+# Un seul passage par page : date de début ou durée totale
+_TOKEN = re.compile(
+    r"Start\s*Date\s*:?\s*(\d{1,2}/\d{1,2}/\d{4})|Dur[ée]e\s*totale\s*:?\s*(\d+):(\d{2}):(\d{2})",
+    re.IGNORECASE
+)
+
+# Jeton : (date, None) ou (None, secondes)
+Token = Tuple[Optional[date], Optional[int]]
+
+PAGES_PER_TASK = 25
+
+# pdfium n'est pas utilisable depuis plusieurs threads à la fois (uploads simultanés)
+_PDFIUM_LOCK = threading.Lock()
+
+DATE_FORMAT = "%d/%m/%Y"
+
+
+def machine_key(name: str) -> str:
+    """Identifiant d'une machine tel qu'il apparaît dans l'URL de sa page ("Laser Bodor" -> "laser-bodor")"""
+    text = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")
+
+
+def format_duration(seconds: int) -> str:
+    """Secondes -> "HH:MM:SS" (heures au-delà de 24 si besoin)"""
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def format_date(value: date) -> str:
+    return value.strftime(DATE_FORMAT)
+
+
+def scan_text(text: str) -> List[Token]:
+    """Dates de début et durées totales d'un texte, dans l'ordre"""
+    tokens = []
+    for match in _TOKEN.finditer(text):
+        if match.group(1):
+            try:
+                tokens.append((datetime.strptime(match.group(1), DATE_FORMAT).date(), None))
+            except ValueError:
+                continue
+        else:
+            tokens.append((None, int(match.group(2)) * 3600 + int(match.group(3)) * 60 + int(match.group(4))))
+    return tokens
+
+
+def pair_tokens(tokens: Iterable[Token], days: Optional[Dict[date, int]] = None) -> Dict[date, int]:
+    """
+    Chaque durée va à la dernière date qui la précède et n'a pas encore de durée.
+    Une date sans durée (jour sans ligne "Durée totale", en-tête de période) est
+    abandonnée à la date suivante ; les durées sans date sont ignorées.
+    """
+    days = {} if days is None else days
+    pending: Optional[date] = None
+    for day, seconds in tokens:
+        if day is not None:
+            pending = day
+        elif pending is not None:
+            days[pending] = days.get(pending, 0) + seconds
+            pending = None
+    return days
+
+
+def parse_text(text: str, days: Optional[Dict[date, int]] = None) -> Dict[date, int]:
+    """Ajoute à days les durées (secondes) par jour trouvées dans le texte d'un rapport"""
+    return pair_tokens(scan_text(text), days)
+
+
+def scan_pages(path: str, first: int, last: int) -> List[Token]:
+    """Worker : jetons des pages first..last (numérotées à partir de 1), une page en mémoire à la fois"""
+    tokens = []
+    with _PDFIUM_LOCK:
+        document = pdfium.PdfDocument(path)
+        try:
+            for index in range(first - 1, last):
+                page = document[index]
+                textpage = page.get_textpage()
+                tokens.extend(scan_text(textpage.get_text_range()))
+                textpage.close()
+                page.close()
+        finally:
+            document.close()
+    return tokens
+
+
+def page_count(path: str) -> int:
+    with _PDFIUM_LOCK:
+        document = pdfium.PdfDocument(path)
+        try:
+            return len(document)
+        finally:
+            document.close()
+
+
+def extract_days(
+    source: Union[str, bytes],
+    max_workers: Optional[int] = None,
+    pages_per_task: int = PAGES_PER_TASK
+) -> Dict[date, int]:
+    """Durées de fonctionnement par jour d'un rapport PDF (chemin ou contenu)"""
+    if isinstance(source, bytes):
+        with tempfile.NamedTemporaryFile(suffix=".pdf") as spool:
+            spool.write(source)
+            spool.flush()
+            return extract_days(spool.name, max_workers, pages_per_task)
+
+    pages = page_count(source)
+    ranges = [(first, min(first + pages_per_task - 1, pages)) for first in range(1, pages + 1, pages_per_task)]
+    pool = get_shared_pool()
+    workers = min(len(ranges), max_workers or pool.max_workers)
+    if workers > 1:
+        parts = [future.result() for future in pool.ordered(scan_pages, [(source, first, last) for first, last in ranges], workers)]
+    else:
+        parts = [scan_pages(source, first, last) for first, last in ranges]
+    return pair_tokens(token for part in parts for token in part)
+
+
+def spool_to_disk(stream: BinaryIO) -> str:
+    """Copie le rapport uploadé dans un fichier temporaire (à supprimer par l'appelant)"""
+    with tempfile.NamedTemporaryFile(prefix="rapport_", suffix=".pdf", delete=False) as spool:
+        shutil.copyfileobj(stream, spool, 1 << 20)
+        return spool.name
+
+
+# Jours ouvrés : lundi à vendredi (jours fériés éventuels passés par l'appelant)
+WEEKMASK = "1111100"
+
+
+def business_calendar(holidays: Iterable[date] = ()) -> np.busdaycalendar:
+    return np.busdaycalendar(weekmask=WEEKMASK, holidays=np.array(sorted(holidays), dtype="datetime64[D]"))
+
+
+_CALENDAR = business_calendar()
+
+
+def to_arrays(days: Dict[date, int]) -> Tuple[np.ndarray, np.ndarray]:
+    """dict date -> secondes en tableaux triés (datetime64[D], int64)"""
+    ordered = sorted(days.items())
+    return (
+        np.array([day for day, _ in ordered], dtype="datetime64[D]"),
+        np.array([seconds for _, seconds in ordered], dtype=np.int64),
+    )
+
+
+def _as_date(value: np.datetime64) -> date:
+    return value.astype("datetime64[D]").astype(date)
+
+
+def merge_extents(starts: np.ndarray, ends: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Union d'intervalles de jours [début, fin] -> intervalles disjoints triés"""
+    if not len(starts):
+        return starts, ends
+    order = np.argsort(starts, kind="stable")
+    starts, ends = starts[order], ends[order]
+    reach = np.maximum.accumulate(ends)
+    # Nouvel intervalle si le début dépasse (d'au moins un jour) tout ce qui précède
+    new = np.r_[True, starts[1:] > reach[:-1] + np.timedelta64(1, "D")]
+    last = np.r_[np.flatnonzero(new)[1:] - 1, len(starts) - 1]
+    return starts[new], reach[last]
+
+
+def series_stats(
+    dates: np.ndarray,
+    seconds: np.ndarray,
+    extents: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+    calendar: np.busdaycalendar = _CALENDAR
+) -> dict:
+    """
+    Statistiques (format StatsGlobales) de jours triés. Le calendrier des jours ouvrés
+    couvre les intervalles disjoints extents (par défaut, du premier au dernier jour).
+    """
+    if not len(dates):
+        return {}
+    if extents is None:
+        extents = (dates[:1], dates[-1:])
+    starts, ends = extents
+    i_min, i_max = int(np.argmin(seconds)), int(np.argmax(seconds))
+    total = int(seconds.sum())
+    productive = int(np.count_nonzero(seconds))
+    business = int(np.busday_count(starts, ends + np.timedelta64(1, "D"), busdaycal=calendar).sum())
+    on_business = np.is_busday(dates, busdaycal=calendar)
+    business_total = int(seconds[on_business].sum())
+    return {
+        "date_minimale": format_date(_as_date(dates[0])),
+        "date_maximale": format_date(_as_date(dates[-1])),
+        "valeur_minimale": format_duration(seconds[i_min]),
+        "date_valeur_minimale": format_date(_as_date(dates[i_min])),
+        "valeur_maximale": format_duration(seconds[i_max]),
+        "date_valeur_maximale": format_date(_as_date(dates[i_max])),
+        "valeur_moyenne_productive": format_duration(total // productive) if productive else None,
+        "valeur_moyenne_totale": format_duration(business_total // business) if business else None,
+        "jours_sans_production": business - int(np.count_nonzero(seconds[on_business])),
+        "somme_totale_periodes": format_duration(total),
+    }
+
+
+def period_stats(days: Dict[date, int]) -> dict:
+    """Statistiques d'une période (format StatsGlobales de la page statistiques)"""
+    return series_stats(*to_arrays(days))
@@ -0,0 +1,121 @@
+"""
+Agrégats semaine / mois / année des temps de fonctionnement d'une machine.
+
+Chaque seau est identifié par son premier jour (lundi, 1er du mois, 1er janvier)
+et porte le nombre de jours connus, la somme, le maximum et le nombre de jours
+productifs ; la moyenne s'en déduit. Les seaux touchés par un upload ou une
+suppression sont recalculés (semaines et mois depuis les jours, années depuis
+les mois), ce qui borne le travail à la plage de dates modifiée.
+"""
+from datetime import date, timedelta
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+LEVEL_DAY = "jour"
+LEVEL_WEEK = "semaine"
+LEVEL_MONTH = "mois"
+LEVEL_YEAR = "annee"
+LEVELS = (LEVEL_DAY, LEVEL_WEEK, LEVEL_MONTH, LEVEL_YEAR)
+ROLLUP_LEVELS = (LEVEL_WEEK, LEVEL_MONTH, LEVEL_YEAR)
+
+# Durée moyenne d'un seau, pour estimer le nombre de points d'une plage
+_BUCKET_DAYS = {LEVEL_DAY: 1, LEVEL_WEEK: 7, LEVEL_MONTH: 30.44, LEVEL_YEAR: 365.25}
+
+# Colonnes d'un agrégat : début du seau, jours, somme, maximum, jours productifs
+Buckets = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+def bucket_starts(dates: np.ndarray, level: str) -> np.ndarray:
+    """Premier jour du seau de chaque date (datetime64[D])"""
+    dates = dates.astype("datetime64[D]")
+    if level == LEVEL_WEEK:
+        # 1970-01-01 est un jeudi : (jours + 3) % 7 vaut 0 le lundi
+        return dates - ((dates.astype(np.int64) + 3) % 7).astype("timedelta64[D]")
+    if level == LEVEL_MONTH:
+        return dates.astype("datetime64[M]").astype("datetime64[D]")
+    if level == LEVEL_YEAR:
+        return dates.astype("datetime64[Y]").astype("datetime64[D]")
+    return dates
+
+
+def bucket_start(day: date, level: str) -> date:
+    return bucket_starts(np.array([day], dtype="datetime64[D]"), level)[0].astype(date)
+
+
+def bucket_end(day: date, level: str) -> date:
+    """Dernier jour du seau contenant day"""
+    value = np.datetime64(day, "D")
+    if level == LEVEL_WEEK:
+        return bucket_start(day, level) + timedelta(days=6)
+    if level == LEVEL_MONTH:
+        return ((value.astype("datetime64[M]") + 1).astype("datetime64[D]") - 1).astype(date)
+    if level == LEVEL_YEAR:
+        return ((value.astype("datetime64[Y]") + 1).astype("datetime64[D]") - 1).astype(date)
+    return day
+
+
+def from_days(rows: Iterable[Tuple[date, int]]) -> Buckets:
+    """Jours (jour, secondes) vus comme des seaux d'un jour"""
+    rows = list(rows)
+    seconds = np.array([row[1] for row in rows], dtype=np.int64)
+    return (
+        np.array([row[0] for row in rows], dtype="datetime64[D]"),
+        np.ones(len(rows), dtype=np.int64),
+        seconds,
+        seconds,
+        (seconds > 0).astype(np.int64),
+    )
+
+
+def from_rollups(rows: Iterable) -> Buckets:
+    """Agrégats enregistrés (models.MachineRuntimeRollup) -> colonnes"""
+    rows = list(rows)
+    return (
+        np.array([row.periode for row in rows], dtype="datetime64[D]"),
+        np.array([row.jours for row in rows], dtype=np.int64),
+        np.array([row.total_secondes for row in rows], dtype=np.int64),
+        np.array([row.max_secondes for row in rows], dtype=np.int64),
+        np.array([row.jours_productifs for row in rows], dtype=np.int64),
+    )
+
+
+def rollup(buckets: Buckets, level: str) -> Buckets:
+    """Regroupe des seaux (jours ou mois) au niveau demandé"""
+    starts, days, total, maximum, productive = buckets
+    if not len(starts):
+        return buckets
+    keys, inverse = np.unique(bucket_starts(starts, level), return_inverse=True)
+    out_max = np.zeros(len(keys), dtype=np.int64)
+    np.maximum.at(out_max, inverse, maximum)
+    return (
+        keys,
+        np.bincount(inverse, weights=days, minlength=len(keys)).astype(np.int64),
+        np.bincount(inverse, weights=total, minlength=len(keys)).astype(np.int64),
+        out_max,
+        np.bincount(inverse, weights=productive, minlength=len(keys)).astype(np.int64),
+    )
+
+
+def select(buckets: Buckets, first: date, last: date) -> Buckets:
+    """Seaux dont le début est dans [first, last]"""
+    starts = buckets[0]
+    keep = (starts >= np.datetime64(first, "D")) & (starts <= np.datetime64(last, "D"))
+    return tuple(column[keep] for column in buckets)
+
+
+def to_rows(buckets: Buckets) -> List[dict]:
+    starts, days, total, maximum, productive = buckets
+    return [
+        {"periode": start, "jours": n, "total_secondes": t, "max_secondes": m, "jours_productifs": p}
+        for start, n, t, m, p in zip(starts.tolist(), days.tolist(), total.tolist(), maximum.tolist(), productive.tolist())
+    ]
+
+
+def choose_level(date_debut: date, date_fin: date, points: int) -> str:
+    """Niveau le plus fin dont le nombre de seaux sur la plage tient dans le budget de points"""
+    span = (date_fin - date_debut).days + 1
+    for level in LEVELS:
+        if span / _BUCKET_DAYS[level] <= points:
+            return level
+    return LEVEL_YEAR
@@ -0,0 +1,112 @@
+"""
+Statistiques de temps de fonctionnement d'une machine sur plusieurs périodes.
+
+Les jours de la machine sont chargés une fois en deux tableaux triés
+(datetime64[D], secondes int64) et mis en cache par version des données
+(rapports enregistrés). Chaque période est une tranche de ces tableaux
+(searchsorted) ; la synthèse porte sur l'union des périodes, avec un
+calendrier de jours ouvrés NumPy (busday_count / is_busday).
+"""
+import logging
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app import crud
+from app.services import machine_runtime as runtime
+
+logger = logging.getLogger(__name__)
+
+_CACHE_MAX_MACHINES = 64
+
+Series = Tuple[np.ndarray, np.ndarray]
+
+
+class _SeriesCache:
+    """Cache LRU des jours par machine, clé (machine, version des données)"""
+
+    def __init__(self, max_machines: int):
+        self.max_machines = max_machines
+        self._entries: "OrderedDict[Tuple, Series]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple) -> Optional[Series]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Tuple, series: Series):
+        with self._lock:
+            self._entries[key] = series
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_machines:
+                self._entries.popitem(last=False)
+
+
+_cache = _SeriesCache(_CACHE_MAX_MACHINES)
+
+
+def load_series(rows: Iterable[Tuple[date, int]]) -> Series:
+    """Lignes (jour, secondes) triées par jour (une par jour, rapports fusionnés) -> tableaux"""
+    rows = list(rows)
+    return (
+        np.array([row[0] for row in rows], dtype="datetime64[D]"),
+        np.array([row[1] for row in rows], dtype=np.int64),
+    )
+
+
+def get_series(db: Session, machine: str) -> Series:
+    """Jours d'une machine, rechargés seulement si ses rapports ont changé"""
+    key = (machine, crud.get_machine_runtime_version(db, machine))
+    series = _cache.get(key)
+    if series is None:
+        series = load_series(crud.get_machine_runtime_series(db, machine))
+        _cache.put(key, series)
+        logger.info(f"Machine {machine} - {len(series[0])} jours chargés pour les statistiques")
+    return series
+
+
+def _bounds(dates: np.ndarray, periods: List[Tuple[Optional[date], Optional[date]]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Indices [début, fin) de chaque période dans les jours triés (bornes absentes = ouvertes)"""
+    low = np.array([start or date.min for start, _ in periods], dtype="datetime64[D]")
+    high = np.array([end or date.max for _, end in periods], dtype="datetime64[D]")
+    return np.searchsorted(dates, low, side="left"), np.searchsorted(dates, high, side="right")
+
+
+def multi_period_stats(
+    series: Series,
+    periods: List[Tuple[Optional[date], Optional[date]]],
+    holidays: Iterable[date] = ()
+) -> Tuple[List[dict], dict]:
+    """
+    Statistiques de chaque période et de leur union (les jours communs à deux périodes ne comptent qu'une fois).
+    Le calendrier d'une période va de son premier à son dernier jour de données.
+    """
+    dates, seconds = series
+    calendar = runtime.business_calendar(holidays)
+    first, stop = _bounds(dates, periods)
+
+    per_period = [
+        dict(runtime.series_stats(dates[i:j], seconds[i:j], calendar=calendar), jours=int(j - i))
+        for i, j in zip(first.tolist(), stop.tolist())
+    ]
+
+    # Jours sélectionnés par au moins une période : +1 au début, -1 après la fin, somme cumulée
+    delta = np.zeros(len(dates) + 1, dtype=np.int64)
+    np.add.at(delta, first, 1)
+    np.add.at(delta, stop, -1)
+    selected = np.cumsum(delta[:-1]) > 0
+
+    filled = stop > first
+    extents = runtime.merge_extents(dates[first[filled]], dates[stop[filled] - 1])
+    overall = dict(
+        runtime.series_stats(dates[selected], seconds[selected], extents, calendar),
+        jours=int(np.count_nonzero(selected))
+    )
+    return per_period, overall
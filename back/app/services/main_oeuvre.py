@@ -0,0 +1,417 @@
+"""
+Répartition du coût de main-d'œuvre de la paie (Coût global) sur les machines, par semaine ISO.
+
+Un mois de paie est réparti sur les cellules machine × semaine ISO touchées par
+ses jours ouvrés, chaque semaine pesant le nombre de ses jours ouvrés tombant
+dans le mois. Les lignes (salarié, service) du mois passent par les clés dans
+l'ordre demandé ; une ligne répartie par une clé ne passe pas aux suivantes :
+  - affectations : tâches du Gantt auxquelles le salarié (utilisateur de même
+    nom) est affecté, sur les semaines où elles sont en cours ;
+  - services : table service -> machines pondérées ;
+  - couverture : au prorata des tâches en cours sur chaque machine.
+Les poids d'une clé forment une matrice creuse lignes × cellules (triplets COO),
+normalisée par ligne ; la répartition est le produit montants · poids, calculé
+par np.bincount.
+Seule la répartition avec les paramètres par défaut (toutes les clés, production
+seulement) est enregistrée ; chaque mois enregistré porte une signature (lignes du
+mois, Gantt et affectations des années touchées, table des services) : seuls les
+mois dont la signature a changé sont recalculés. Les autres paramètres sont
+calculés en mémoire à chaque demande, sans toucher à la répartition enregistrée.
+"""
+import hashlib
+import logging
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from app import crud, models
+from app.services import machine_runtime as runtime
+from app.services import machine_runtime_rollups as rollups
+from app.services.couts_salariaux import iter_record_batches
+from app.services.couts_salariaux_mensuel import file_version, is_production, mois_annee
+
+logger = logging.getLogger(__name__)
+
+KEY_ASSIGNMENTS = "affectations"
+KEY_SERVICES = "services"
+KEY_COVERAGE = "couverture"
+KEYS = (KEY_ASSIGNMENTS, KEY_SERVICES, KEY_COVERAGE)
+
+COL_SALARIE = "Salarié"
+COL_SERVICE = "Service"
+COL_P_HP = "P / HP"
+COL_MOIS = "Mois"
+COL_COUT = "Coût global"
+COLUMNS = [COL_SALARIE, COL_SERVICE, COL_P_HP, COL_MOIS, COL_COUT]
+
+_CACHE_MAX_FILES = 16
+_CALENDAR = runtime.business_calendar()
+_WORDS = re.compile(r"[a-z0-9]+")
+
+# Semaines d'un mois : (année ISO, semaine, jours ouvrés du mois dans la semaine)
+Weeks = Tuple[np.ndarray, np.ndarray, np.ndarray]
+# Tâches : (indice machine, année, semaine début, semaine fin)
+Tasks = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+def person_key(*names) -> str:
+    """Nom normalisé (minuscules, sans accents, mots triés) : 'DUPONT Jean' et ('Jean', 'Dupont') -> 'dupont jean'"""
+    text = " ".join(str(name) for name in names if name)
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode().lower()
+    return " ".join(sorted(_WORDS.findall(text)))
+
+
+def month_weeks(mois: str) -> Weeks:
+    """Semaines ISO touchées par les jours ouvrés d'un mois 'AAAA-MM'"""
+    first = np.datetime64(mois, "M")
+    days = np.arange(first.astype("datetime64[D]"), (first + 1).astype("datetime64[D]"))
+    days = days[np.is_busday(days, busdaycal=_CALENDAR)]
+    # Le jeudi de la semaine donne l'année ISO
+    thursday = rollups.bucket_starts(days, rollups.LEVEL_WEEK) + 3
+    year = thursday.astype("datetime64[Y]")
+    week = (thursday - year.astype("datetime64[D]")).astype(np.int64) // 7 + 1
+    keys, counts = np.unique(np.stack([year.astype(np.int64) + 1970, week]), axis=1, return_counts=True)
+    return keys[0], keys[1], counts.astype(np.float64)
+
+
+def _spread(rows: np.ndarray, cols: np.ndarray, vals: np.ndarray, amounts: np.ndarray, n_cells: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Matrice de poids en triplets COO (ligne, cellule, poids > 0) : chaque ligne est normalisée
+    puis son montant réparti. Retourne (montant par cellule, lignes réparties).
+    """
+    sums = np.bincount(rows, weights=vals, minlength=len(amounts))
+    cells = np.bincount(cols, weights=vals / sums[rows] * amounts[rows], minlength=n_cells)
+    return cells, sums > 0
+
+
+def allocate(
+    amounts: np.ndarray,
+    persons: np.ndarray,
+    services: np.ndarray,
+    weeks: Weeks,
+    n_machines: int,
+    tasks: Tasks,
+    assignments: Tuple[np.ndarray, np.ndarray],
+    mapping: Tuple[np.ndarray, np.ndarray, np.ndarray],
+    keys: Sequence[str] = KEYS
+) -> Tuple[Dict[str, np.ndarray], float]:
+    """
+    Répartit les montants des lignes (salarié, service) d'un mois.
+    assignments : (indice de tâche, salarié normalisé) ; mapping : (service, indice machine, poids).
+    Retourne le montant par clé sur une grille (machines, semaines) et le montant non réparti.
+    """
+    years, week_numbers, days = weeks
+    n_weeks = len(days)
+    n_cells = n_machines * n_weeks
+    t_machine, t_year, t_start, t_end = tasks
+    low, high = np.minimum(t_start, t_end), np.maximum(t_start, t_end)
+    # Tâches × semaines du mois : tâche en cours
+    active = (t_year[:, None] == years) & (low[:, None] <= week_numbers) & (week_numbers <= high[:, None])
+
+    remaining = amounts != 0
+    units = pd.DataFrame({"unit": np.arange(len(amounts)), "personne": persons, "service": services})
+
+    def by_assignments():
+        pairs = units.merge(pd.DataFrame({"personne": assignments[1], "task": assignments[0]}), on="personne")
+        unit, task = pairs["unit"].to_numpy(), pairs["task"].to_numpy(dtype=np.int64)
+        pair, week = np.nonzero(active[task])
+        return unit[pair], t_machine[task[pair]] * n_weeks + week, days[week]
+
+    def by_services():
+        pairs = units.merge(pd.DataFrame({"service": mapping[0], "machine": mapping[1], "poids": mapping[2]}), on="service")
+        pairs = pairs[pairs["poids"] > 0]
+        count = len(pairs)
+        return (
+            np.repeat(pairs["unit"].to_numpy(), n_weeks),
+            np.repeat(pairs["machine"].to_numpy(dtype=np.int64), n_weeks) * n_weeks + np.tile(np.arange(n_weeks), count),
+            np.repeat(pairs["poids"].to_numpy(dtype=np.float64), n_weeks) * np.tile(days, count),
+        )
+
+    cells = {}
+    for key in keys:
+        if key == KEY_COVERAGE:
+            # Même répartition pour toutes les lignes restantes : tâches en cours × jours ouvrés
+            task, week = np.nonzero(active)
+            load = np.bincount(t_machine[task] * n_weeks + week, weights=days[week], minlength=n_cells)
+            total = load.sum()
+            share = amounts[remaining].sum() * load / total if total > 0 else np.zeros(n_cells)
+            if total > 0:
+                remaining[:] = False
+        else:
+            rows, cols, vals = by_assignments() if key == KEY_ASSIGNMENTS else by_services()
+            keep = remaining[rows] & (vals > 0)
+            share, spread = _spread(rows[keep], cols[keep], vals[keep], amounts, n_cells)
+            remaining &= ~spread
+        cells[key] = share.reshape(n_machines, n_weeks)
+    return cells, float(amounts[remaining].sum())
+
+
+def _partial_units(batch: List[dict], production_only: bool) -> Optional[pd.DataFrame]:
+    """Coût global d'un lot par mois, salarié (normalisé) et service"""
+    if not batch:
+        return None
+    df = pd.DataFrame.from_records(batch, columns=COLUMNS)
+    # Transformations faites sur les valeurs distinctes
+    mois = df[COL_MOIS].astype(object)
+    distinct = mois.dropna().unique()
+    df["mois"] = mois.map(dict(zip(distinct, map(mois_annee, distinct))))
+    if production_only:
+        p_hp = df[COL_P_HP].astype(object)
+        distinct = p_hp.dropna().unique()
+        df = df[p_hp.map(dict(zip(distinct, map(is_production, distinct)))).fillna(False).astype(bool)]
+    salarie = df[COL_SALARIE].fillna("").astype(str)
+    distinct = salarie.unique()
+    df = df.assign(
+        personne=salarie.map(dict(zip(distinct, map(person_key, distinct)))),
+        service=df[COL_SERVICE].fillna("").astype(str).str.strip(),
+        montant=pd.to_numeric(df[COL_COUT], errors="coerce").fillna(0.0)
+    )
+    return df.dropna(subset=["mois"]).groupby(["mois", "personne", "service"], as_index=False)["montant"].sum()
+
+
+def load_units(batches: Iterable[List[dict]], production_only: bool = True) -> pd.DataFrame:
+    """Lignes de paie -> Coût global par mois, salarié et service (trié)"""
+    partials = [part for part in (_partial_units(batch, production_only) for batch in batches) if part is not None and not part.empty]
+    if not partials:
+        return pd.DataFrame(columns=["mois", "personne", "service", "montant"])
+    return pd.concat(partials).groupby(["mois", "personne", "service"], as_index=False)["montant"].sum()
+
+
+class _UnitsCache:
+    """Cache LRU des lignes agrégées, clé (version du fichier, production seulement)"""
+
+    def __init__(self, max_files: int):
+        self.max_files = max_files
+        self._entries: "OrderedDict[Tuple, pd.DataFrame]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple) -> Optional[pd.DataFrame]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Tuple, units: pd.DataFrame):
+        with self._lock:
+            self._entries[key] = units
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_files:
+                self._entries.popitem(last=False)
+
+
+_cache = _UnitsCache(_CACHE_MAX_FILES)
+# Un seul recalcul à la fois (les états des mois sont uniques par fichier) ; réentrant pour recalcul + relecture
+_refresh_lock = threading.RLock()
+
+
+def get_units(db: Session, db_file: models.CoutsSalariauxFile, production_only: bool = True) -> pd.DataFrame:
+    key = (file_version(db_file), production_only)
+    units = _cache.get(key)
+    if units is None:
+        units = load_units(iter_record_batches(db, db_file, COLUMNS), production_only)
+        _cache.put(key, units)
+        logger.info(f"Main-d'œuvre - fichier ID {db_file.id}: {len(units)} lignes salarié × service × mois")
+    return units
+
+
+def _digest(*parts) -> str:
+    return hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest()
+
+
+class _Context:
+    """Gantt, affectations et table des services des années touchées par les mois, en tableaux, avec leurs empreintes"""
+
+    def __init__(self, db: Session, months: Sequence[str]):
+        self.weeks_of = {mois: month_weeks(mois) for mois in months}
+        years = sorted({int(year) for weeks in self.weeks_of.values() for year in weeks[0]})
+
+        tasks = crud.get_labor_tasks(db, years)
+        assignees = crud.get_task_assignees(db, [task.id for task in tasks])
+        mapping = crud.get_machine_service_mappings(db)
+        self.machine_ids = sorted({task.machine_id for task in tasks} | {row.machine_id for row in mapping})
+        row_of = {machine_id: row for row, machine_id in enumerate(self.machine_ids)}
+        index_of_task = {task.id: i for i, task in enumerate(tasks)}
+        persons_of_task = [(task_id, person_key(first_name, last_name)) for task_id, first_name, last_name in assignees]
+
+        # Empreinte du Gantt et des affectations par année ISO, et de la table des services
+        self.year_digest = {
+            year: _digest(
+                sorted(tuple(task) for task in tasks if task.year == year),
+                sorted(pair for pair in persons_of_task if tasks[index_of_task[pair[0]]].year == year)
+            )
+            for year in years
+        }
+        self.mapping_digest = _digest(sorted((row.service, row.machine_id, row.poids) for row in mapping))
+
+        self.tasks = (
+            np.array([row_of[task.machine_id] for task in tasks], dtype=np.int64),
+            np.array([task.year for task in tasks], dtype=np.int64),
+            np.array([task.start_week for task in tasks], dtype=np.int64),
+            np.array([task.end_week for task in tasks], dtype=np.int64),
+        )
+        self.assignments = (
+            np.array([index_of_task[task_id] for task_id, _ in persons_of_task], dtype=np.int64),
+            np.array([person for _, person in persons_of_task], dtype=object),
+        )
+        self.mapping = (
+            np.array([row.service for row in mapping], dtype=object),
+            np.array([row_of[row.machine_id] for row in mapping], dtype=np.int64),
+            np.array([row.poids for row in mapping], dtype=np.float64),
+        )
+
+    def signature(self, mois: str, group: pd.DataFrame, keys: Sequence[str], production_only: bool) -> str:
+        return _digest(
+            hashlib.sha1(pd.util.hash_pandas_object(group[["personne", "service", "montant"]], index=False).to_numpy().tobytes()).hexdigest(),
+            [self.year_digest[int(year)] for year in np.unique(self.weeks_of[mois][0])],
+            tuple(keys), production_only, self.mapping_digest
+        )
+
+    def allocate_month(self, mois: str, group: pd.DataFrame, keys: Sequence[str]) -> Tuple[float, float, List[dict]]:
+        """(total, non réparti, lignes machine × semaine × clé) d'un mois"""
+        weeks = self.weeks_of[mois]
+        amounts = group["montant"].to_numpy(dtype=np.float64)
+        cells, unallocated = allocate(
+            amounts, group["personne"].to_numpy(dtype=object), group["service"].to_numpy(dtype=object),
+            weeks, len(self.machine_ids), self.tasks, self.assignments, self.mapping, keys
+        )
+        rows = []
+        for key, grid in cells.items():
+            machine, week = np.nonzero(grid)
+            rows += [
+                {"machine_id": self.machine_ids[m], "annee": int(weeks[0][w]), "semaine": int(weeks[1][w]), "cle": key, "montant": float(grid[m, w])}
+                for m, w in zip(machine.tolist(), week.tolist())
+            ]
+        return float(amounts.sum()), unallocated, rows
+
+
+def is_default(keys: Sequence[str], production_only: bool) -> bool:
+    """Paramètres dont la répartition est enregistrée (les autres sont calculés à la demande)"""
+    return tuple(keys) == KEYS and production_only
+
+
+def refresh_allocations(db: Session, db_file: models.CoutsSalariauxFile) -> int:
+    """
+    Recalcule et enregistre, avec les paramètres par défaut, les mois du fichier dont
+    la signature a changé ; retourne le nombre de mois recalculés.
+    """
+    units = get_units(db, db_file)
+    months = sorted(units["mois"].unique())
+    context = _Context(db, months)
+
+    with _refresh_lock:
+        stored = {state.mois: state.signature for state in crud.get_labor_allocation_months(db, db_file.id)}
+        recomputed = 0
+        for mois, group in units.groupby("mois"):
+            signature = context.signature(mois, group, KEYS, True)
+            if stored.get(mois) == signature:
+                continue
+            total, unallocated, rows = context.allocate_month(mois, group, KEYS)
+            crud.save_labor_allocation_month(db, db_file.id, mois, signature, total, unallocated, rows)
+            recomputed += 1
+        gone = set(stored) - set(months)
+        if gone:
+            crud.delete_labor_allocation_months(db, db_file.id, list(gone))
+        db.commit()
+    if recomputed or gone:
+        logger.info(f"Main-d'œuvre - fichier ID {db_file.id}: {recomputed} mois recalculés sur {len(months)}, {len(gone)} supprimés")
+    return recomputed
+
+
+def _stored_allocations(db: Session, db_file: models.CoutsSalariauxFile, prefix: Optional[str]):
+    """Répartition enregistrée : (recalculés, [(mois, total, non réparti)], [(mois, machine, nom, année, semaine, clé, montant)])"""
+    with _refresh_lock:
+        # Recalcul et relecture sous le même verrou : pas de mélange avec un recalcul concurrent
+        recomputed = refresh_allocations(db, db_file)
+        states = [
+            (state.mois, state.total, state.non_affecte)
+            for state in crud.get_labor_allocation_months(db, db_file.id) if not prefix or state.mois.startswith(prefix)
+        ]
+        allocations = [
+            (a.mois, a.machine_id, name, a.annee, a.semaine, a.cle, a.montant)
+            for a, name in crud.get_labor_allocations(db, db_file.id, prefix)
+        ]
+    return recomputed, states, allocations
+
+
+def _computed_allocations(db: Session, db_file: models.CoutsSalariauxFile, keys: Sequence[str], production_only: bool, prefix: Optional[str]):
+    """Même résultat que _stored_allocations, calculé en mémoire sans rien enregistrer"""
+    units = get_units(db, db_file, production_only)
+    if prefix:
+        units = units[units["mois"].str.startswith(prefix)]
+    context = _Context(db, sorted(units["mois"].unique()))
+    names = dict(crud.get_machine_names(db, context.machine_ids))
+    states, allocations = [], []
+    for mois, group in units.groupby("mois"):
+        total, unallocated, rows = context.allocate_month(mois, group, keys)
+        states.append((mois, total, unallocated))
+        allocations += [
+            (mois, row["machine_id"], names.get(row["machine_id"]), row["annee"], row["semaine"], row["cle"], row["montant"])
+            for row in rows
+        ]
+    return len(states), states, allocations
+
+
+def _rounded(values: Dict[str, float]) -> Dict[str, float]:
+    return {key: round(value, 2) for key, value in values.items()}
+
+
+def file_allocations(
+    db: Session,
+    db_file: models.CoutsSalariauxFile,
+    keys: Sequence[str] = KEYS,
+    production_only: bool = True,
+    year: Optional[int] = None
+) -> dict:
+    """Répartition d'un fichier de paie (dict schemas.MachineLaborResponse), mois de l'année demandée si year"""
+    prefix = f"{year:04d}-" if year else None
+    if is_default(keys, production_only):
+        recomputed, states, allocations = _stored_allocations(db, db_file, prefix)
+    else:
+        recomputed, states, allocations = _computed_allocations(db, db_file, keys, production_only, prefix)
+
+    by_month: Dict[str, Dict[str, float]] = {mois: {} for mois, _, _ in states}
+    machines: Dict[int, dict] = {}
+    for mois, machine_id, machine_name, annee, semaine, cle, montant in allocations:
+        month = by_month.setdefault(mois, {})
+        month[cle] = month.get(cle, 0.0) + montant
+        machine = machines.setdefault(machine_id, {"machine": machine_name, "par_cle": {}, "semaines": {}})
+        machine["par_cle"][cle] = machine["par_cle"].get(cle, 0.0) + montant
+        week = machine["semaines"].setdefault((annee, semaine), {})
+        week[cle] = week.get(cle, 0.0) + montant
+
+    return {
+        "file_id": db_file.id,
+        "cles": list(keys),
+        "production_seulement": production_only,
+        "mois_recalcules": recomputed,
+        "mois": [
+            {
+                "mois": mois,
+                "total": round(total, 2),
+                "affecte": round(sum(by_month[mois].values()), 2),
+                "non_affecte": round(non_affecte, 2),
+                "par_cle": _rounded(by_month[mois]),
+            }
+            for mois, total, non_affecte in states
+        ],
+        "machines": [
+            {
+                "machine_id": machine_id,
+                "machine": machine["machine"],
+                "total": round(sum(machine["par_cle"].values()), 2),
+                "par_cle": _rounded(machine["par_cle"]),
+                "semaines": [
+                    {"annee": annee, "semaine": semaine, "montant": round(sum(week.values()), 2), "par_cle": _rounded(week)}
+                    for (annee, semaine), week in sorted(machine["semaines"].items())
+                ],
+            }
+            for machine_id, machine in sorted(machines.items(), key=lambda item: (item[1]["machine"], item[0]))
+        ],
+    }
@@ -0,0 +1,105 @@
+"""
+Process pool partagé par les traitements parallèles faits pendant une requête
+(parsing des uploads par lots, plages des FEC, pages des rapports PDF).
+
+Un seul pool pour tout le process API, créé à la première utilisation : le
+nombre de process ne dépend pas du nombre de requêtes simultanées. Le nombre de
+tâches soumises et non terminées est borné ; au-delà, submit attend qu'une tâche
+se termine. Un pool cassé (worker tué) est recréé à la soumission suivante.
+Les uploads en arrière-plan gardent leur propre pool (app.services.jobs).
+"""
+import logging
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Iterable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SharedProcessPool:
+    """Process pool à max_workers process et au plus max_in_flight tâches en cours"""
+
+    def __init__(self, max_workers: int, max_in_flight: int):
+        self.max_workers = max_workers
+        self.max_in_flight = max_in_flight
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._pool
+
+    def _discard_pool(self, pool: ProcessPoolExecutor):
+        with self._lock:
+            if self._pool is not pool:
+                return
+            self._pool = None
+        logger.warning("Process pool partagé cassé, recréé à la prochaine tâche")
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _on_done(self, pool: ProcessPoolExecutor, future: Future):
+        self._slots.release()
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            self._discard_pool(pool)
+
+    def submit(self, fn: Callable, *args) -> Future:
+        """Soumet fn(*args) ; attend une place si max_in_flight tâches sont en cours"""
+        self._slots.acquire()
+        try:
+            pool = self._get_pool()
+            try:
+                future = pool.submit(fn, *args)
+            except BrokenProcessPool:
+                # Cassé par une tâche précédente : un nouveau pool pour celle-ci
+                self._discard_pool(pool)
+                pool = self._get_pool()
+                future = pool.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda done: self._on_done(pool, done))
+        return future
+
+    def ordered(self, fn: Callable, items: Iterable[tuple], window: int) -> Iterator[Future]:
+        """
+        Futures de fn(*item), dans l'ordre des items, avec au plus window tâches
+        soumises et non consommées pour cet appel. Les tâches restantes sont
+        annulées si l'appelant s'arrête en route.
+        """
+        pending = deque()
+        try:
+            for item in items:
+                pending.append(self.submit(fn, *item))
+                if len(pending) >= window:
+                    yield pending.popleft()
+            while pending:
+                yield pending.popleft()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+
+_shared: Optional[SharedProcessPool] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_pool() -> SharedProcessPool:
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            from app.config import settings
+            workers = settings.PROCESS_POOL_MAX_WORKERS or os.cpu_count() or 1
+            _shared = SharedProcessPool(workers, settings.PROCESS_POOL_MAX_IN_FLIGHT or 2 * workers)
+        return _shared
@@ -2,7 +2,8 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.api import api_router
 from app.config import settings
-from app.api.endpoints import couts_salariaux, fec_analysis
+from app.api.endpoints import couts_salariaux, fec_analysis, machines
+from app.services.jobs import get_job_queue
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -25,6 +26,12 @@ app.include_router(api_router, prefix=settings.API_V1_STR)
 # Alias non versionné pour compatibilité front actuelle
 app.include_router(couts_salariaux.router, prefix="/analyse/couts-salariaux", tags=["coûts-salariaux (alias)"])
 app.include_router(fec_analysis.router, prefix="/analyse/fec-analysis", tags=["fec-analysis (alias)"])
+app.include_router(machines.router, prefix="/machines", tags=["machines (alias)"])
+
+
+@app.on_event("shutdown")
+def shutdown_job_queue():
+    get_job_queue().shutdown()
 
 
 @app.get("/")
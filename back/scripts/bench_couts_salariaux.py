@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Benchmark du pipeline de coûts salariaux sur des classeurs synthétiques
+
+Usage: python scripts/bench_couts_salariaux.py [--rows 1000 10000 50000] [--no-xlsx] [--batch 12]
+
+Trois tableaux : temps du pipeline de parsing, taille et temps de décodage
+du stockage JSON comparé au format colonnaire, puis parsing d'un lot de
+classeurs mensuels en séquentiel et en parallèle.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from io import BytesIO
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from app.services import columnar
+from app.services import couts_salariaux as service
+from app.services.couts_salariaux_columns import COLONNES, resolve_columns
+
+
+def synthetic_payroll(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Export de paie synthétique : nombres au format français, dates, cellules vides"""
+    rng = np.random.default_rng(seed)
+    employees = max(rows // 12, 1)
+    matricules = rng.integers(0, employees, rows)
+    brut = rng.uniform(1600, 6000, rows).round(2)
+
+    def fr(values):
+        return [f"{v:,.2f}".replace(",", " ").replace(".", ",") for v in values]
+
+    df = pd.DataFrame({
+        "Matricule": [f"M{m:05d}" for m in matricules],
+        "Salarié": [f"Salarié {m}" for m in matricules],
+        "Service": rng.choice(["Production", "Maintenance", "Administration", "Commercial"], rows),
+        "P/HP": rng.choice(["P", "HP"], rows),
+        "Mois": pd.to_datetime("2025-01-01") + pd.to_timedelta(rng.integers(0, 12, rows) * 31, unit="D"),
+        "Heures théoriques": 151.67,
+        "Heures réelles": fr(rng.uniform(120, 170, rows)),
+        "Brut": fr(brut),
+        "Charges patronales": fr(brut * 0.42),
+        "% patronales": [f"{v:.1f} %".replace(".", ",") for v in rng.uniform(38, 46, rows)],
+        "Coût global": brut * 1.42,
+        "Net à payer": fr(brut * 0.78),
+        "Entrée": pd.to_datetime("2015-01-01") + pd.to_timedelta(rng.integers(0, 3000, rows), unit="D"),
+        "Sortie": pd.NaT,
+        "Emploi": rng.choice(["Opérateur", "Technicien", "Comptable"], rows),
+    })
+    df.loc[rng.random(rows) < 0.05, "Brut"] = ""
+    return df
+
+
+def legacy_records(result_df: pd.DataFrame) -> list:
+    """Nettoyage d'origine (boucles Python ligne par ligne), pour comparaison"""
+    result_df = result_df.replace({pd.NA: None, pd.NaT: None, np.nan: None})
+    for col in result_df.columns:
+        if result_df[col].dtype == 'datetime64[ns]':
+            result_df[col] = result_df[col].dt.strftime('%Y-%m-%d')
+    data = result_df.to_dict(orient='records')
+    for row in data:
+        for key, value in row.items():
+            if hasattr(value, 'strftime'):
+                row[key] = value.strftime('%Y-%m-%d') if value is not None else None
+    return data
+
+
+def timed(fn, *args, repeat: int = 3):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--no-xlsx", action="store_true", help="Ne pas mesurer la lecture .xlsx (lente)")
+    parser.add_argument("--batch", type=int, default=12, help="Nombre de classeurs du lot (0 = pas de mesure)")
+    args = parser.parse_args()
+
+    datasets = []
+    print(f"{'lignes':>8} | {'lecture csv':>11} | {'lecture xlsx':>12} | {'legacy':>8} | {'vectorisé':>9} | {'json':>8}")
+    for rows in args.rows:
+        df = synthetic_payroll(rows)
+
+        csv_content = df.to_csv(index=False).encode("utf-8")
+        t_csv, _ = timed(service.read_dataframe, csv_content, "bench.csv", repeat=1)
+
+        t_xlsx = float("nan")
+        if not args.no_xlsx:
+            buffer = BytesIO()
+            df.to_excel(buffer, index=False)
+            t_xlsx, _ = timed(service.read_dataframe, buffer.getvalue(), "bench.xlsx", repeat=1)
+
+        resolution = resolve_columns(df.columns)
+        resolved = resolution.apply(df)
+        t_legacy, _ = timed(legacy_records, resolved)
+        t_new, (data, _) = timed(service.build_records, df, resolution)
+        t_json, _ = timed(json.dumps, data)
+
+        assert list(data[0].keys()) == COLONNES
+        print(f"{rows:>8} | {t_csv:>10.3f}s | {t_xlsx:>11.3f}s | {t_legacy:>7.3f}s | {t_new:>8.3f}s | {t_json:>7.3f}s")
+        datasets.append((rows, data))
+
+    print()
+    print(f"{'lignes':>8} | {'json':>9} | {'colonnaire':>10} | {'ratio':>6} | {'json.loads':>10} | {'décodage':>9} | {'2 colonnes':>10}")
+    for rows, data in datasets:
+        json_payload = json.dumps(data, ensure_ascii=False)
+        blob = columnar.encode_records(data, COLONNES)
+        assert columnar.decode_records(blob) == data
+
+        t_json, _ = timed(json.loads, json_payload)
+        t_full, _ = timed(columnar.decode_records, blob)
+        t_two, _ = timed(columnar.decode_records, blob, ["Mois", "Coût global"])
+        json_size = len(json_payload.encode("utf-8"))
+        print(f"{rows:>8} | {json_size / 1e6:>7.2f}Mo | {len(blob) / 1e6:>8.2f}Mo | {json_size / len(blob):>5.1f}x | "
+              f"{t_json:>9.3f}s | {t_full:>8.3f}s | {t_two:>9.3f}s")
+
+    if args.batch:
+        bench_batch(args.batch, min(args.rows))
+
+
+def bench_batch(files: int, rows: int):
+    """Lot de classeurs .xlsx : parsing séquentiel puis réparti sur les cœurs"""
+    items = []
+    for index in range(files):
+        buffer = BytesIO()
+        synthetic_payroll(rows, seed=index).to_excel(buffer, index=False)
+        content = buffer.getvalue()
+        items.append((content, f"mois_{index + 1:02d}.xlsx", service.content_fingerprint(content)))
+
+    print()
+    print(f"{'fichiers':>8} | {'lignes':>8} | {'workers':>7} | {'temps':>8} | {'accélération':>12}")
+    reference = None
+    workers = 1
+    while True:
+        service.parse_cache = service.ParseCache(0)  # pas de cache entre les mesures
+        t_batch, results = timed(service.parse_uploads, items, workers, repeat=1)
+        assert all(error is None for _, error in results)
+        reference = reference or t_batch
+        print(f"{files:>8} | {rows:>8} | {workers:>7} | {t_batch:>7.3f}s | {reference / t_batch:>11.1f}x")
+        if workers >= min(files, os.cpu_count() or 1):
+            break
+        workers = min(workers * 2, files, os.cpu_count() or 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Benchmark de l'analyse FEC sur un fichier synthétique
+
+Usage: python scripts/bench_fec.py [--lines 2000000] [--accounts 3000] [--pipe]
+       python scripts/bench_fec.py --output fec.txt [--lines ...]
+       python scripts/bench_fec.py --file fec.txt [--chunk-mb 64] [--workers 0]
+
+Génère un FEC de 18 colonnes (tabulation ou |), puis mesure la lecture,
+la classification/agrégation et le débit global. Avec --output, le fichier
+est seulement écrit ; avec --file, il est analysé depuis le disque par plages
+(fec_parallel) et le pic de mémoire est affiché.
+"""
+
+import argparse
+import os
+import resource
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from app.services import fec, fec_parallel
+from app.services.fec import FEC_COLUMNS
+
+# Racines de comptes courantes et leur poids dans un grand livre
+_ROOTS = ["401", "411", "445", "512", "530", "601", "6031", "604", "606", "611", "613", "622", "625",
+          "631", "635", "641", "645", "681", "701", "706", "713"]
+_WEIGHTS = np.array([12, 12, 10, 8, 1, 6, 1, 2, 4, 2, 2, 3, 2, 1, 1, 3, 3, 1, 8, 4, 1], dtype=float)
+
+
+def synthetic_fec(lines: int, accounts: int, delimiter: str = "\t", seed: int = 0) -> bytes:
+    """FEC synthétique : montants au format français, une année d'écritures"""
+    rng = np.random.default_rng(seed)
+    roots = rng.choice(len(_ROOTS), size=accounts, p=_WEIGHTS / _WEIGHTS.sum())
+    numbers = np.array([f"{_ROOTS[r]}{i:05d}"[:8].ljust(8, "0") for i, r in enumerate(roots)], dtype=object)
+    labels = np.array([f"Compte {n}" for n in numbers], dtype=object)
+
+    account = rng.integers(0, accounts, lines)
+    days = pd.to_datetime("2024-01-01") + pd.to_timedelta(rng.integers(0, 366, lines), unit="D")
+    dates = days.strftime("%Y%m%d").to_numpy(dtype=object)
+    amount = np.char.replace(np.round(rng.uniform(1, 20000, lines), 2).astype(str), ".", ",")
+    is_debit = rng.random(lines) < 0.5
+    empty = np.full(lines, "", dtype=object)
+    zero = np.full(lines, "0,00", dtype=object)
+
+    df = pd.DataFrame({
+        "JournalCode": "OD",
+        "JournalLib": "Opérations diverses",
+        "EcritureNum": np.arange(lines) // 2 + 1,
+        "EcritureDate": dates,
+        "CompteNum": numbers[account],
+        "CompteLib": labels[account],
+        "CompAuxNum": empty,
+        "CompAuxLib": empty,
+        "PieceRef": "P",
+        "PieceDate": dates,
+        "EcritureLib": "Écriture",
+        "Debit": np.where(is_debit, amount, zero),
+        "Credit": np.where(is_debit, zero, amount),
+        "EcritureLet": empty,
+        "DateLet": empty,
+        "ValidDate": dates,
+        "Montantdevise": empty,
+        "Idevise": empty,
+    }, columns=FEC_COLUMNS)
+    return df.to_csv(sep=delimiter, index=False).encode("utf-8")
+
+
+def bench_file(path: str, chunk_mb: int, workers: int):
+    """Analyse depuis le disque par plages ; pic de mémoire du process et des workers"""
+    start = time.perf_counter()
+    results, lines = fec_parallel.analyze_fec_file(path, chunk_bytes=chunk_mb << 20, max_workers=workers or None)
+    total = time.perf_counter() - start
+    rss_main = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    rss_workers = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    size = os.path.getsize(path) / 1e6
+    print(f"{'taille':>9} | {'total':>8} | {'lignes/s':>12} | {'mois':>4} | {'RSS max':>8} | {'RSS worker':>10}")
+    print(f"{size:>6.0f} Mo | {total:>7.2f}s | {lines / total:>12,.0f} | {len(results):>4} | {rss_main:>5.0f} Mo | {rss_workers:>7.0f} Mo")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=2_000_000)
+    parser.add_argument("--accounts", type=int, default=3000)
+    parser.add_argument("--pipe", action="store_true", help="Séparateur | au lieu de la tabulation")
+    parser.add_argument("--output", help="Écrit le FEC synthétique dans ce fichier, sans l'analyser")
+    parser.add_argument("--file", help="Analyse ce fichier depuis le disque (fec_parallel)")
+    parser.add_argument("--chunk-mb", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=0, help="0 = nombre de cœurs")
+    args = parser.parse_args()
+
+    if args.file:
+        bench_file(args.file, args.chunk_mb, args.workers)
+        return
+
+    start = time.perf_counter()
+    content = synthetic_fec(args.lines, args.accounts, "|" if args.pipe else "\t")
+    print(f"Génération: {args.lines} lignes, {len(content) / 1e6:.1f} Mo en {time.perf_counter() - start:.1f}s")
+    if args.output:
+        with open(args.output, "wb") as f:
+            f.write(content)
+        return
+
+    start = time.perf_counter()
+    entries = fec.read_fec(content)
+    t_read = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = fec.analyze_entries(entries)
+    t_analyze = time.perf_counter() - start
+
+    total = t_read + t_analyze
+    print(f"{'lecture':>10} | {'analyse':>10} | {'total':>8} | {'lignes/s':>12} | {'mois':>4}")
+    print(f"{t_read:>9.2f}s | {t_analyze:>9.2f}s | {total:>7.2f}s | {args.lines / total:>12,.0f} | {len(results):>4}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark de l'extraction des rapports PDF de temps de fonctionnement machine
+
+Usage: python scripts/bench_machine_reports.py [--pages 300] [--days-per-page 4] [--workers 0]
+
+Génère un rapport synthétique (une "Start Date" et une "Durée totale" par jour,
+avec du texte de remplissage), puis compare :
+  - texte complet (pdfplumber) concaténé puis analysé en une fois,
+  - extraction page par page (pdfium, un seul process),
+  - extraction page par page sur un process pool.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pdfplumber
+
+from app.services import machine_runtime
+
+
+def _pdf(pages):
+    """PDF minimal (Helvetica, WinAnsi) : une liste de lignes de texte par page"""
+    objects = [b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    pages_id = 2 * len(pages) + 2
+    kids = []
+    for lines in pages:
+        ops = ["BT /F1 9 Tf 40 810 Td 11 TL"]
+        ops += ["(" + line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ") Tj T*" for line in lines]
+        ops.append("ET")
+        stream = "\n".join(ops).encode("cp1252")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] /Contents %d 0 R /Resources << /Font << /F1 1 0 R >> >> >>"
+            % (pages_id, len(objects))
+        )
+        kids.append(len(objects))
+    objects.append(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % k for k in kids), len(kids)))
+    objects.append(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, len(objects), xref)
+    return bytes(out)
+
+
+def synthetic_report(pages: int, days_per_page: int, seed: int = 0):
+    """Rapport synthétique -> (contenu PDF, durées attendues par jour)"""
+    rng = random.Random(seed)
+    day = date(2020, 1, 1)
+    expected = {}
+    content = []
+    for _ in range(pages):
+        lines = []
+        for _ in range(days_per_page):
+            seconds = rng.randint(0, 12 * 3600)
+            lines += [
+                f"Start Date: {day:%d/%m/%Y}",
+                f"Programme: P-{rng.randint(1000, 9999)}   Pièces: {rng.randint(1, 400)}",
+                *[f"Cycle {i:02d}   {rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}   OK" for i in range(12)],
+                f"Durée totale: {seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}",
+            ]
+            expected[day] = seconds
+            day += timedelta(days=1)
+        content.append(lines)
+    return _pdf(content), expected
+
+
+def whole_text(path: str):
+    """Référence : texte de toutes les pages (pdfplumber) concaténé, puis une seule analyse"""
+    with pdfplumber.open(path) as pdf:
+        text = "\n".join(page.extract_text() or "" for page in pdf.pages)
+    return machine_runtime.parse_text(text)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--days-per-page", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=0, help="0 = nombre de cœurs")
+    parser.add_argument("--pages-per-task", type=int, default=machine_runtime.PAGES_PER_TASK)
+    args = parser.parse_args()
+
+    content, expected = synthetic_report(args.pages, args.days_per_page)
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as spool:
+        spool.write(content)
+    print(f"Rapport: {args.pages} pages, {len(expected)} jours, {len(content) / 1e6:.1f} Mo ({os.cpu_count()} cœur(s))")
+
+    runs = [
+        ("texte complet", lambda: whole_text(spool.name)),
+        ("page par page", lambda: machine_runtime.extract_days(spool.name, 1, args.pages_per_task)),
+        ("process pool", lambda: machine_runtime.extract_days(spool.name, args.workers or None, args.pages_per_task)),
+    ]
+    try:
+        print(f"{'mode':>14} | {'temps':>7} | {'pages/s':>8} | ok")
+        for name, run in runs:
+            start = time.perf_counter()
+            days = run()
+            elapsed = time.perf_counter() - start
+            print(f"{name:>14} | {elapsed:>6.2f}s | {args.pages / elapsed:>8.1f} | {days == expected}")
+    finally:
+        os.remove(spool.name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+"""
+Configuration des tests : base SQLite jetable à la place de PostgreSQL.
+
+Lancer depuis back/ : python -m pytest tests
+"""
+import os
+import sys
+import tempfile
+
+BACK_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACK_DIR)
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="arp-tests-"), "test.db")
+
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    """Session sur des tables recréées pour chaque test"""
+    from app import database, models
+    models.Base.metadata.create_all(bind=database.engine)
+    session = database.SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        models.Base.metadata.drop_all(bind=database.engine)
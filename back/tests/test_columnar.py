@@ -0,0 +1,82 @@
+"""
+Format colonnaire : fidélité des allers-retours, projection et taille face au JSON.
+Les temps de décodage sont mesurés par scripts/bench_couts_salariaux.py.
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+from app.services import columnar
+from app.services.couts_salariaux_columns import COLONNES
+
+
+def _payroll(rows: int):
+    """Lignes de paie réalistes (valeurs répétées par colonne, montants décimaux, cellules vides)"""
+    rng = np.random.default_rng(0)
+    records = []
+    for i in range(rows):
+        record = {col: None for col in COLONNES}
+        record.update({
+            "Matricule": f"M{i % 2000:05d}",
+            "Salarié": f"Salarié {i % 2000}",
+            "Service": ("PROD", "ADM", "MAINT")[i % 3],
+            "P / HP": "P" if i % 3 != 1 else "HP",
+            "Mois": f"2025-{i % 12 + 1:02d}",
+            "Heures réelles": 151.67 if i % 5 else 140,
+            "Brut": round(float(rng.uniform(1800, 4000)), 2),
+            "Charges patronales": round(float(rng.uniform(700, 1600)), 2),
+            "Coût global": round(float(rng.uniform(2500, 5600)), 2),
+            "Effectif": 1,
+            "Emploi": ("Opérateur", "Technicien", "Comptable")[i % 3],
+        })
+        records.append(record)
+    return records
+
+
+def test_round_trip_keeps_values_and_types():
+    records = [
+        {"entier": 1, "mixte": 1, "texte": "é", "vide": None, "grand": 2 ** 60, "divers": True},
+        {"entier": None, "mixte": 2.5, "texte": None, "vide": None, "grand": 1.5, "divers": {"a": 1}},
+        {"entier": -3, "mixte": None, "texte": "é", "vide": None, "grand": None, "divers": "x"},
+        {"entier": 2 ** 40, "mixte": -0.0, "texte": "b", "vide": None, "grand": 3, "divers": [1, 2]},
+    ]
+    decoded = columnar.decode_records(columnar.encode_records(records))
+    assert decoded == records
+    for row, expected in zip(decoded, records):
+        assert {col: type(value) for col, value in row.items()} == {col: type(value) for col, value in expected.items()}
+
+
+def test_round_trip_payroll():
+    records = _payroll(3000)
+    assert columnar.decode_records(columnar.encode_records(records, COLONNES)) == records
+
+
+def test_projection_reads_only_requested_columns():
+    records = _payroll(1000)
+    blob = columnar.encode_records(records, COLONNES)
+    wanted = ["Mois", "Coût global", "Inconnue"]
+
+    projected = columnar.project(blob, wanted)
+    assert [col["name"] for col in columnar.read_header(projected)["columns"]] == ["Mois", "Coût global"]
+    assert len(projected) < len(blob) / 4
+    expected = [{"Mois": row["Mois"], "Coût global": row["Coût global"]} for row in records]
+    assert columnar.decode_records(projected) == expected
+    assert columnar.decode_records(blob, wanted) == expected
+
+
+def test_decode_frame_keeps_numeric_dtypes():
+    records = [{"i": 1, "f": 1.5, "s": "a"}, {"i": None, "f": None, "s": None}]
+    frame = columnar.decode_frame(columnar.encode_records(records))
+    assert str(frame["i"].dtype) == "Int64"
+    assert frame["f"].dtype == np.float64
+    assert frame["i"].isna().tolist() == [False, True]
+    assert pd.isna(frame.loc[1, "s"])
+
+
+def test_size_against_json():
+    records = _payroll(20000)
+    as_json = json.dumps(records, ensure_ascii=False).encode("utf-8")
+    blob = columnar.encode_records(records, COLONNES)
+    # Colonnes stockées une fois, valeurs répétées en dictionnaire, blocs compressés
+    assert len(blob) * 10 < len(as_json)
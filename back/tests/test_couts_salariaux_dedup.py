@@ -0,0 +1,125 @@
+"""
+Uploads déjà vus : dédoublonnage par empreinte du contenu et cache de parsing.
+"""
+import asyncio
+from io import BytesIO
+
+import pytest
+from fastapi import UploadFile
+
+from app import crud, schemas
+from app.api.endpoints import couts_salariaux as endpoint
+from app.services import couts_salariaux as service
+
+JANVIER = "Matricule,Salarié,Mois,Coût global\n1,DUPONT Jean,2025-01,3000\n2,MARTIN Paul,2025-01,3100\n".encode("utf-8")
+FEVRIER = "Matricule,Salarié,Mois,Coût global\n1,DUPONT Jean,2025-02,3000\n".encode("utf-8")
+
+
+@pytest.fixture(autouse=True)
+def parses(monkeypatch):
+    """Cache vide pour chaque test ; compte les parsings complets"""
+    calls = []
+    parse_upload = service.parse_upload
+
+    def counting(content, filename):
+        calls.append(filename)
+        return parse_upload(content, filename)
+
+    monkeypatch.setattr(service, "parse_cache", service.ParseCache(1000))
+    monkeypatch.setattr(service, "parse_upload", counting)
+    return calls
+
+
+@pytest.fixture
+def upload(db):
+    user = crud.create_user(db, schemas.UserCreate(email="j@example.com", username="jd", password="x", first_name="Jean", last_name="Dupont"))
+
+    def send(content: bytes, filename: str = "paie.csv", append_to_file_id=None):
+        return asyncio.run(endpoint.upload_couts_salariaux(
+            file=UploadFile(BytesIO(content), filename=filename), append_to_file_id=append_to_file_id,
+            streaming=False, storage=service.STORAGE_JSON, upsert=False, db=db, current_user=user
+        ))
+
+    return send
+
+
+def test_identical_upload_returns_existing_file(db, upload, parses):
+    first = upload(JANVIER)
+    again = upload(JANVIER, filename="copie.csv")
+    assert not first.deduplicated and again.deduplicated
+    assert again.file_id == first.file_id and again.total_records == 2
+    assert len(crud.get_couts_salariaux_files(db)) == 1
+    assert parses == ["paie.csv"]
+
+
+def test_repeat_append_is_idempotent(db, upload, parses):
+    target = upload(JANVIER)
+    appended = upload(FEVRIER, filename="fevrier.csv", append_to_file_id=target.file_id)
+    repeated = upload(FEVRIER, filename="fevrier.csv", append_to_file_id=target.file_id)
+    assert appended.appended and appended.total_records == 3
+    assert repeated.deduplicated and not repeated.appended
+    assert repeated.total_records == 3
+    assert len(service.load_records(db, crud.get_couts_salariaux_file(db, target.file_id))) == 3
+    assert parses == ["paie.csv", "fevrier.csv"]
+    # Le même contenu reste ajoutable à un autre fichier
+    other = upload(JANVIER.replace(b"3100", b"3200"), filename="autre.csv")
+    assert upload(FEVRIER, append_to_file_id=other.file_id).appended
+
+
+def test_hash_cleared_after_modification(db, upload):
+    original = upload(JANVIER)
+    upload(FEVRIER, append_to_file_id=original.file_id)
+    # Contenu modifié par l'ajout : il ne correspond plus au fichier d'origine
+    assert crud.get_couts_salariaux_file(db, original.file_id).content_hash is None
+    assert not upload(JANVIER).deduplicated
+
+    modified = JANVIER.replace(b"3100", b"3200")
+    edited = upload(modified)
+    assert crud.get_couts_salariaux_file(db, edited.file_id).content_hash is not None
+    crud.update_couts_salariaux_file(db, edited.file_id, schemas.CoutsSalariauxFileUpdate(processed_data="[]", total_records=0))
+    db_file = crud.get_couts_salariaux_file(db, edited.file_id)
+    assert db_file.content_hash is None
+    assert crud.get_couts_salariaux_file_source(db, edited.file_id, service.content_fingerprint(modified)) is None
+    again = upload(modified)
+    assert not again.deduplicated and again.file_id != edited.file_id
+
+
+def test_parse_upload_cached_reuses_memory_then_pristine_file(db, parses):
+    content_hash = service.content_fingerprint(JANVIER)
+    data, column_mapping = service.parse_upload_cached(db, JANVIER, "paie.csv", content_hash)
+    assert service.parse_upload_cached(db, JANVIER, "paie.csv", content_hash) == (data, column_mapping)
+    assert parses == ["paie.csv"]
+
+    # Cache mémoire vide : lignes reprises du fichier créé à partir du même contenu
+    db_file = service.create_file(db, "paie.csv", data, content_hash=content_hash)
+    service.parse_cache._entries.clear()
+    reused, mapping = service.parse_upload_cached(db, JANVIER, "paie.csv", content_hash)
+    assert reused == data and mapping is None
+    assert parses == ["paie.csv"]
+
+    # Fichier modifié depuis : nouveau parsing
+    service.append_records(db, db_file.id, data[:1])
+    service.parse_cache._entries.clear()
+    service.parse_upload_cached(db, JANVIER, "paie.csv", content_hash)
+    assert parses == ["paie.csv", "paie.csv"]
+
+
+def test_parse_cache_evicts_least_recently_used_rows():
+    cache = service.ParseCache(max_rows=5)
+    cache.put("a", [{}] * 2, None)
+    cache.put("b", [{}] * 2, None)
+    assert cache.get("a") is not None
+    cache.put("c", [{}] * 2, None)
+    # "b" est le moins récemment lu
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    # Résultat plus grand que le cache : non gardé
+    cache.put("d", [{}] * 6, None)
+    assert cache.get("d") is None and cache.get("a") is not None
+
+
+def test_parse_cache_keyed_by_resolver_version(monkeypatch):
+    cache = service.ParseCache(max_rows=10)
+    cache.put("a", [{}], None)
+    monkeypatch.setattr(service, "RESOLVER_VERSION", service.RESOLVER_VERSION + 1)
+    assert cache.get("a") is None
@@ -0,0 +1,133 @@
+"""
+Ingestion CSV et lecture par lots en flux : la mémoire utilisée dépend de la taille
+des blocs, pas du fichier.
+
+La mesure est faite dans un process séparé (pic RSS, ru_maxrss) pour ne pas
+dépendre de ce que les autres tests ont déjà chargé.
+"""
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+from tests.conftest import BACK_DIR
+
+ROWS = 450_000
+CHUNK_ROWS = 2_000
+# Croissance du pic RSS tolérée pendant l'ingestion (le CSV généré fait environ 45 Mo)
+MAX_GROWTH_MB = 40  # environ 16 Mo mesurés avec des blocs de 2 000 lignes, quelle que soit la taille du fichier
+
+_CHILD = textwrap.dedent("""
+    import json, os, resource, sys, tempfile
+    workdir = tempfile.mkdtemp(prefix="arp-rss-")
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(workdir, "rss.db")
+    sys.path.insert(0, {back_dir!r})
+
+    from app import database, models
+    from app.services import couts_salariaux as service
+    from app.services.couts_salariaux_columns import COLONNES
+
+    models.Base.metadata.create_all(bind=database.engine)
+
+    # CSV généré ligne à ligne sur disque (jamais entièrement en mémoire)
+    path = os.path.join(workdir, "paie.csv")
+    with open(path, "w", encoding="utf-8") as out:
+        out.write(",".join(COLONNES) + "\\n")
+        for i in range({rows}):
+            values = {{col: "" for col in COLONNES}}
+            values.update({{
+                "Matricule": f"M{{i:07d}}", "Salarié": f"Salarié numéro {{i}}", "Service": ("PROD", "ADM", "MAINT")[i % 3],
+                "P / HP": "P" if i % 3 != 1 else "HP", "Mois": f"2025-{{i % 12 + 1:02d}}", "Heures réelles": "151.67",
+                "Brut": f"{{1800 + i % 2000}}.50", "Charges patronales": "900.25", "Coût global": "3500.75", "Emploi": "Opérateur",
+            }})
+            out.write(",".join(values[col] for col in COLONNES) + "\\n")
+
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    db = database.SessionLocal()
+    with open(path, "rb") as stream:
+        db_file, _ = service.ingest_csv_stream(db, stream, "paie.csv", chunk_rows={chunk_rows})
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({{
+        "records": db_file.total_records,
+        "csv_mb": os.path.getsize(path) / 2 ** 20,
+        "growth_mb": (peak - baseline) / 1024,  # ru_maxrss en Ko sous Linux
+    }}))
+""")
+
+
+def test_ingest_csv_stream_peak_rss_is_bounded():
+    code = _CHILD.format(back_dir=BACK_DIR, rows=ROWS, chunk_rows=CHUNK_ROWS)
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, timeout=600, env=dict(os.environ))
+    assert result.returncode == 0, result.stderr
+    measures = json.loads(result.stdout.strip().splitlines()[-1])
+
+    assert measures["records"] == ROWS
+    # Le fichier doit dépasser le plafond, sinon le test ne prouverait rien
+    assert measures["csv_mb"] > MAX_GROWTH_MB
+    assert measures["growth_mb"] < MAX_GROWTH_MB, measures
+
+
+EXPORT_ROWS = 150_000
+# Croissance du pic RSS tolérée pendant la lecture par lots d'un fichier colonnaire
+EXPORT_MAX_GROWTH_MB = 30  # environ 13 Mo mesurés, 170 Mo en décodant tout le fichier
+
+_CREATE = textwrap.dedent("""
+    import os, sys
+    os.environ["DATABASE_URL"] = "sqlite:///" + {db_path!r}
+    sys.path.insert(0, {back_dir!r})
+
+    from app import database, models
+    from app.services import couts_salariaux as service
+    from app.services.couts_salariaux_columns import COLONNES
+
+    models.Base.metadata.create_all(bind=database.engine)
+    data = []
+    for i in range({rows}):
+        record = {{col: None for col in COLONNES}}
+        record.update({{
+            "Matricule": f"M{{i % 3000:05d}}", "Salarié": f"Salarié numéro {{i % 3000}}", "Service": ("PROD", "ADM", "MAINT")[i % 3],
+            "P / HP": "P" if i % 3 != 1 else "HP", "Mois": f"2025-{{i % 12 + 1:02d}}", "Heures réelles": 151.67,
+            "Brut": 1800.5 + i % 2000, "Charges patronales": 900.25, "Coût global": 3500.75, "Emploi": "Opérateur",
+        }})
+        data.append(record)
+    db = database.SessionLocal()
+    print(" ".join(str(service.create_file(db, storage, data, storage=storage).id) for storage in ("json", "columnar")))
+""")
+
+_EXPORT = textwrap.dedent("""
+    import json, os, resource, sys
+    os.environ["DATABASE_URL"] = "sqlite:///" + {db_path!r}
+    sys.path.insert(0, {back_dir!r})
+
+    from app import crud, database
+    from app.services import couts_salariaux as service
+
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    db = database.SessionLocal()
+    db_file = crud.get_couts_salariaux_file(db, {file_id})
+    rows = sum(len(batch) for batch in service.iter_record_batches(db, db_file))
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    stored = len(db_file.processed_data) if db_file.storage_format == "json" else len(db_file.processed_blob)
+    print(json.dumps({{"records": rows, "stored_mb": stored / 2 ** 20, "growth_mb": (peak - baseline) / 1024}}))
+""")
+
+
+def _run(code: str) -> str:
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, timeout=600, env=dict(os.environ))
+    assert result.returncode == 0, result.stderr
+    return result.stdout.strip().splitlines()[-1]
+
+
+def test_iter_record_batches_peak_rss_from_inline_storage(tmp_path):
+    db_path = str(tmp_path / "export.db")
+    json_id, columnar_id = _run(_CREATE.format(db_path=db_path, back_dir=BACK_DIR, rows=EXPORT_ROWS)).split()
+
+    columnar = json.loads(_run(_EXPORT.format(db_path=db_path, back_dir=BACK_DIR, file_id=columnar_id)))
+    assert columnar["records"] == EXPORT_ROWS
+    assert columnar["growth_mb"] < EXPORT_MAX_GROWTH_MB, columnar
+
+    # Stockage JSON : le texte stocké est chargé avec le fichier, les lignes sont décodées par lot
+    stored = json.loads(_run(_EXPORT.format(db_path=db_path, back_dir=BACK_DIR, file_id=json_id)))
+    assert stored["records"] == EXPORT_ROWS
+    assert stored["growth_mb"] < 2.5 * stored["stored_mb"], stored
@@ -0,0 +1,76 @@
+"""
+Fusion par clé (Matricule, Mois) : normalisation des clés, compteurs, et versions
+du fichier utilisées par les caches (updated_at, rows_revision).
+"""
+import pytest
+
+from app import crud
+from app.services import couts_salariaux as service
+
+
+def _row(matricule, mois="2025-01", cout=3000.0, **extra):
+    return dict({"Matricule": matricule, "Mois": mois, "Salarié": "DUPONT Jean", "Coût global": cout}, **extra)
+
+
+def _stored(db, file_id):
+    return service.load_records(db, crud.get_couts_salariaux_file(db, file_id))
+
+
+@pytest.mark.parametrize("value, expected", [
+    (123, "123"), (123.0, "123"), ("123", "123"), ("123.0", "123"), (" 123 ", "123"), ("-7.00", "-7"),
+    ("A12", "A12"), (12.5, "12.5"), (None, None), (float("nan"), None), ("  ", None),
+])
+def test_key_part_normalizes_numbers_read_as_floats(value, expected):
+    assert service._key_part(value) == expected
+
+
+def test_upsert_matches_float_and_string_keys(db):
+    db_file = service.create_file(db, "paie.csv", [_row("123"), _row(456)])
+    # Matricules relus en float par pandas (colonne numérique avec des vides)
+    db_file, counts = service.upsert_records(db, db_file.id, [_row(123.0, cout=3100.0), _row(456.0)])
+    assert counts == {"inserted": 0, "updated": 1, "unchanged": 1, "duplicates_removed": 0}
+    assert db_file.total_records == 2
+    assert [row["Coût global"] for row in _stored(db, db_file.id)] == [3100.0, 3000.0]
+
+
+def test_upsert_counts_and_file_versions(db):
+    db_file = service.create_file(db, "paie.csv", [_row("1"), _row("2"), _row("3")])
+    db_file, counts = service.upsert_records(db, db_file.id, [_row("1")])
+    assert counts == {"inserted": 0, "updated": 0, "unchanged": 1, "duplicates_removed": 0}
+    revision, updated_at = db_file.rows_revision, db_file.updated_at
+
+    # Rien de changé : ni updated_at ni rows_revision ne bougent (caches conservés)
+    db_file, counts = service.upsert_records(db, db_file.id, [_row("2"), _row("3")])
+    assert counts["unchanged"] == 2
+    assert (db_file.rows_revision, db_file.updated_at) == (revision, updated_at)
+
+    # Ajout seul : updated_at change, pas rows_revision (lecture incrémentale par seq possible)
+    db_file, counts = service.upsert_records(db, db_file.id, [_row("4"), _row("5", mois=None), _row("4", cout=1.0)])
+    assert counts == {"inserted": 2, "updated": 0, "unchanged": 0, "duplicates_removed": 0}
+    assert db_file.rows_revision == revision
+    assert db_file.updated_at != updated_at
+    updated_at = db_file.updated_at
+    # Dernière occurrence d'une clé reçue en double ; ligne sans clé complète ajoutée telle quelle
+    assert [(row["Matricule"], row["Coût global"]) for row in _stored(db, db_file.id)][3:] == [("5", 3000.0), ("4", 1.0)]
+
+    # Ligne déjà stockée modifiée : rows_revision et updated_at changent
+    db_file, counts = service.upsert_records(db, db_file.id, [_row("2", cout=9.0)])
+    assert counts == {"inserted": 0, "updated": 1, "unchanged": 0, "duplicates_removed": 0}
+    assert db_file.rows_revision == revision + 1
+    assert db_file.updated_at != updated_at
+    assert db_file.total_records == 5
+
+
+def test_upsert_removes_duplicates_left_by_plain_append(db):
+    db_file = service.create_file(db, "paie.csv", [_row("1"), _row("2")])
+    service.upsert_records(db, db_file.id, [])  # passage en stockage ligne à ligne
+    db_file = service.append_records(db, db_file.id, [_row("1", cout=5.0), _row("2")])
+    assert db_file.total_records == 4
+    revision = db_file.rows_revision
+
+    db_file, counts = service.upsert_records(db, db_file.id, [_row(1.0, cout=7.0), _row("2")])
+    assert counts == {"inserted": 0, "updated": 1, "unchanged": 1, "duplicates_removed": 2}
+    assert db_file.total_records == 2
+    assert db_file.rows_revision == revision + 1
+    # La première ligne de chaque clé est gardée, puis mise à jour
+    assert [(row["Matricule"], row["Coût global"]) for row in _stored(db, db_file.id)] == [(1.0, 7.0), ("2", 3000.0)]
@@ -0,0 +1,84 @@
+"""
+Analyse des FEC par plages : mêmes résultats et mêmes lignes que la lecture d'un bloc,
+mémoire du process API indépendante de la taille du fichier et du nombre de workers.
+"""
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+import pandas as pd
+
+from app.services import fec, fec_parallel
+from scripts.bench_fec import synthetic_fec
+from tests.conftest import BACK_DIR
+
+PIECE_LINES = 50_000
+PIECES = 28
+WORKERS = 4
+CHUNK_MB = 8
+# Croissance du pic RSS tolérée pendant l'analyse (le FEC généré fait environ 150 Mo)
+MAX_GROWTH_MB = 80  # environ 45 Mo mesurés avec 4 workers, 140 Mo quand les lignes repassaient par le process API
+
+_CHILD = textwrap.dedent("""
+    import json, os, resource, sys
+    os.environ["PROCESS_POOL_MAX_WORKERS"] = "{workers}"
+    sys.path.insert(0, {back_dir!r})
+
+    from app.services import fec, fec_parallel
+
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rows = 0
+
+    def on_entries(entries):
+        global rows
+        for batch in fec.ledger_batches(entries):
+            rows += len(batch)
+
+    _, lines = fec_parallel.analyze_fec_file({path!r}, on_entries=on_entries, chunk_bytes={chunk_mb} << 20, max_workers={workers})
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({{"lines": lines, "rows": rows, "growth_mb": (peak - baseline) / 1024}}))  # ru_maxrss en Ko sous Linux
+""")
+
+
+def test_ranges_give_same_results_and_lines_as_whole_file(tmp_path):
+    content = synthetic_fec(20_000, 500)
+    path = tmp_path / "fec.txt"
+    path.write_bytes(content)
+
+    batches = []
+    results, lines = fec_parallel.analyze_fec_file(str(path), on_entries=batches.append, chunk_bytes=64 << 10, max_workers=2)
+
+    expected = fec.read_fec(content)
+    assert lines == len(expected)
+    assert results == fec.analyze_fec(content)[0]
+    assert all(len(batch) <= fec.LEDGER_BATCH_ROWS for batch in batches)
+    pd.testing.assert_frame_equal(
+        pd.concat(batches, ignore_index=True),
+        expected[fec_parallel.LEDGER_COLUMNS].reset_index(drop=True)
+    )
+    # Fichiers intermédiaires des workers supprimés
+    assert os.listdir(tmp_path) == ["fec.txt"]
+
+
+def test_analyze_fec_file_peak_rss_is_bounded(tmp_path):
+    # Même bloc répété : nombre de comptes borné, comme dans un vrai grand livre
+    content = synthetic_fec(PIECE_LINES, 3000)
+    body = content[content.index(b"\n") + 1:]
+    path = tmp_path / "fec.txt"
+    with open(path, "wb") as out:
+        out.write(content)
+        for _ in range(PIECES - 1):
+            out.write(body)
+    fec_mb = os.path.getsize(path) / 2 ** 20
+
+    code = _CHILD.format(back_dir=BACK_DIR, path=str(path), workers=WORKERS, chunk_mb=CHUNK_MB)
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, timeout=600, env=dict(os.environ))
+    assert result.returncode == 0, result.stderr
+    measures = json.loads(result.stdout.strip().splitlines()[-1])
+
+    assert measures["lines"] == measures["rows"] == PIECE_LINES * PIECES
+    # Le fichier doit dépasser le plafond, sinon le test ne prouverait rien
+    assert fec_mb > MAX_GROWTH_MB
+    assert measures["growth_mb"] < MAX_GROWTH_MB, measures
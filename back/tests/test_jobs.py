@@ -0,0 +1,64 @@
+"""
+File de jobs : un worker tué ne bloque pas la file, le pool est recréé et le nettoyage est fait.
+"""
+import os
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from app.services import jobs
+
+
+def _store(job, result):
+    return {"resultat": result}
+
+
+def _wait(queue: jobs.JobQueue, job: jobs.Job, timeout: float = 60) -> jobs.Job:
+    deadline = time.monotonic() + timeout
+    while queue.get(job.id).finished_at is None:
+        assert time.monotonic() < deadline, "job non terminé"
+        time.sleep(0.05)
+    return queue.get(job.id)
+
+
+class _BrokenPool:
+    def submit(self, *args, **kwargs):
+        raise BrokenProcessPool("worker tué")
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+@pytest.fixture
+def queue():
+    queue = jobs.JobQueue(max_workers=1, max_pending=2)
+    yield queue
+    queue.shutdown()
+
+
+def test_killed_worker_fails_the_job_and_pool_is_recreated(queue):
+    failed = []
+    job = queue.submit("test", os._exit, (1,), _store, on_failure=failed.append)
+    job = _wait(queue, job)
+    assert job.status == jobs.JOB_FAILED
+    assert failed == [job]
+
+    job = _wait(queue, queue.submit("test", sum, ([1, 2],), _store))
+    assert job.status == jobs.JOB_DONE
+    assert job.result == {"resultat": 3}
+    assert queue.pending_count() == 0
+
+
+def test_submit_on_broken_pool_does_not_leak_pending_jobs(queue):
+    failed = []
+    for _ in range(queue.max_pending + 1):
+        queue._pool = _BrokenPool()
+        job = queue.submit("test", sum, ([1],), _store, on_failure=failed.append)
+        assert job.status == jobs.JOB_FAILED
+        assert queue._pool is None
+    assert len(failed) == queue.max_pending + 1
+    assert queue.pending_count() == 0
+
+    job = _wait(queue, queue.submit("test", sum, ([4, 5],), _store))
+    assert job.result == {"resultat": 9}
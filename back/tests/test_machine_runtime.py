@@ -0,0 +1,31 @@
+"""
+Rapports de temps de fonctionnement : appariement des dates et des durées.
+"""
+from datetime import date
+
+from app.services import machine_runtime
+
+
+def test_duration_goes_to_nearest_preceding_date():
+    text = "\n".join([
+        # En-tête de période : une date sans durée
+        "Rapport - Start Date: 01/03/2025",
+        "Start Date: 03/03/2025", "Cycle 01  12:00  OK", "Durée totale: 01:30:00",
+        # Jour sans ligne de durée
+        "Start Date: 04/03/2025", "Cycle 01  08:00  OK",
+        "Start Date: 05/03/2025", "Durée totale: 02:00:00",
+        "Start Date: 05/03/2025", "Durée totale: 00:15:30",
+        # Durée sans date
+        "Durée totale: 09:00:00",
+    ])
+    assert machine_runtime.parse_text(text) == {
+        date(2025, 3, 3): 5400,
+        date(2025, 3, 5): 2 * 3600 + 15 * 60 + 30,
+    }
+
+
+def test_pairing_spans_page_ranges():
+    # Date en fin d'une plage de pages, durée au début de la suivante
+    first = machine_runtime.scan_text("Start Date: 06/03/2025\nStart Date: 07/03/2025")
+    second = machine_runtime.scan_text("Durée totale: 03:00:00\nStart Date: 10/03/2025\nDuree totale : 01:00:00")
+    assert machine_runtime.pair_tokens(first + second) == {date(2025, 3, 7): 3 * 3600, date(2025, 3, 10): 3600}
@@ -0,0 +1,94 @@
+"""
+Fusion des rapports de fonctionnement : chevauchements, conflits et restauration à la suppression.
+"""
+from datetime import date
+
+from app import crud
+from app.services import machine_runtime_rollups as rollups
+
+MACHINE = "laser-bodor"
+
+
+def _days(first: int, last: int, secondes: int):
+    return {date(2025, 3, day): secondes for day in range(first, last + 1)}
+
+
+def _merged(db):
+    return {row.jour: (row.duree_secondes, row.file_id) for row in crud.get_machine_runtime_days(db, MACHINE)}
+
+
+def _month_total(db):
+    (march,) = crud.get_machine_runtime_rollups(db, MACHINE, rollups.LEVEL_MONTH)
+    return march.total_secondes
+
+
+def test_overlapping_upload_replaces_shared_days(db):
+    first, _ = crud.create_machine_runtime_file(db, MACHINE, "a.pdf", _days(1, 10, 3600))
+    second, merge = crud.create_machine_runtime_file(db, MACHINE, "b.pdf", {**_days(8, 10, 3600), **_days(11, 15, 7200), date(2025, 3, 9): 1800})
+
+    assert merge["jours_ajoutes"] == 5
+    assert merge["jours_identiques"] == 2
+    assert merge["jours_remplaces"] == 1 and merge["jours_conserves"] == 0
+    assert merge["conflits"] == [{
+        "jour": date(2025, 3, 9), "duree_existante": 3600, "duree_nouvelle": 1800,
+        "file_id_existant": first.id, "retenue": crud.MACHINE_RUNTIME_REPLACE
+    }]
+    merged = _merged(db)
+    assert len(merged) == 15
+    assert merged[date(2025, 3, 8)] == (3600, first.id)
+    assert merged[date(2025, 3, 9)] == (1800, second.id)
+    assert merged[date(2025, 3, 12)] == (7200, second.id)
+    assert _month_total(db) == 9 * 3600 + 1800 + 5 * 7200
+
+
+def test_keep_on_conflict_leaves_existing_days(db):
+    first, _ = crud.create_machine_runtime_file(db, MACHINE, "a.pdf", _days(1, 5, 3600))
+    _, merge = crud.create_machine_runtime_file(
+        db, MACHINE, "b.pdf", _days(4, 6, 600), on_conflict=crud.MACHINE_RUNTIME_KEEP
+    )
+
+    assert merge["jours_ajoutes"] == 1
+    assert merge["jours_remplaces"] == 0 and merge["jours_conserves"] == 2
+    assert [c["retenue"] for c in merge["conflits"]] == [crud.MACHINE_RUNTIME_KEEP] * 2
+    merged = _merged(db)
+    assert merged[date(2025, 3, 4)] == (3600, first.id)
+    assert merged[date(2025, 3, 5)] == (3600, first.id)
+    assert merged[date(2025, 3, 6)][0] == 600
+    assert _month_total(db) == 5 * 3600 + 600
+
+
+def test_delete_restores_newest_remaining_report(db):
+    oldest, _ = crud.create_machine_runtime_file(db, MACHINE, "a.pdf", _days(1, 5, 1000))
+    newer, _ = crud.create_machine_runtime_file(db, MACHINE, "b.pdf", _days(3, 5, 2000))
+    crud.create_machine_runtime_file(db, MACHINE, "c.pdf", _days(5, 7, 3000))
+
+    assert crud.delete_machine_runtime_file(db, MACHINE, "c.pdf")
+    merged = _merged(db)
+    # Le 5 revient au plus récent des rapports restants ; les 6 et 7 n'existent plus
+    assert merged[date(2025, 3, 5)] == (2000, newer.id)
+    assert date(2025, 3, 6) not in merged and date(2025, 3, 7) not in merged
+    assert merged[date(2025, 3, 1)] == (1000, oldest.id)
+    assert _month_total(db) == 2 * 1000 + 3 * 2000
+
+    assert crud.delete_machine_runtime_file(db, MACHINE, "b.pdf")
+    assert {jour: secondes for jour, (secondes, _) in _merged(db).items()} == _days(1, 5, 1000)
+    assert _month_total(db) == 5 * 1000
+
+    assert crud.delete_machine_runtime_file(db, MACHINE, "a.pdf")
+    assert _merged(db) == {}
+    assert crud.get_machine_runtime_rollups(db, MACHINE, rollups.LEVEL_MONTH) == []
+    assert not crud.delete_machine_runtime_file(db, MACHINE, "a.pdf")
+
+
+def test_reupload_same_name_replaces_previous_report(db):
+    crud.create_machine_runtime_file(db, MACHINE, "a.pdf", _days(1, 10, 3600))
+    other, _ = crud.create_machine_runtime_file(db, MACHINE, "b.pdf", _days(9, 12, 3600))
+    again, merge = crud.create_machine_runtime_file(db, MACHINE, "a.pdf", _days(1, 3, 600))
+
+    assert [f.filename for f in crud.get_machine_runtime_files(db, MACHINE)] == ["a.pdf", "b.pdf"]
+    assert merge["jours_ajoutes"] == 3 and merge["conflits"] == []
+    merged = _merged(db)
+    assert sorted(merged) == sorted([*_days(1, 3, 0), *_days(9, 12, 0)])
+    assert merged[date(2025, 3, 2)] == (600, again.id)
+    assert merged[date(2025, 3, 9)] == (3600, other.id)
+    assert _month_total(db) == 3 * 600 + 4 * 3600
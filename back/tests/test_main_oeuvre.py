@@ -0,0 +1,89 @@
+"""
+Répartition de la main-d'œuvre : conservation des montants par mois et recalcul limité aux mois modifiés.
+"""
+import pytest
+
+from app import crud, models, schemas
+from app.services import couts_salariaux as service
+from app.services import main_oeuvre
+
+
+@pytest.fixture(autouse=True)
+def _empty_cache():
+    # Les identifiants de fichiers sont réutilisés d'un test à l'autre
+    main_oeuvre._cache._entries.clear()
+
+
+def _payroll(months, employees: int = 6):
+    return [
+        {
+            "Matricule": f"M{i:03d}", "Salarié": "DUPONT Jean" if i == 0 else f"Salarié {i}",
+            "Service": ("PROD", "MAINT", "ADM")[i % 3], "P / HP": "HP" if i % 3 == 2 else "P",
+            "Mois": mois, "Coût global": 3000.0 + 100 * i,
+        }
+        for mois in months
+        for i in range(employees)
+    ]
+
+
+@pytest.fixture
+def payroll_file(db):
+    laser = crud.create_machine(db, schemas.MachineCreate(name="Laser", year=2025))
+    plieuse = crud.create_machine(db, schemas.MachineCreate(name="Plieuse", year=2025))
+    e1 = crud.create_ensemble(db, schemas.EnsembleCreate(name="E1", machine_id=laser.id, year=2025))
+    e2 = crud.create_ensemble(db, schemas.EnsembleCreate(name="E2", machine_id=plieuse.id, year=2025))
+    task = crud.create_task(db, schemas.TaskCreate(type="ETUDE", start_week=1, end_week=10, year=2025, ensemble_id=e1.id))
+    crud.create_task(db, schemas.TaskCreate(type="TEST", start_week=3, end_week=4, year=2025, ensemble_id=e2.id))
+    user = crud.create_user(db, schemas.UserCreate(email="j@example.com", username="jd", password="x", first_name="Jean", last_name="Dupont"))
+    db.add(models.UserAssignment(title="x", task_id=task.id, user_id=user.id))
+    db.add(models.MachineServiceMapping(service="PROD", machine_id=plieuse.id, poids=1))
+    db.commit()
+    return service.create_file(db, "paie.csv", _payroll(["2025-01", "2025-02", "2025-03"]))
+
+
+def _assert_balanced(result):
+    assert result["mois"]
+    for month in result["mois"]:
+        assert month["affecte"] + month["non_affecte"] == pytest.approx(month["total"], abs=0.02)
+        assert sum(month["par_cle"].values()) == pytest.approx(month["affecte"], abs=0.02)
+
+
+def test_allocations_balance_and_only_changed_month_is_recomputed(db, payroll_file):
+    first = main_oeuvre.file_allocations(db, payroll_file)
+    assert first["mois_recalcules"] == 3
+    _assert_balanced(first)
+    # Salariés P seulement, tous répartis (la couverture prend le reste)
+    assert [month["total"] for month in first["mois"]] == [12800.0] * 3
+    assert all(month["non_affecte"] == 0 for month in first["mois"])
+
+    assert main_oeuvre.file_allocations(db, payroll_file)["mois_recalcules"] == 0
+    signatures = {state.mois: state.signature for state in crud.get_labor_allocation_months(db, payroll_file.id)}
+
+    # Une ligne de février modifiée : seul février est recalculé
+    changed = [dict(_payroll(["2025-02"])[1], **{"Coût global": 5000.0})]
+    db_file, counts = service.upsert_records(db, payroll_file.id, changed)
+    assert counts["updated"] == 1
+    second = main_oeuvre.file_allocations(db, db_file)
+    assert second["mois_recalcules"] == 1
+    _assert_balanced(second)
+    after = {state.mois: state.signature for state in crud.get_labor_allocation_months(db, payroll_file.id)}
+    assert [mois for mois in after if after[mois] != signatures[mois]] == ["2025-02"]
+    assert [month["total"] for month in second["mois"]] == [12800.0, 14700.0, 12800.0]
+
+
+def test_other_parameters_are_computed_without_touching_stored_allocations(db, payroll_file):
+    main_oeuvre.file_allocations(db, payroll_file)
+    stored = [(a.mois, a.machine_id, a.annee, a.semaine, a.cle, a.montant) for a, _ in crud.get_labor_allocations(db, payroll_file.id)]
+
+    keys = [main_oeuvre.KEY_ASSIGNMENTS, main_oeuvre.KEY_SERVICES]
+    for _ in range(2):
+        partial = main_oeuvre.file_allocations(db, payroll_file, keys, production_only=False, year=2025)
+        assert partial["cles"] == keys
+        _assert_balanced(partial)
+        # MAINT et ADM n'ont ni affectation ni service : non répartis sans la couverture
+        assert [month["non_affecte"] for month in partial["mois"]] == [3100.0 + 3400.0 + 3200.0 + 3500.0] * 3
+        assert all(set(month["par_cle"]) <= set(keys) for month in partial["mois"])
+
+    # La répartition enregistrée (paramètres par défaut) n'a pas bougé
+    assert [(a.mois, a.machine_id, a.annee, a.semaine, a.cle, a.montant) for a, _ in crud.get_labor_allocations(db, payroll_file.id)] == stored
+    assert main_oeuvre.file_allocations(db, payroll_file)["mois_recalcules"] == 0
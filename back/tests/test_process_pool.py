@@ -0,0 +1,41 @@
+"""
+Process pool partagé : ordre des résultats, nombre de tâches en cours borné, pool recréé après un worker tué.
+"""
+import os
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from app.services.process_pool import SharedProcessPool
+
+
+@pytest.fixture
+def pool():
+    pool = SharedProcessPool(max_workers=2, max_in_flight=2)
+    yield pool
+    pool.shutdown()
+
+
+def test_ordered_keeps_item_order(pool):
+    items = [([i] * i,) for i in range(10)]
+    assert [future.result() for future in pool.ordered(sum, items, window=3)] == [i * i for i in range(10)]
+
+
+def test_submit_waits_when_max_in_flight_is_reached(pool):
+    running = [pool.submit(time.sleep, 1.0) for _ in range(pool.max_in_flight)]
+    submitted = threading.Event()
+    thread = threading.Thread(target=lambda: (pool.submit(sum, [1]), submitted.set()))
+    thread.start()
+    assert not submitted.wait(0.3)
+    for future in running:
+        future.result()
+    assert submitted.wait(10)
+    thread.join()
+
+
+def test_pool_is_recreated_after_a_worker_is_killed(pool):
+    with pytest.raises(BrokenProcessPool):
+        pool.submit(os._exit, 1).result()
+    assert pool.submit(sum, [2, 3]).result(timeout=30) == 5
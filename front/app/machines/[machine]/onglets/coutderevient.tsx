@@ -35,6 +35,36 @@ function Tooltip({ note }: { note: string }) {
   );
 }
 
+// Champs du formulaire -> entrées de l'API /machines/{machine}/cout-de-revient
+const champsApi: Record<string, string> = {
+  heuresAnnuelles: 'heures_annuelles',
+  amortissement: 'amortissement',
+  interet: 'interet',
+  kwH: 'kwh',
+  airLiquide: 'air_liquide',
+  coefPuissance: 'coef_puissance',
+  fraisLocaux: 'frais_locaux',
+  assurances: 'assurances',
+  heuresFacturees: 'heures_facturees',
+  prixAchat: 'prix_achat',
+  maintenance: 'maintenance',
+  surface: 'surface',
+  puissance: 'puissance',
+  consoAirLiquid: 'conso_air_liquide',
+  salaireOperateur: 'salaire_operateur',
+  coefUtilisation: 'coef_utilisation',
+};
+
+// Corps du PUT : champ vide -> null
+function versApi(inputs: Record<string, string>, note: string) {
+  const corps: Record<string, number | string | null> = { note: note || null };
+  Object.entries(champsApi).forEach(([cle, champ]) => {
+    const valeur = (inputs[cle] || '').trim();
+    corps[champ] = valeur === '' ? null : Number(valeur.replace(',', '.'));
+  });
+  return JSON.stringify(corps);
+}
+
 export default function CoutDeRevient({ machineName }: { machineName: string }) {
   const [inputs, setInputs] = useState<Record<string, string>>({
     heuresAnnuelles: '',
@@ -68,29 +98,87 @@ export default function CoutDeRevient({ machineName }: { machineName: string })
   const [showTable, setShowTable] = useState(false);
   const [showForm, setShowForm] = useState(false);
 
-  // Charger depuis localStorage
+  // Entrées chargées (serveur ou localStorage) : l'enregistrement peut commencer
+  const chargeRef = useRef(false);
+  // Dernier corps enregistré sur le serveur (pas de PUT si rien n'a changé)
+  const dernierEnvoiRef = useRef('');
+
+  // Charger depuis le serveur, à défaut depuis localStorage
   useEffect(() => {
-    const saved = localStorage.getItem(`coutDeRevient_${machineName}`);
-    if (saved) {
-      const data = JSON.parse(saved);
-      setInputs(data.inputs || inputs);
-      setNote(data.note || '');
-      
+    chargeRef.current = false;
+    const appliquer = (valeurs: Record<string, string>, noteChargee: string) => {
+      setInputs(prev => ({ ...prev, ...valeurs }));
+      setNote(noteChargee);
+
       const locked: Record<string, boolean> = {};
-      Object.entries(data.inputs || {}).forEach(([key, val]) => {
+      Object.entries(valeurs).forEach(([key, val]) => {
         locked[key] = String(val).trim() !== '';
       });
       setLockedFields(locked);
-    }
+    };
+
+    const charger = async () => {
+      try {
+        const token = localStorage.getItem('token');
+        const res = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/machines/${machineName}/cout-de-revient`, {
+          headers: token ? { 'Authorization': `Bearer ${token}` } : {},
+        });
+        if (res.ok) {
+          const data = await res.json();
+          if (data.entrees) {
+            const valeurs: Record<string, string> = {};
+            Object.entries(champsApi).forEach(([cle, champ]) => {
+              valeurs[cle] = data.entrees[champ] == null ? '' : String(data.entrees[champ]);
+            });
+            dernierEnvoiRef.current = versApi(valeurs, data.entrees.note || '');
+            appliquer(valeurs, data.entrees.note || '');
+            return;
+          }
+        }
+      } catch (err) {
+        console.error('Erreur lors du chargement du coût de revient', err);
+      } finally {
+        chargeRef.current = true;
+      }
+      // Machine absente du Gantt ou entrées jamais enregistrées sur le serveur
+      const saved = localStorage.getItem(`coutDeRevient_${machineName}`);
+      if (saved) {
+        const data = JSON.parse(saved);
+        appliquer(data.inputs || {}, data.note || '');
+      }
+    };
+    charger();
   }, [machineName]);
 
-  // Sauvegarder dans localStorage
+  // Sauvegarder sur le serveur (et dans localStorage, copie locale)
   useEffect(() => {
-    const timer = setTimeout(() => {
+    const timer = setTimeout(async () => {
+      // Pas d'écriture avant la fin du chargement : la copie locale serait écrasée par des champs vides
+      if (!chargeRef.current) return;
       localStorage.setItem(`coutDeRevient_${machineName}`, JSON.stringify({
         inputs,
         note
       }));
+      const corps = versApi(inputs, note);
+      if (corps === dernierEnvoiRef.current) return;
+      try {
+        const token = localStorage.getItem('token');
+        const res = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/machines/${machineName}/cout-de-revient`, {
+          method: 'PUT',
+          headers: {
+            'Content-Type': 'application/json',
+            ...(token ? { 'Authorization': `Bearer ${token}` } : {}),
+          },
+          body: corps,
+        });
+        if (res.ok) {
+          dernierEnvoiRef.current = corps;
+        } else {
+          console.error(`Enregistrement du coût de revient impossible (HTTP ${res.status})`);
+        }
+      } catch (err) {
+        console.error('Erreur lors de l\'enregistrement du coût de revient', err);
+      }
     }, 500);
     return () => clearTimeout(timer);
   }, [inputs, note, machineName]);
@@ -135,13 +135,26 @@ export default function Statistiques({ machineName }: { machineName: string }) {
 
   const supprimerPeriodesSelectionnees = async () => {
     const periodesARemettre: Periode[] = [];
+    const echecs: string[] = [];
+    const token = localStorage.getItem('token');
     for (let i = 0; i < periodes.length; i++) {
       const numero = i + 1;
       const periode = periodes[i];
       if (periodesASupprimer.includes(numero)) {
         try {
-          await fetch(`${process.env.NEXT_PUBLIC_API_URL}/machines/delete_file/${machineName}/${encodeURIComponent(periode.fichier)}`, { method: 'DELETE' });
-        } catch {}
+          const res = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/machines/delete_file/${machineName}/${encodeURIComponent(periode.fichier)}`, {
+            method: 'DELETE',
+            headers: token ? { 'Authorization': `Bearer ${token}` } : {},
+          });
+          // 404 : rapport déjà absent du serveur, la période peut être retirée
+          if (!res.ok && res.status !== 404) {
+            throw new Error(`HTTP ${res.status}`);
+          }
+        } catch {
+          // Période conservée : ses jours sont toujours utilisés côté serveur
+          echecs.push(periode.fichier);
+          periodesARemettre.push(periode);
+        }
       } else {
         periodesARemettre.push(periode);
       }
@@ -156,6 +169,9 @@ export default function Statistiques({ machineName }: { machineName: string }) {
     setPeriodesActives([]);
     setPeriodesASupprimer([]);
     setMenuSuppressionOuvert(false);
+    if (echecs.length > 0) {
+      alert(`Erreur lors de la suppression de : ${echecs.join(', ')}. Veuillez réessayer.`);
+    }
   };
 
   const afficherPeriodes = periodes